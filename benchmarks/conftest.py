@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+
+import glob
+import json
+import os
+import resource
+import shutil
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synth import make_captioned_media  # noqa: E402
+from synth import make_media  # noqa: E402
+
+from fese import container  # noqa: E402
+
+_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# (container, subtitle tracks, cues per track)
+MEDIA_SIZES = (("mkv", 4, 500), ("mkv", 16, 2000), ("mp4", 4, 500))
+
+# Cues of the closed captions fixture
+CAPTION_CUES = 100
+
+
+def pytest_benchmark_update_json(config, benchmarks, output_json):
+    output_json["peak_rss_kb"] = peak_rss_kb()
+
+
+def peak_rss_kb():
+    "Peak RSS of this process and of its (finished) children, in KiB."
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+
+
+def rate(benchmark, amount):
+    "Amount per second using the mean time of the benchmark."
+    if benchmark.stats is None:  # --benchmark-disable
+        return None
+
+    return amount / benchmark.stats.stats.mean
+
+
+@pytest.fixture(scope="session")
+def ffmpeg():
+    if shutil.which(container.FFMPEG_PATH) is None:
+        pytest.skip("FFmpeg not found")
+
+    return container.FFMPEG_PATH
+
+
+@pytest.fixture(scope="session", params=MEDIA_SIZES, ids=lambda p: "%s-%dx%d" % p)
+def media(request, ffmpeg, tmp_path_factory):
+    extension, tracks, cues = request.param
+    path = tmp_path_factory.mktemp("media") / f"{tracks}x{cues}.{extension}"
+    return make_media(str(path), tracks, cues)
+
+
+@pytest.fixture(scope="session")
+def captioned_media(ffmpeg, tmp_path_factory):
+    path = tmp_path_factory.mktemp("media") / "captions.mkv"
+    return make_captioned_media(str(path), CAPTION_CUES)
+
+
+@pytest.fixture(
+    scope="session",
+    params=sorted(glob.glob(os.path.join(_DATA, "*.json"))),
+    ids=os.path.basename,
+)
+def ffprobe_dump(request):
+    with open(request.param, "rb") as file:
+        return file.read()
+
+
+@pytest.fixture
+def stream_dicts(ffprobe_dump):
+    return [
+        stream
+        for stream in json.loads(ffprobe_dump)["streams"]
+        if stream.get("codec_type") == "subtitle"
+    ]
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""Synthetic media fixtures for the benchmarks.
+
+Usage: python benchmarks/synth.py OUTPUT.mkv --tracks 8 --cues 2000
+       python benchmarks/synth.py OUTPUT.mkv --captions --cues 10
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fese import container  # noqa: E402
+
+LANGUAGES = ("eng", "spa", "por", "fre", "ger", "ita", "jpn", "chi", "kor", "rus")
+
+_CODECS = {"mkv": "ass", "mp4": "mov_text"}
+
+
+def make_media(path, tracks=4, cues=500, cue_ms=1500, gap_ms=500):
+    """Creates a small video with `tracks` subtitle streams of `cues` cues each.
+
+    The container (mkv or mp4) is taken from the path extension.
+
+    :raises: subprocess.CalledProcessError, ValueError"""
+    extension = os.path.splitext(path)[-1].lstrip(".")
+    if extension not in _CODECS:
+        raise ValueError(f"Unsupported container: {extension}")
+
+    duration = cues * (cue_ms + gap_ms) / 1000
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        command = [container.FFMPEG_PATH, "-v", "error", "-y"]
+        command += ["-f", "lavfi", "-i", f"color=c=black:s=64x64:r=1:d={duration}"]
+        maps = ["-map", "0:v"]
+        metadata = []
+
+        for track in range(tracks):
+            sub_path = os.path.join(tmp_dir, f"{track}.srt")
+            _write_srt(sub_path, cues, cue_ms, gap_ms, track)
+            command += ["-i", sub_path]
+            maps += ["-map", f"{track + 1}:s"]
+            language = LANGUAGES[track % len(LANGUAGES)]
+            metadata += [
+                f"-metadata:s:s:{track}",
+                f"language={language}",
+                f"-metadata:s:s:{track}",
+                f"title={language.upper()} {'SDH' if track % 3 == 2 else 'Full'}",
+            ]
+
+        command += maps + metadata
+        command += ["-c:v", "mpeg4", "-c:s", _CODECS[extension], path]
+        subprocess.run(command, check=True)
+
+    return path
+
+
+def make_captioned_media(path, cues=10, cue_frames=60, gap_frames=30):
+    """Creates a video carrying CEA-608 captions (pop-on, CC1) in
+    MPEG-2 A/53 user data, like broadcast recordings. FFmpeg can't encode
+    captions, so the user data is inserted into an encoded elementary stream.
+
+    :raises: subprocess.CalledProcessError"""
+    pairs = _caption_pairs(cues, cue_frames, gap_frames)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        elementary = os.path.join(tmp_dir, "video.m2v")
+        subprocess.run(
+            [
+                container.FFMPEG_PATH,
+                "-v",
+                "error",
+                "-y",
+                "-f",
+                "lavfi",
+                "-i",
+                f"color=c=black:s=64x64:r=30000/1001:d={len(pairs) * 1001 / 30000}",
+                "-c:v",
+                "mpeg2video",
+                "-bf",
+                "0",  # Coding order must match display order
+                "-g",
+                "30",
+                "-f",
+                "mpeg2video",
+                elementary,
+            ],
+            check=True,
+        )
+
+        with open(elementary, "rb") as file:
+            data = _insert_user_data(file.read(), pairs)
+
+        with open(elementary, "wb") as file:
+            file.write(data)
+
+        subprocess.run(
+            [
+                container.FFMPEG_PATH,
+                "-v",
+                "error",
+                "-y",
+                "-fflags",
+                "+genpts",
+                "-r",
+                "30000/1001",
+                "-f",
+                "mpegvideo",
+                "-i",
+                elementary,
+                "-c",
+                "copy",
+                path,
+            ],
+            check=True,
+        )
+
+    return path
+
+
+def _caption_pairs(cues, cue_frames, gap_frames):
+    "Returns the CEA-608 byte pair of every frame."
+    frames = []
+    for num in range(1, cues + 1):
+        text = f"CAPTION {num}".encode("ascii")
+        if len(text) % 2:
+            text += b"\x00"
+
+        # Load the caption off-screen, then display it (controls are doubled)
+        load = [(0x14, 0x20)] * 2 + [(0x14, 0x60)] * 2
+        load += [(text[i], text[i + 1]) for i in range(0, len(text), 2)]
+        load += [(0x14, 0x2F)] * 2
+        frames += load
+        frames += [None] * (cue_frames - len(load))
+        # Clear the screen
+        frames += [(0x14, 0x2C)] * 2 + [None] * gap_frames
+
+    return frames
+
+
+def _insert_user_data(data, pairs):
+    "Inserts A/53 caption user data before the first slice of every picture."
+    output = bytearray()
+    position = 0
+    frame = 0
+    in_picture = False
+    while True:
+        start = data.find(b"\x00\x00\x01", position)
+        if start < 0 or start + 3 >= len(data):
+            output += data[position:]
+            break
+
+        code = data[start + 3]
+        if code == 0x00:
+            in_picture = True
+        elif 0x01 <= code <= 0xAF and in_picture:
+            output += data[position:start]
+            pair = pairs[frame] if frame < len(pairs) else None
+            output += _a53_user_data(pair)
+            position = start
+            frame += 1
+            in_picture = False
+
+        output += data[position : start + 4]
+        position = start + 4
+
+    return bytes(output)
+
+
+def _a53_user_data(pair):
+    first, second = pair or (0x00, 0x00)
+    # One CC1 (field 1) byte pair with odd parity
+    cc_data = bytes([0xFC, _parity(first), _parity(second)])
+    return b"\x00\x00\x01\xb2GA94\x03" + bytes([0x40 | 1, 0xFF]) + cc_data + b"\xff"
+
+
+def _parity(byte):
+    return byte | 0x80 if bin(byte).count("1") % 2 == 0 else byte
+
+
+def _write_srt(path, cues, cue_ms, gap_ms, seed):
+    with open(path, "w", encoding="utf-8") as file:
+        start = 0
+        for num in range(1, cues + 1):
+            end = start + cue_ms
+            file.write(
+                f"{num}\n{_srt_ts(start)} --> {_srt_ts(end)}\n"
+                f"Track {seed} line {num}: the quick brown fox jumps\n"
+                "over the lazy dog.\n\n"
+            )
+            start = end + gap_ms
+
+
+def _srt_ts(millis):
+    seconds, millis = divmod(millis, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02}:{minutes:02}:{seconds:02},{millis:03}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("output")
+    parser.add_argument("--tracks", type=int, default=4)
+    parser.add_argument("--cues", type=int, default=500)
+    parser.add_argument("--captions", action="store_true", help="CEA-608 captions")
+    args = parser.parse_args()
+    if args.captions:
+        print(make_captioned_media(args.output, args.cues))
+    else:
+        print(make_media(args.output, args.tracks, args.cues))
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+
+from conftest import rate
+
+from fese.distributed import SQLiteQueue
+
+JOBS = 1000
+
+
+def test_sqlite_queue_claims(benchmark, tmp_path):
+    queue = SQLiteQueue(tmp_path / "queue.db")
+    plan = {"method": "copy", "streams": [2, 3], "options": {}}
+
+    def drain():
+        for index in range(JOBS):
+            queue.put(f"{drain.round}-{index}", f"/media/{index}.mkv", plan)
+
+        while True:
+            job = queue.claim("worker")
+            if job is None:
+                break
+            queue.complete(job)
+        drain.round += 1
+
+    drain.round = 0
+    benchmark.pedantic(drain, rounds=3)
+    assert queue.counts()["done"] == JOBS * drain.round
+    benchmark.extra_info["jobs_per_sec"] = rate(benchmark, JOBS)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+from conftest import CAPTION_CUES
+from conftest import rate
+import pytest
+
+from fese import backends
+from fese import stream
+from fese.container import _ffmpeg_call
+from fese.container import FFprobeVideoContainer
+from fese.validate import validate_file
+
+
+@pytest.fixture(scope="module")
+def backend():
+    try:
+        return backends.get_backend("pyav")
+    except ImportError:
+        return backends.get_backend("ffprobe")
+
+
+def _output_mb(results):
+    return sum(result.bytes for result in results) / 1e6
+
+
+@pytest.mark.parametrize(
+    "options",
+    [{}, {"validate": True}, {"output_encoding": "utf-16"}],
+    ids=["", "validate", "utf-16"],
+)
+@pytest.mark.parametrize("method", ["extract_subtitles", "copy_subtitles"])
+def test_extract(benchmark, tmp_path, media, backend, method, options):
+    video = FFprobeVideoContainer(media, backend=backend)
+    subtitles = video.get_subtitles()
+    extract = getattr(video, method)
+
+    results = benchmark.pedantic(
+        extract,
+        args=(subtitles,),
+        kwargs={"custom_dir": str(tmp_path), **options},
+        rounds=3,
+    )
+    benchmark.extra_info["mb_per_sec"] = rate(benchmark, _output_mb(results.values()))
+    benchmark.extra_info["input_mb_per_sec"] = rate(
+        benchmark, os.path.getsize(media) / 1e6
+    )
+
+
+@pytest.mark.parametrize("threads", [1, 0], ids=["1-thread", "auto-threads"])
+def test_extract_closed_captions(
+    benchmark, tmp_path, captioned_media, backend, monkeypatch, threads
+):
+    if backend.name == "pyav":
+        backend = backends.PyAVBackend(caption_frames=3)
+
+    monkeypatch.setattr(stream, "CAPTION_DECODE_THREADS", threads)
+    video = FFprobeVideoContainer(captioned_media, backend=backend)
+    subtitles = video.get_subtitles()
+    assert subtitles
+
+    benchmark.pedantic(
+        video.extract_subtitles,
+        args=(subtitles,),
+        kwargs={"custom_dir": str(tmp_path)},
+        rounds=3,
+    )
+    benchmark.extra_info["cues_per_sec"] = rate(benchmark, CAPTION_CUES)
+
+
+def test_validate_file(benchmark, tmp_path, media, backend):
+    video = FFprobeVideoContainer(media, backend=backend)
+    results = video.extract_subtitles(video.get_subtitles(), custom_dir=str(tmp_path))
+
+    def validate_all():
+        return [validate_file(result.path) for result in results.values()]
+
+    benchmark(validate_all)
+    benchmark.extra_info["mb_per_sec"] = rate(benchmark, _output_mb(results.values()))
+
+
+def test_ffmpeg_call_overhead(benchmark, ffmpeg):
+    benchmark(_ffmpeg_call, [ffmpeg, "-v", "quiet", "-version"])
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+import io
+
+from conftest import rate
+import pytest
+
+from fese import backends
+from fese import decoding
+from fese.container import FFprobeVideoContainer
+from fese.exceptions import InvalidSource
+
+
+def _backend(name):
+    try:
+        backend = backends.get_backend(name)
+        backend.probe("/non/existent/file")
+    except ImportError:
+        pytest.skip(f"{name} backend not available")
+    except InvalidSource:
+        pass
+
+    return backend
+
+
+@pytest.mark.parametrize("backend_name", ["ffprobe", "pyav"])
+def test_probe_files(benchmark, media, backend_name):
+    backend = _backend(backend_name)
+    video = FFprobeVideoContainer(media, backend=backend)
+    try:
+        video.get_subtitles()
+    except InvalidSource as error:
+        pytest.skip(str(error))
+
+    benchmark(video.get_subtitles)
+    benchmark.extra_info["files_per_sec"] = rate(benchmark, 1)
+
+
+@pytest.mark.parametrize("decoder", ["json", "orjson", "msgspec"])
+def test_decode_dump(benchmark, monkeypatch, ffprobe_dump, decoder):
+    if decoder != "json" and getattr(decoding, decoder) is None:
+        pytest.skip(f"{decoder} not installed")
+
+    monkeypatch.setattr(decoding, "DECODER", decoder)
+    benchmark(decoding.decode_probe, ffprobe_dump)
+    benchmark.extra_info["mb_per_sec"] = rate(benchmark, len(ffprobe_dump) / 1e6)
+
+
+@pytest.mark.parametrize("decoder", ["json", "orjson", "msgspec"])
+def test_decode_dump_stream(benchmark, monkeypatch, ffprobe_dump, decoder):
+    if decoder != "json" and getattr(decoding, decoder) is None:
+        pytest.skip(f"{decoder} not installed")
+
+    monkeypatch.setattr(decoding, "DECODER", decoder)
+    benchmark(lambda: decoding.decode_probe_stream(io.BytesIO(ffprobe_dump)))
+    benchmark.extra_info["mb_per_sec"] = rate(benchmark, len(ffprobe_dump) / 1e6)
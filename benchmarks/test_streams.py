@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+from conftest import rate
+
+from fese.exceptions import FeseError
+from fese.stream import codecs
+from fese.stream import FFprobeSubtitleStream
+
+
+def _construct(stream_dicts):
+    subs = []
+    for stream in stream_dicts:
+        try:
+            subs.append(FFprobeSubtitleStream(stream))
+        except FeseError:
+            pass
+
+    return subs
+
+
+def test_construct_streams(benchmark, stream_dicts):
+    benchmark(_construct, stream_dicts)
+    benchmark.extra_info["streams_per_sec"] = rate(benchmark, len(stream_dicts))
+
+
+def test_build_convert_args(benchmark, stream_dicts):
+    subs = _construct(stream_dicts)
+    text_subs = [sub for sub in subs if sub.convert_default_format]
+
+    def build():
+        return [sub.convert_args(None, "out.srt") for sub in text_subs]
+
+    benchmark(build)
+    benchmark.extra_info["streams_per_sec"] = rate(benchmark, len(text_subs))
+
+
+def test_build_copy_args(benchmark, stream_dicts):
+    subs = [sub for sub in _construct(stream_dicts) if codecs()[sub.codec_name].copy]
+
+    def build():
+        return [sub.copy_args(f"out.{sub.extension}") for sub in subs]
+
+    benchmark(build)
+    benchmark.extra_info["streams_per_sec"] = rate(benchmark, len(subs))
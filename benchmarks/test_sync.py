@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+from conftest import rate
+import pytest
+
+from fese import sync
+
+numpy = pytest.importorskip("numpy")
+
+_SECONDS = sync.SEGMENT_SECONDS
+
+
+@pytest.fixture(scope="module")
+def segment():
+    "A segment of noise with tone bursts every other second."
+    rng = numpy.random.default_rng(0)
+    samples = rng.normal(0, 30, _SECONDS * sync.SAMPLE_RATE)
+    times = numpy.arange(len(samples)) / sync.SAMPLE_RATE
+    voiced = times.astype(int) % 2 == 0
+    samples[voiced] += 8000 * numpy.sin(2 * numpy.pi * 1000 * times[voiced])
+    return samples.astype(numpy.int16)
+
+
+def test_voice_activity(benchmark, segment):
+    benchmark(sync.voice_activity, segment)
+    benchmark.extra_info["audio_seconds_per_sec"] = rate(benchmark, _SECONDS)
+
+
+def test_correlate_segment(benchmark, segment):
+    activity = sync.voice_activity(segment)
+    starts = numpy.arange(0, _SECONDS, 2) + 0.5
+    estimator = sync.OffsetEstimator(starts, starts + 1)
+    benchmark(estimator.add, activity, 0)
+    benchmark.extra_info["audio_seconds_per_sec"] = rate(benchmark, _SECONDS)
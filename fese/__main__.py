@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+# License: GPL
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,387 @@
+# -*- coding: utf-8 -*-
+# License: GPL
+
+from __future__ import annotations
+
+import io
+import itertools
+import logging
+import os
+import subprocess
+import tempfile
+import threading
+
+from . import source
+from .decoding import DECODE_ERRORS
+from .decoding import decode_probe
+from .decoding import decode_probe_stream
+from .exceptions import InvalidSource
+from .instrument import span
+
+try:
+    import av
+except ImportError:  # Optional dependency
+    av = None
+
+logger = logging.getLogger(__name__)
+
+
+class ProbeBackend:
+    """Base class for probe backends.
+
+    A backend takes a media source and returns a dictionary shaped like
+    FFprobe's JSON output (``{"streams": [...], "format": {...}}``)."""
+
+    name = None
+
+    def probe(self, path: str, timeout: int = 600) -> dict:
+        """
+        :param path: the media source
+        :param timeout: timeout in seconds (default: 600)
+        :raises: InvalidSource"""
+        raise NotImplementedError
+
+    def probe_data(self, data: bytes, timeout: int = 600) -> dict:
+        """Probes the head of a media file (e.g. buffered from a pipe). Backends
+        that can't read from memory probe a temporary copy.
+
+        :param data: the first bytes of the file, including the stream headers
+        :param timeout: timeout in seconds (default: 600)
+        :raises: InvalidSource"""
+        fd, path = tempfile.mkstemp(prefix="fese-probe-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            return self.probe(path, timeout=timeout)
+        finally:
+            os.remove(path)
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__}>"
+
+
+class FFprobeBackend(ProbeBackend):
+    """Probe backend that calls the FFprobe executable in a subprocess."""
+
+    name = "ffprobe"
+
+    def __init__(
+        self, ffprobe_path=None, log_level=None, streaming=True, stream_types=None
+    ):
+        """
+        :param ffprobe_path: path to the executable. Defaults to
+        `fese.container.FFPROBE_PATH`
+        :param log_level: FFprobe log level. Defaults to `fese.container.FF_LOG_LEVEL`
+        :param streaming: decode the output while it's read, within the limits
+        of fese.decoding (MAX_STREAMS, MAX_TAG_SIZE and MAX_ELEMENT_SIZE). The
+        whole output is buffered otherwise
+        :param stream_types: codec types of the streams kept by streaming
+        decoding (e.g. ("subtitle", "video", "attachment")). Defaults to every
+        stream
+        """
+        self.ffprobe_path = ffprobe_path
+        self.log_level = log_level
+        self.streaming = streaming
+        self.stream_types = stream_types
+
+    def command(self, path):
+        from . import container  # The globals might be patched at runtime
+
+        command = [
+            self.ffprobe_path or container.FFPROBE_PATH,
+            "-v",
+            self.log_level or container.FF_LOG_LEVEL,
+        ]
+        if source.is_url(path):
+            # Stream headers are read with a few range requests
+            command.extend(["-probesize", str(source.REMOTE_PROBESIZE)])
+
+        return command + [
+            "-print_format",
+            "json",
+            "-show_format",
+            "-show_streams",
+            "-show_chapters",
+            path,
+        ]
+
+    def probe(self, path, timeout=600):
+        return self._run(path, timeout)
+
+    def probe_data(self, data, timeout=600):
+        return self._run("pipe:0", timeout, data)
+
+    def _run(self, path, timeout, data=None):
+        if self.streaming:
+            return self._run_streaming(path, timeout, data)
+
+        try:
+            with span("probe.exec"):
+                result = subprocess.run(
+                    self.command(path),
+                    input=data,
+                    stdout=subprocess.PIPE,
+                    check=True,
+                    timeout=timeout,
+                )
+            with span("probe.decode", size=len(result.stdout)):
+                data = decode_probe(result.stdout)
+        except _ffprobe_exceptions as error:
+            raise InvalidSource(
+                f"{error} trying to get information from {path}"
+            ) from error  # We want to see the traceback
+
+        return data
+
+    def _run_streaming(self, path, timeout, data=None):
+        command = self.command(path)
+        try:
+            with span("probe.exec"):
+                proc = subprocess.Popen(
+                    command,
+                    stdin=None if data is None else subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                )
+                expired = threading.Event()
+                timer = threading.Timer(timeout, _expire, args=(proc, expired))
+                timer.start()
+                threads = []
+                if data is not None:
+                    threads.append(
+                        threading.Thread(target=_write_input, args=(proc.stdin, data))
+                    )
+                    threads[0].start()
+
+                try:
+                    with proc.stdout, span("probe.decode"):
+                        result = decode_probe_stream(proc.stdout, self.stream_types)
+                except BaseException as error:
+                    proc.kill()
+                    failure = error
+                else:
+                    failure = None
+                finally:
+                    returncode = proc.wait()
+                    timer.cancel()
+                    for thread in threads:
+                        thread.join()
+
+                # The output of failed calls is incomplete
+                if expired.is_set():
+                    raise subprocess.TimeoutExpired(command, timeout) from failure
+                if returncode and not isinstance(failure, KeyboardInterrupt):
+                    raise subprocess.CalledProcessError(
+                        returncode, command
+                    ) from failure
+                if failure is not None:
+                    raise failure
+        except _ffprobe_exceptions as error:
+            raise InvalidSource(
+                f"{error} trying to get information from {path}"
+            ) from error
+
+        return result
+
+
+class PyAVBackend(ProbeBackend):
+    """In-process probe backend using PyAV (libav* bindings).
+
+    The libraries are loaded once per process, so probing a file doesn't
+    need a fork/exec."""
+
+    name = "pyav"
+
+    def __init__(self, caption_frames: int = 0):
+        """
+        :param caption_frames: key frames of every video stream decoded to detect
+        closed captions, as PyAV doesn't expose the codec properties read by
+        FFprobe. Disabled by default (0)
+        """
+        if av is None:
+            raise ImportError("PyAV is required for this backend (pip install av)")
+
+        self.caption_frames = caption_frames
+
+    def probe(self, path, timeout=600):
+        options = {}
+        if source.is_url(path):
+            options["probesize"] = str(source.REMOTE_PROBESIZE)
+
+        return self._open(path, timeout, options)
+
+    def probe_data(self, data, timeout=600):
+        return self._open(io.BytesIO(data), timeout)
+
+    def _open(self, path, timeout, options=None):
+        try:
+            with av.open(path, timeout=timeout, options=options) as container:
+                data = {
+                    "streams": [_pyav_stream(stream) for stream in container.streams],
+                    "format": _pyav_format(container),
+                    "chapters": _pyav_chapters(container),
+                }
+                if self.caption_frames:
+                    for stream in container.streams.video:
+                        if _pyav_has_captions(container, stream, self.caption_frames):
+                            data["streams"][stream.index]["closed_captions"] = 1
+
+                return data
+        except (av.FFmpegError, OSError, ValueError) as error:
+            raise InvalidSource(
+                f"{error} trying to get information from {path}"
+            ) from error
+
+
+def get_backend(name: str) -> ProbeBackend:
+    """Returns a backend instance by name ('ffprobe' or 'pyav').
+
+    :raises: ValueError, ImportError"""
+    for cls_ in (FFprobeBackend, PyAVBackend):
+        if cls_.name == name:
+            return cls_()
+
+    raise ValueError(f"Unknown probe backend: {name}")
+
+
+def _pyav_stream(stream) -> dict:
+    time_base = stream.time_base
+    data = {
+        "index": stream.index,
+        "codec_type": stream.type,
+        "time_base": _fraction_str(time_base),
+    }
+
+    codec_context = stream.codec_context
+    if codec_context is not None:
+        data["codec_name"] = codec_context.codec.canonical_name
+
+    if stream.type == "video":
+        data["r_frame_rate"] = _fraction_str(stream.base_rate)
+        data["avg_frame_rate"] = _fraction_str(stream.average_rate)
+        data["width"] = codec_context.width
+        data["height"] = codec_context.height
+    else:
+        data["r_frame_rate"] = data["avg_frame_rate"] = "0/0"
+
+    if stream.type == "audio":
+        data["sample_rate"] = str(codec_context.sample_rate)
+        data["channels"] = codec_context.channels
+        data["channel_layout"] = codec_context.layout.name
+
+    if codec_context is not None and codec_context.bit_rate:
+        data["bit_rate"] = str(codec_context.bit_rate)
+
+    if stream.start_time is not None:
+        data["start_pts"] = stream.start_time
+        data["start_time"] = _seconds_str(stream.start_time, time_base)
+
+    if stream.duration is not None:
+        data["duration_ts"] = stream.duration
+        data["duration"] = _seconds_str(stream.duration, time_base)
+
+    if stream.frames:
+        data["nb_frames"] = str(stream.frames)
+
+    disposition = stream.disposition
+    data["disposition"] = {
+        key: int(bool(disposition & flag))
+        for key, flag in type(disposition).__members__.items()
+    }
+    data["tags"] = dict(stream.metadata)
+    return data
+
+
+def _pyav_has_captions(container, stream, frames) -> bool:
+    "Decodes key frames of a video stream looking for A/53 caption side data."
+    if stream.codec_context is None:
+        return False
+
+    stream.codec_context.skip_frame = "NONKEY"
+    stream.codec_context.thread_count = 1
+    try:
+        container.seek(0)
+        for frame in itertools.islice(container.decode(stream), frames):
+            if any(item.type.name == "A53_CC" for item in frame.side_data):
+                return True
+    except (av.FFmpegError, ValueError) as error:
+        logger.debug("Couldn't decode stream %s: %s", stream.index, error)
+
+    return False
+
+
+def _pyav_format(container) -> dict:
+    data = {
+        "filename": container.name,
+        "nb_streams": len(container.streams),
+        "format_name": container.format.name,
+        "format_long_name": container.format.long_name,
+    }
+    # Container times are expressed in AV_TIME_BASE (microseconds)
+    if container.start_time is not None:
+        data["start_time"] = f"{container.start_time / 1000000:f}"
+
+    if container.duration is not None:
+        data["duration"] = f"{container.duration / 1000000:f}"
+
+    if container.size:
+        data["size"] = str(container.size)
+
+    if container.bit_rate:
+        data["bit_rate"] = str(container.bit_rate)
+
+    data["tags"] = dict(container.metadata)
+    return data
+
+
+def _pyav_chapters(container) -> list:
+    chapters = []
+    # Container.chapters() was added in PyAV 14
+    for chapter in getattr(container, "chapters", list)():
+        time_base = chapter["time_base"]
+        chapters.append(
+            {
+                "id": chapter["id"],
+                "time_base": _fraction_str(time_base),
+                "start": chapter["start"],
+                "start_time": _seconds_str(chapter["start"], time_base),
+                "end": chapter["end"],
+                "end_time": _seconds_str(chapter["end"], time_base),
+                "tags": dict(chapter["metadata"]),
+            }
+        )
+
+    return chapters
+
+
+def _fraction_str(value) -> str:
+    if value is None:
+        return "0/0"
+
+    return f"{value.numerator}/{value.denominator}"
+
+
+def _seconds_str(value, time_base) -> str:
+    if time_base is None:
+        return "0.000000"
+
+    return f"{float(value * time_base):f}"
+
+
+def _expire(proc, expired):
+    expired.set()
+    proc.kill()
+
+
+def _write_input(stdin, data):
+    try:
+        with stdin:
+            stdin.write(data)
+    except BrokenPipeError:  # FFprobe doesn't need to read the whole input
+        pass
+
+
+_ffprobe_exceptions = (
+    subprocess.SubprocessError,
+    FileNotFoundError,
+    KeyError,
+) + DECODE_ERRORS
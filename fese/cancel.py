@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# License: GPL
+
+"""Cooperative cancellation of FFmpeg calls.
+
+A token can be shared by many calls (e.g. every extraction of a batch job) and
+cancelled from any thread. Running calls terminate their FFmpeg process group
+and remove their partial outputs. Calls started after the cancellation fail
+immediately."""
+
+from __future__ import annotations
+
+import threading
+
+from .exceptions import ExtractionCancelled
+
+
+class CancellationToken:
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        "Returns True once cancelled, or False if the timeout expired before."
+        return self._event.wait(timeout)
+
+    def raise_if_cancelled(self):
+        ":raises: ExtractionCancelled"
+        if self.cancelled:
+            raise ExtractionCancelled("Extraction cancelled")
+
+    def __repr__(self) -> str:
+        return f"<CancellationToken cancelled={self.cancelled}>"
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# License: GPL
+
+"""Charset normalization of text subtitle outputs.
+
+FFmpeg writes converted subtitles as UTF-8, but it drops the cues it can't
+decode as UTF-8 unless the charset of the source is set (-sub_charenc). Copied
+streams keep the bytes of the source. Outputs are normalized while FFmpeg
+writes them (see FFprobeVideoContainer.extract_subtitles `output_encoding`), so
+consumers don't have to read and encode them again.
+
+Usage:
+    transcoder = StreamTranscoder("utf-8")
+    for chunk in chunks:
+        file.write(transcoder.feed(chunk))
+    file.write(transcoder.finish())
+    transcoder.encoding  # The detected charset of the input
+"""
+
+from __future__ import annotations
+
+import codecs
+import logging
+
+try:
+    import charset_normalizer
+except ImportError:  # Optional dependency
+    charset_normalizer = None
+
+logger = logging.getLogger(__name__)
+
+# Charset of non UTF-8 data if charset_normalizer is not installed or can't
+# detect it
+FALLBACK_ENCODING = "cp1252"
+
+# Bytes buffered to detect the charset of non UTF-8 data
+DETECT_SIZE = 64 * 1024
+
+
+class StreamTranscoder:
+    """Transcodes a text stream chunk by chunk.
+
+    Unless the input charset is known, the input is decoded as UTF-8 until the
+    first undecodable sequence. The charset of the rest is then detected from
+    its first DETECT_SIZE bytes, unless non-ASCII UTF-8 was already found
+    (mixed encodings), in which case bad bytes are replaced (U+FFFD).
+    """
+
+    def __init__(self, output_encoding: str = "utf-8", input_encoding: str = None):
+        """
+        :param output_encoding: the charset of the output
+        :param input_encoding: the charset of the input. Detected if None
+        :raises: LookupError
+        """
+        self.output_encoding = codecs.lookup(output_encoding).name
+        # Characters missing in legacy output charsets are replaced ("?").
+        # Incremental, so BOMs (e.g. UTF-16) are only written once
+        self._encoder = codecs.getincrementalencoder(self.output_encoding)("replace")
+        self.encoding = codecs.lookup(input_encoding or "utf-8").name
+        self._strict = input_encoding is None  # Until an undecodable sequence
+        self._decoder = codecs.getincrementaldecoder(self.encoding)(
+            "strict" if self._strict else "replace"
+        )
+        self._non_ascii = False
+        self._undetected = None  # Bytes buffered to detect the charset
+
+    def feed(self, data: bytes) -> bytes:
+        "Returns a transcoded chunk. Incomplete characters wait for the next one."
+        return self.encode(self.decode(data))
+
+    def finish(self) -> bytes:
+        "Returns the transcoded remaining data."
+        return self.encode(self.decode(b"", True), True)
+
+    def encode(self, text: str, final: bool = False) -> bytes:
+        "Returns the output bytes of decoded text."
+        return self._encoder.encode(text, final)
+
+    def decode(self, data: bytes, final: bool = False) -> str:
+        "Returns the text of a chunk."
+        if self._undetected is not None:
+            self._undetected += data
+            if len(self._undetected) < DETECT_SIZE and not final:
+                return ""
+
+            data, self._undetected = bytes(self._undetected), None
+            self.encoding = detect_encoding(data)
+            logger.debug("Invalid UTF-8. Detected charset: %s", self.encoding)
+            self._decoder = codecs.getincrementaldecoder(self.encoding)("replace")
+
+        if not self._strict:
+            return self._decoder.decode(data, final)
+
+        try:
+            text = self._decoder.decode(data, final)
+        except UnicodeDecodeError as error:
+            # The error refers to the buffered and the new bytes
+            valid = error.object[: error.start].decode("utf-8")
+            self._strict = False
+            if self._non_ascii or not valid.isascii():
+                logger.debug("Invalid UTF-8 after UTF-8 text. Replacing bad bytes")
+                self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+            else:
+                # Detected once enough data is buffered
+                self._undetected = bytearray()
+
+            return valid + self.decode(error.object[error.start :], final)
+
+        if not self._non_ascii and not text.isascii():
+            self._non_ascii = True
+        return text
+
+
+def detect_encoding(data: bytes) -> str:
+    """Returns the Python codec name of the charset of non UTF-8 data.
+    Defaults to FALLBACK_ENCODING."""
+    if charset_normalizer is not None:
+        match = charset_normalizer.from_bytes(data).best()
+        if match is not None:
+            return match.encoding
+
+    return FALLBACK_ENCODING
@@ -0,0 +1,573 @@
+# -*- coding: utf-8 -*-
+# License: GPL
+
+"""Command-line interface for bulk probing and extraction.
+
+Usage:
+    fese probe /media/movies --include '*.mkv' > probe.ndjson
+    fese extract /media/tv --language en --checkpoint done.txt --dry-run
+    fese copy /media/anime --custom-dir /subs --extract-workers 4
+    fese watch /media/tv --action extract --language en
+
+Results are written as NDJSON (one JSON object per media file)."""
+
+from __future__ import annotations
+
+import argparse
+import codecs
+import fnmatch
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+from . import __version__
+from .backends import get_backend
+from .cancel import CancellationToken
+from .container import _charset_args
+from .container import FFprobeVideoContainer
+from .exceptions import FeseError
+from .fonts import FontStore
+from .langid import verify_languages
+from .policy import ExecutionPolicy
+from .policy import Limiter
+from .source import is_url
+from .watch import Watcher
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INCLUDE = ("*.mkv", "*.mp4", "*.m4v", "*.webm", "*.avi", "*.mov", "*.ts")
+
+_DONE = object()
+
+# Seconds to wait for every worker to stop when interrupted
+_JOIN_TIMEOUT = 5
+
+
+def walk(roots, include=DEFAULT_INCLUDE, exclude=()):
+    """Yields media paths under the roots using os.scandir.
+
+    Globs are matched against both the file name and the full path. Excluded
+    directories are not traversed. URL roots are yielded as they are."""
+    stack = list(roots)
+    while stack:
+        root = stack.pop()
+        if os.path.isfile(root) or is_url(root):
+            yield root
+            continue
+
+        try:
+            entries = sorted(os.scandir(root), key=lambda entry: entry.name)
+        except OSError as error:
+            logger.warning("Ignoring %s: %s", root, error)
+            continue
+
+        subdirs = []
+        for entry in entries:
+            if _matches(entry, exclude):
+                continue
+
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+            elif entry.is_file() and _matches(entry, include):
+                yield entry.path
+
+        stack.extend(reversed(subdirs))
+
+
+def _matches(entry, globs):
+    return any(
+        fnmatch.fnmatch(entry.name, glob) or fnmatch.fnmatch(entry.path, glob)
+        for glob in globs
+    )
+
+
+def stream_info(subtitle) -> dict:
+    return {
+        "index": subtitle.index,
+        "codec_name": subtitle.codec_name,
+        "type": subtitle.type,
+        "language": subtitle.tags.suffix,
+        "disposition": subtitle.disposition.suffix or "generic",
+        "default": subtitle.disposition.default,
+        "frames": subtitle.tags.frames,
+        "language_confidence": subtitle.tags.language_confidence,
+    }
+
+
+class Pipeline:
+    """Discovery -> probe -> selection -> extraction through bounded queues.
+
+    :param args: parsed command-line arguments
+    :param output: a text file for the NDJSON results
+    """
+
+    def __init__(self, args, output):
+        self.args = args
+        self.output = output
+        self.backend = get_backend(args.backend)
+        self.policy = _policy(args)
+        font_store = getattr(args, "font_store", None)
+        self.font_store = None if font_store is None else FontStore(font_store)
+        self.errors = 0
+        self._completed = _load_checkpoint(args.checkpoint)
+        self._checkpoint = None
+        self._stop = threading.Event()
+        # Terminates the running ffmpeg calls when interrupted
+        self._cancel = CancellationToken()
+
+    def run(self) -> int:
+        args = self.args
+        extracting = args.command != "probe"
+
+        paths = queue.Queue(args.queue_size)
+        probed = queue.Queue(args.queue_size)
+        results = queue.Queue(args.queue_size)
+
+        threads = [threading.Thread(target=self._discover, args=(paths,))]
+        probe_threads = [
+            threading.Thread(
+                target=self._probe_worker,
+                args=(paths, probed if extracting else results),
+            )
+            for _ in range(args.probe_workers)
+        ]
+        threads += probe_threads
+        if extracting:
+            threads += [
+                threading.Thread(target=self._extract_worker, args=(probed, results))
+                for _ in range(args.extract_workers)
+            ]
+            threads.append(
+                threading.Thread(
+                    target=self._close_stage,
+                    args=(probe_threads, probed, args.extract_workers),
+                )
+            )
+
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        if args.checkpoint and not args.dry_run:
+            self._checkpoint = open(args.checkpoint, "a", encoding="utf-8")
+
+        # Every worker of the last stage signals its end with a _DONE
+        workers_left = args.extract_workers if extracting else args.probe_workers
+        try:
+            while workers_left:
+                item = results.get()
+                if item is _DONE:
+                    workers_left -= 1
+                    continue
+
+                self._write(item)
+        except KeyboardInterrupt:
+            self.stop()
+            deadline = time.monotonic() + _JOIN_TIMEOUT
+            for thread in threads:
+                thread.join(max(0, deadline - time.monotonic()))
+            logger.warning("Interrupted. Resume with the same --checkpoint")
+            raise
+        finally:
+            if self._checkpoint is not None:
+                self._checkpoint.close()
+
+        return 1 if self.errors else 0
+
+    def stop(self):
+        "Stops discovery and terminates the running extractions."
+        self._stop.set()
+        self._cancel.cancel()
+
+    def _discover(self, paths):
+        try:
+            for path in walk(self.args.roots, self.args.include, self.args.exclude):
+                if self._stop.is_set():
+                    break
+
+                if path in self._completed:
+                    logger.debug("Already done: %s", path)
+                    continue
+
+                paths.put(path)
+        finally:
+            for _ in range(self.args.probe_workers):
+                paths.put(_DONE)
+
+    @staticmethod
+    def _close_stage(threads, out, consumers):
+        for thread in threads:
+            thread.join()
+
+        for _ in range(consumers):
+            out.put(_DONE)
+
+    def _probe_worker(self, paths, out):
+        try:
+            while True:
+                path = paths.get()
+                if path is _DONE:
+                    break
+
+                if not self._stop.is_set():
+                    out.put(self._probe(path))
+        finally:
+            if self.args.command == "probe":
+                out.put(_DONE)
+
+    def _probe(self, path):
+        video = FFprobeVideoContainer(path, backend=self.backend, policy=self.policy)
+        result = {"path": path}
+        try:
+            subtitles = video.get_subtitles(timeout=self.args.timeout)
+        except FeseError as error:
+            result.update(status="error", error=str(error))
+            return result
+
+        if self.args.verify_language:
+            try:
+                verify_languages(video, subtitles, timeout=self.args.timeout)
+            except (FeseError, OSError) as error:
+                logger.warning("Couldn't verify languages of %s: %s", path, error)
+
+        result["streams"] = [stream_info(sub) for sub in subtitles]
+        if self.args.command == "probe":
+            result["status"] = "ok"
+            return result
+
+        return video, self._select(subtitles), result
+
+    def _select(self, subtitles):
+        args = self.args
+        selected = []
+        for subtitle in subtitles:
+            if args.language and not any(
+                subtitle.tags.suffix.lower().startswith(lang.lower())
+                for lang in args.language
+            ):
+                continue
+
+            if args.command == "extract" and not subtitle.convert_default_format:
+                continue  # Bitmap subtitles can't be converted
+
+            selected.append(subtitle)
+
+        return selected
+
+    def _extract_worker(self, probed, out):
+        try:
+            while True:
+                item = probed.get()
+                if item is _DONE:
+                    break
+
+                if isinstance(item, dict):  # Probe error
+                    out.put(item)
+                    continue
+
+                video, subtitles, result = item
+                if self._stop.is_set():
+                    continue
+
+                try:
+                    result.update(self._extract(video, subtitles))
+                except (FeseError, OSError) as error:
+                    result.update(status="error", error=str(error))
+
+                out.put(result)
+        finally:
+            out.put(_DONE)
+
+    def _extract(self, video, subtitles) -> dict:
+        args = self.args
+        overwrite = not args.no_overwrite
+
+        if args.dry_run:
+            if args.command == "extract":
+                command, items = video._convert_command(
+                    subtitles,
+                    args.custom_dir,
+                    overwrite,
+                    args.format,
+                    None,
+                    media_args=_charset_args(args.source_encoding),
+                )
+            else:
+                command, items = video._copy_command(
+                    subtitles,
+                    args.custom_dir,
+                    overwrite,
+                    not args.no_fallback,
+                    None,
+                    media_args=_charset_args(args.source_encoding),
+                )
+            outputs = {
+                index: result.path
+                for index, result in items.items()
+                if not result.skipped
+            }
+            return {
+                "status": "ok",
+                "command": command if outputs else None,
+                "outputs": outputs,
+            }
+
+        if args.command == "extract":
+            items = video.extract_subtitles(
+                subtitles,
+                custom_dir=args.custom_dir,
+                overwrite=overwrite,
+                timeout=args.timeout,
+                convert_format=args.format,
+                cancel=self._cancel,
+                validate=args.validate,
+                output_encoding=args.output_encoding,
+                source_encoding=args.source_encoding,
+            )
+        else:
+            items = video.copy_subtitles(
+                subtitles,
+                custom_dir=args.custom_dir,
+                overwrite=overwrite,
+                timeout=args.timeout,
+                fallback_to_convert=not args.no_fallback,
+                cancel=self._cancel,
+                font_store=self.font_store,
+                validate=args.validate,
+                output_encoding=args.output_encoding,
+                source_encoding=args.source_encoding,
+            )
+
+        return {
+            "status": _status(items.values()),
+            "outputs": {index: result.as_dict() for index, result in items.items()},
+        }
+
+    def _write(self, result):
+        self.output.write(json.dumps(result) + "\n")
+        self.output.flush()
+
+        if result["status"] != "ok":
+            self.errors += 1
+        elif self._checkpoint is not None:
+            self._checkpoint.write(result["path"] + "\n")
+            self._checkpoint.flush()
+
+
+class WatchPipeline(Pipeline):
+    """A pipeline fed with new or modified paths by a Watcher. Runs until
+    interrupted."""
+
+    def __init__(self, args, output):
+        super().__init__(args, output)
+        # Modified files have to be processed again
+        self._completed = set()
+        self.watcher = Watcher(
+            args.roots,
+            None,
+            include=args.include,
+            exclude=args.exclude,
+            debounce=args.debounce,
+            poll_interval=args.poll_interval,
+        )
+
+    def run(self) -> int:
+        try:
+            return super().run()
+        except KeyboardInterrupt:
+            return 1 if self.errors else 0
+
+    def stop(self):
+        self.watcher.stop()
+        super().stop()
+
+    def _discover(self, paths):
+        # The bounded queue blocks the watcher when the workers fall behind
+        self.watcher.callback = paths.put
+        try:
+            self.watcher.run()
+        finally:
+            for _ in range(self.args.probe_workers):
+                paths.put(_DONE)
+
+
+def _status(results):
+    """Returns "ok" if every stream was extracted (or skipped), "partial" if
+    some weren't or "error" if none was. Only "ok" files are checkpointed."""
+    failed = sum(1 for result in results if not result.ok and not result.skipped)
+    if not failed:
+        return "ok"
+
+    return "error" if failed == len(results) else "partial"
+
+
+def _policy(args):
+    if getattr(args, "extract_workers", None) is None:
+        return None
+
+    limiter = None
+    if args.max_ffmpeg or args.read_rate:
+        limiter = Limiter(
+            max_processes=args.max_ffmpeg,
+            read_rate=args.read_rate * 1024**2 if args.read_rate else None,
+        )
+
+    return ExecutionPolicy(
+        nice=args.nice,
+        ionice_class=args.ionice,
+        threads=args.ffmpeg_threads,
+        limiter=limiter,
+    )
+
+
+def _encoding(value):
+    try:
+        codecs.lookup(value)
+    except LookupError:
+        raise argparse.ArgumentTypeError(f"unknown encoding: {value}")
+    return value
+
+
+def _load_checkpoint(path):
+    if not path or not os.path.isfile(path):
+        return set()
+
+    with open(path, encoding="utf-8") as file:
+        return {line.rstrip("\n") for line in file if line.strip()}
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog="fese", description="Bulk probe and extraction of subtitle streams"
+    )
+    parser.add_argument("--version", action="version", version=__version__)
+    parser.add_argument("-v", "--verbose", action="store_true", help="debug logging")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("roots", nargs="+", help="media files or directories")
+    common.add_argument(
+        "--include",
+        action="append",
+        help=f"glob of files to process (default: {' '.join(DEFAULT_INCLUDE)})",
+    )
+    common.add_argument(
+        "--exclude", action="append", default=[], help="glob of paths to skip"
+    )
+    common.add_argument("--backend", default="ffprobe", help="ffprobe or pyav")
+    common.add_argument("--probe-workers", type=int, default=4)
+    common.add_argument("--queue-size", type=int, default=64)
+    common.add_argument("--timeout", type=int, default=600)
+    common.add_argument(
+        "--verify-language",
+        action="store_true",
+        help="verify language tags by sampling the cues of text streams",
+    )
+    common.add_argument(
+        "--checkpoint", help="file recording processed paths to resume a run"
+    )
+    common.add_argument("-o", "--output", help="NDJSON output (default: stdout)")
+
+    extraction = argparse.ArgumentParser(add_help=False)
+    extraction.add_argument("--extract-workers", type=int, default=2)
+    extraction.add_argument("--custom-dir")
+    extraction.add_argument("--no-overwrite", action="store_true")
+    extraction.add_argument(
+        "--language",
+        action="append",
+        help="only streams with this language suffix (e.g. en, es-MX)",
+    )
+    extraction.add_argument(
+        "--dry-run", action="store_true", help="print the planned ffmpeg commands"
+    )
+    extraction.add_argument("--nice", type=int, help="ffmpeg niceness increment")
+    extraction.add_argument(
+        "--ionice", choices=("realtime", "best-effort", "idle"), help="ffmpeg IO class"
+    )
+    extraction.add_argument("--ffmpeg-threads", type=int)
+    extraction.add_argument(
+        "--max-ffmpeg", type=int, help="maximum concurrent ffmpeg processes"
+    )
+    extraction.add_argument(
+        "--read-rate", type=float, help="aggregate ffmpeg read rate in MiB/s"
+    )
+    extraction.add_argument(
+        "--validate", action="store_true", help="validate and score text outputs"
+    )
+    extraction.add_argument(
+        "--output-encoding", type=_encoding, help="charset of the text outputs"
+    )
+    extraction.add_argument(
+        "--source-encoding", type=_encoding, help="charset of the text streams"
+    )
+
+    commands.add_parser("probe", parents=[common], help="probe subtitle streams")
+    extract = commands.add_parser(
+        "extract", parents=[common, extraction], help="extract converting streams"
+    )
+    extract.add_argument("--format", help="convert format (default: srt)")
+    copy = commands.add_parser(
+        "copy", parents=[common, extraction], help="extract copying streams"
+    )
+    copy.add_argument("--no-fallback", action="store_true")
+    copy.add_argument(
+        "--font-store", help="directory of the shared store of ASS/SSA fonts"
+    )
+    watch = commands.add_parser(
+        "watch",
+        parents=[common, extraction],
+        help="process new or modified files as they appear",
+    )
+    watch.add_argument(
+        "--action", choices=("probe", "extract", "copy"), default="probe"
+    )
+    watch.add_argument("--format", help="convert format (default: srt)")
+    watch.add_argument("--no-fallback", action="store_true")
+    watch.add_argument(
+        "--font-store", help="directory of the shared store of ASS/SSA fonts"
+    )
+    watch.add_argument(
+        "--debounce",
+        type=float,
+        default=2.0,
+        help="seconds a file has to stay unchanged before processing it",
+    )
+    watch.add_argument(
+        "--poll-interval",
+        type=float,
+        default=60.0,
+        help="seconds between scans where inotify is not available",
+    )
+
+    return parser
+
+
+def main(argv=None):
+    args = _parser().parse_args(argv)
+    args.include = args.include or DEFAULT_INCLUDE
+    for key in ("extract_workers", "language", "dry_run", "custom_dir", "no_overwrite"):
+        setattr(args, key, getattr(args, key, None))
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.WARNING,
+        format="%(levelname)s %(name)s: %(message)s",
+    )
+
+    pipeline_cls = Pipeline
+    if args.command == "watch":
+        args.command = args.action
+        pipeline_cls = WatchPipeline
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            return pipeline_cls(args, output).run()
+
+    return pipeline_cls(args, sys.stdout).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
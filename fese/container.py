@@ -3,18 +3,44 @@
 
 from __future__ import annotations
 
-import json
+import codecs
+import io
 import logging
 import os
+import queue
 import re
+import secrets
+import shutil
+import signal
 import subprocess
+import threading
 import time
 
+from . import charset
+from . import validate
+from .backends import FFprobeBackend
+from .backends import ProbeBackend
+from .cancel import CancellationToken
 from .exceptions import ExtractionError
-from .exceptions import InvalidSource
-from .exceptions import LanguageNotFound
 from .exceptions import UnsupportedCodec
-from .stream import FFprobeSubtitleStream
+from .fonts import FontStore
+from .fonts import is_font
+from .instrument import span
+from .policy import ExecutionPolicy
+from .probe import ProbeResult
+from .result import CONVERT
+from .result import COPY
+from .result import ExtractionResult
+from .result import FALLBACK
+from .result import SKIPPED_EXISTS
+from .source import FileInput
+from .source import is_file_object
+from .source import is_url
+from .source import source_name
+from .timing import _seconds
+from .timing import sample_windows
+from .timing import timing_args
+from .timing import window_args
 
 logger = logging.getLogger(__name__)
 
@@ -25,92 +51,249 @@ FFMPEG_PATH = os.environ.get("FFMPEG_PATH", "ffmpeg")
 FFMPEG_STATS = True
 FF_LOG_LEVEL = "quiet"
 
+# Backend used by containers without a custom one
+PROBE_BACKEND: ProbeBackend = FFprobeBackend()
+
+# Priorities and limits of FFmpeg calls of containers without a custom policy
+EXECUTION_POLICY = ExecutionPolicy()
+
+# Parse the muxed packets of every output (ExtractionResult.cues) from ffmpeg's
+# log. The log level of extractions is raised to verbose, which slows them down
+COLLECT_STATS = False
+
+# Seconds given to ffmpeg to exit after SIGTERM
+TERMINATE_TIMEOUT = 2
+
+_POLL_INTERVAL = 0.1
+
+_LOG_LEVELS = ("quiet", "panic", "fatal", "error", "warning", "info", "verbose")
+
+_OUTPUT_FILE_RE = re.compile(r"Output file #(\d+) \((.*)\):")
+_OUTPUT_STREAM_RE = re.compile(r"Output stream #(\d+):\d+ .*?(\d+) packets muxed")
+
 _PROGRESS_RE = re.compile(
     r"size=\s*(\d+\w*B|N/A)\s+time=(\d+:\d+:\d+\.\d+)\s+bitrate=\s*([\d\.]+(?:e[\+\-]?\d+)?\w*bits/s|N/A)\s+speed=([\d\.]+(?:e[\+\-]?\d+)?x|N/A)"
 )
 
 
-def _ffmpeg_call(command, log_callback=None, progress_callback=None, timeout=10000):
+def _ffmpeg_call(
+    command,
+    log_callback=None,
+    progress_callback=None,
+    timeout=10000,
+    policy=None,
+    cancel=None,
+    input_chunks=None,
+    pass_fds=(),
+    read_bytes=None,
+):
+    """
+    :param input_chunks: an iterable of bytes written to ffmpeg's stdin (pipe:0)
+    :param pass_fds: file descriptors kept open in ffmpeg (e.g. pipe:N outputs)
+    :param read_bytes: estimate of the bytes read, charged by the policy. Defaults
+    to the size of the input files
+    :raises: SubprocessError, FileNotFoundError, ExtractionCancelled
+    """
+    if cancel is not None:
+        cancel.raise_if_cancelled()
+
+    policy = policy or EXECUTION_POLICY
+    if input_chunks is not None:
+        input_chunks = policy.meter(input_chunks)
+
+    with policy.acquire(command, read_bytes), span("ffmpeg", command=command[0]):
+        _ffmpeg_run(
+            policy.wrap(command),
+            log_callback,
+            progress_callback,
+            timeout,
+            cancel,
+            input_chunks,
+            pass_fds,
+        )
+
+
+def _ffmpeg_run(
+    command,
+    log_callback,
+    progress_callback,
+    timeout,
+    cancel,
+    input_chunks=None,
+    pass_fds=(),
+):
+    # A new session, so the whole process group can be terminated
     proc = subprocess.Popen(
         command,
-        stdout=subprocess.PIPE,
+        stdin=subprocess.DEVNULL if input_chunks is None else subprocess.PIPE,
+        stdout=subprocess.DEVNULL,
         stderr=subprocess.PIPE,
-        universal_newlines=True,
+        start_new_session=True,
+        pass_fds=pass_fds,
     )
     log_callback = log_callback or logger.debug
 
-    start = time.time()
+    if input_chunks is not None:
+        feeder = threading.Thread(target=_feed, args=(proc.stdin, input_chunks))
+        feeder.daemon = True
+        feeder.start()
+
+    # Lines are read in a thread so timeouts and cancellations are noticed while
+    # ffmpeg is silent
+    lines = queue.Queue()
+    stderr = io.TextIOWrapper(proc.stderr, errors="replace")
+    reader = threading.Thread(target=_read_lines, args=(stderr, lines))
+    reader.daemon = True
+    reader.start()
+
+    start = time.monotonic()
+
+    try:
+        while True:
+            try:
+                line = lines.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                line = ""
 
-    while True:
-        line = proc.stderr.readline()
-        if not line:
-            break
+            if line is None:
+                break
 
-        if line:
-            log_callback("ffmpeg: %s", line.strip())
+            if line:
+                log_callback("ffmpeg: %s", line.strip())
 
-        if progress_callback is not None:
-            match = _PROGRESS_RE.search(line)
-            if match:
-                size, time_, bitrate, speed = match.groups()
-                info = {"size": size, "time": time_, "bitrate": bitrate, "speed": speed}
-            else:
-                info = {"size": "n/a", "time": "n/a", "bitrate": "n/a", "speed": "n/a"}
+                # Other lines (e.g. verbose stats) aren't progress reports
+                if progress_callback is not None and _PROGRESS_RE.search(line):
+                    progress_callback(_progress_info(line))
 
-            progress_callback(info)
+            if cancel is not None:
+                cancel.raise_if_cancelled()
 
-        if timeout is not None and time.time() - start > timeout:
-            proc.kill()
-            raise subprocess.TimeoutExpired(command, timeout)
+            if timeout is not None and time.monotonic() - start > timeout:
+                raise subprocess.TimeoutExpired(command, timeout)
 
         return_code = proc.wait()
         if return_code != 0:
             raise subprocess.CalledProcessError(return_code, command)
+    finally:
+        _terminate(proc)
+        stderr.close()
+
+
+def _read_lines(stream, lines):
+    try:
+        for line in stream:
+            lines.put(line)
+    except (OSError, ValueError):  # Closed on termination
+        pass
+    finally:
+        lines.put(None)
+
+
+def _feed(stdin, chunks):
+    try:
+        for chunk in chunks:
+            stdin.write(chunk)
+    except (OSError, ValueError):  # ffmpeg exited or was terminated
+        pass
+    except Exception as error:
+        logger.warning("Error reading the source: %s", error)
+    finally:
+        try:
+            stdin.close()
+        except OSError:
+            pass
+
+
+def _progress_info(line):
+    match = _PROGRESS_RE.search(line)
+    if match:
+        size, time_, bitrate, speed = match.groups()
+        return {"size": size, "time": time_, "bitrate": bitrate, "speed": speed}
+
+    return {"size": "n/a", "time": "n/a", "bitrate": "n/a", "speed": "n/a"}
+
+
+def _terminate(proc):
+    if proc.poll() is not None:
+        return
+
+    logger.debug("Terminating ffmpeg process group %s", proc.pid)
+    for sig, wait in ((signal.SIGTERM, TERMINATE_TIMEOUT), (signal.SIGKILL, None)):
+        try:
+            os.killpg(proc.pid, sig)
+        except ProcessLookupError:
+            return
+
+        try:
+            proc.wait(wait)
+            return
+        except subprocess.TimeoutExpired:
+            logger.warning("ffmpeg didn't terminate in %ss. Killing it", wait)
 
 
 class FFprobeVideoContainer:
-    def __init__(self, path: str):
-        self.path = path
+    def __init__(
+        self, path, backend: ProbeBackend = None, policy: ExecutionPolicy = None
+    ):
+        """
+        :param path: the media file. Either a path, a URL supported by FFmpeg
+        (e.g. "https://host/movie.mkv") or a binary file object such as
+        sys.stdin.buffer. Outputs of non-local sources are saved in the working
+        directory unless a custom_dir is set
+        :param backend: a custom probe backend. Defaults to `PROBE_BACKEND`
+        :param policy: a custom execution policy for FFmpeg calls. Defaults to
+        `EXECUTION_POLICY`
+        """
+        if is_file_object(path):
+            self.input = FileInput(path)
+            self.path = "pipe:0"
+        else:
+            self.input = None
+            self.path = os.fspath(path)
+
+        self.backend = backend
+        self.policy = policy
+        self._probe_result = None
+
+    @property
+    def is_local(self) -> bool:
+        return self.input is None and not is_url(self.path)
+
+    @property
+    def name(self) -> str:
+        "The file name of the source."
+        return source_name(self.path if self.input is None else self.input.file)
 
     @property
     def extension(self):
-        return os.path.splitext(self.path)[-1].lstrip(".")
+        return os.path.splitext(self.name)[-1].lstrip(".")
 
-    def get_subtitles(self, timeout: int = 600):
-        """Factory function to create subtitle (stream) instances from FFprobe.
+    def probe(self, timeout: int = 600) -> ProbeResult:
+        """Probes the container once. Later calls return the same ProbeResult.
 
         :param timeout: subprocess timeout in seconds (default: 600)
         :raises: InvalidSource"""
+        if self._probe_result is None:
+            backend = self.backend or PROBE_BACKEND
+            with span("probe", path=self.path, backend=backend.name):
+                if self.input is not None:
+                    data = backend.probe_data(self.input.head(), timeout=timeout)
+                else:
+                    data = backend.probe(self.path, timeout=timeout)
 
-        ff_command = [
-            FFPROBE_PATH,
-            "-v",
-            FF_LOG_LEVEL,
-            "-print_format",
-            "json",
-            "-show_format",
-            "-show_streams",
-            self.path,
-        ]
-        try:
-            result = subprocess.run(
-                ff_command, stdout=subprocess.PIPE, check=True, timeout=timeout
-            )
-            streams = json.loads(result.stdout)["streams"]
-        except _ffprobe_exceptions as error:
-            raise InvalidSource(
-                f"{error} trying to get information from {self.path}"
-            ) from error  # We want to see the traceback
-
-        subs = []
-        for stream in streams:
-            if stream.get("codec_type", "n/a") != "subtitle":
-                continue
-            try:
-                subs.append(FFprobeSubtitleStream(stream))
-            except (LanguageNotFound, UnsupportedCodec) as error:
-                logger.debug("Ignoring %s: %s", stream.get("codec_name"), error)
+            self._probe_result = ProbeResult(data)
+
+        return self._probe_result
+
+    def get_subtitles(self, timeout: int = 600):
+        """Factory function to create subtitle (stream) instances from FFprobe.
+
+        The container is probed once (see probe): every call returns the same
+        stream instances.
 
+        :param timeout: subprocess timeout in seconds (default: 600)
+        :raises: InvalidSource"""
+        subs = list(self.probe(timeout).subtitles)
         if not subs:
             logger.debug("Source doesn't have any subtitle valid streams")
             return []
@@ -127,13 +310,26 @@ class FFprobeVideoContainer:
         convert_format=None,
         basename_callback=None,
         progress_callback=None,
+        shift=None,
+        fps_from=None,
+        fps_to=None,
+        start=None,
+        end=None,
+        cancel: CancellationToken = None,
+        validate=False,
+        output_encoding=None,
+        source_encoding=None,
     ):
-        """Extracts a list of subtitles converting them. Returns a dictionary of the
-        extracted filenames by index.
+        """Extracts a list of subtitles converting them. Returns a dictionary of
+        ExtractionResult by index, including the skipped streams and the ones that
+        couldn't be extracted.
 
         Most bitmap subtitles will raise UnsupportedCodec as they don't support conversion.
         For such formats use copy instead.
 
+        Outputs are written to temporary files renamed when ffmpeg succeeds, so
+        failed or cancelled extractions don't leave partial files.
+
         :param subtitles: a list of FFprobeSubtitle instances
         :param custom_dir: a custom directory to save the subtitles. Defaults to
         same directory as the media file
@@ -144,63 +340,52 @@ class FFprobeVideoContainer:
         :param basename_callback: a callback that takes the filename path. Only used if
         custom_dir is set. Defaults to `os.path.basename`
         :progress_callback: a callback that takes a dict
-        :raises: ExtractionError, UnsupportedCodec, OSError
+        :param shift: seconds (or timedelta) added to every cue
+        :param fps_from: frame rate the subtitles were timed for. Requires fps_to
+        :param fps_to: frame rate to convert the cue timings to
+        :param start: seconds (or timedelta) where extraction starts. FFmpeg seeks
+        to it instead of reading the whole container
+        :param end: seconds (or timedelta) where extraction stops
+        :param cancel: a CancellationToken to abort the extraction
+        :param validate: validate text outputs while they are written. Reports are
+        set in `ExtractionResult.validation` (see fese.validate)
+        :param output_encoding: charset of the text outputs. Outputs are transcoded
+        while they are written (see fese.charset)
+        :param source_encoding: charset of the text streams, if known. FFmpeg drops
+        the cues it can't decode as UTF-8 otherwise
+        :raises: ExtractionError, UnsupportedCodec, InvalidSource, OSError,
+        ValueError, LookupError
         """
-        extract_command = [FFMPEG_PATH, "-v", FF_LOG_LEVEL]
-        if FFMPEG_STATS:
-            extract_command.append("-stats")
-        extract_command.extend(["-y", "-i", self.path])
-
         if custom_dir is not None:
             # May raise OSError
             os.makedirs(custom_dir, exist_ok=True)
 
-        items = {}
-        collected_paths = set()
-
-        for subtitle in subtitles:
-            extension_to_use = convert_format or subtitle.convert_default_format
-
-            sub_path = (
-                f"{os.path.splitext(self.path)[0]}.{subtitle.suffix}.{extension_to_use}"
-            )
-            if custom_dir is not None:
-                basename_callback = basename_callback or os.path.basename
-                sub_path = os.path.join(custom_dir, basename_callback(sub_path))
-
-            if not overwrite and sub_path in collected_paths:
-                sub_path = f"{os.path.splitext(sub_path)[0]}.{len(collected_paths):02}.{extension_to_use}"
-
-            if not overwrite and os.path.isfile(sub_path):
-                logger.debug("Ignoring path (OVERWRITE TRUE): %s", sub_path)
-                continue
-
-            extract_command.extend(subtitle.convert_args(convert_format, sub_path))
-
-            logger.debug("Appending subtitle path: %s", sub_path)
-            collected_paths.add(sub_path)
-
-            items[subtitle.index] = sub_path
+        input_args, output_args = window_args(start, end)
 
-        if not items:
-            logger.debug("No subtitles to extract")
-            return {}
-
-        logger.debug("Extracting subtitle with command %s", " ".join(extract_command))
-
-        try:
-            # subprocess.run(extract_command, timeout=timeout, check=True)
-            _ffmpeg_call(
-                extract_command, timeout=timeout, progress_callback=progress_callback
+        with span("extract.build", path=self.path):
+            extract_command, items = self._convert_command(
+                subtitles,
+                custom_dir,
+                overwrite,
+                convert_format,
+                basename_callback,
+                timing_args(shift, fps_from, fps_to) + output_args,
+                input_args,
+                _charset_args(source_encoding),
+                start=start,
             )
-        except (subprocess.SubprocessError, FileNotFoundError) as error:
-            raise ExtractionError(f"Error calling ffmpeg: {error}") from error
 
-        for path in items.values():
-            if not os.path.isfile(path):
-                logger.warning("%s was not extracted", path)
-
-        return items
+        return self._run_extraction(
+            extract_command,
+            items,
+            timeout,
+            progress_callback,
+            cancel,
+            _expected_cues(subtitles, start, end) if validate else None,
+            output_encoding,
+            source_encoding,
+            self._read_bytes(start, end),
+        )
 
     def copy_subtitles(
         self,
@@ -211,9 +396,25 @@ class FFprobeVideoContainer:
         fallback_to_convert=True,
         basename_callback=None,
         progress_callback=None,
+        shift=None,
+        fps_from=None,
+        fps_to=None,
+        start=None,
+        end=None,
+        cancel: CancellationToken = None,
+        font_store: FontStore = None,
+        validate=False,
+        output_encoding=None,
+        source_encoding=None,
     ):
         """Extracts a list of subtitles with ffmpeg's copy method. Returns a dictionary
-        of the extracted filenames by index.
+        of ExtractionResult by index (see extract_subtitles).
+
+        Outputs are written atomically (see extract_subtitles).
+
+        With a font store, font attachments are dumped in the same FFmpeg call and
+        the ones referenced by the copied ASS/SSA subtitles are stored. Their store
+        paths are set in `ExtractionResult.fonts`.
 
         :param subtitles: a list of FFprobeSubtitle instances
         :param custom_dir: a custom directory to save the subtitles. Defaults to
@@ -225,76 +426,638 @@ class FFprobeVideoContainer:
         :param basename_callback: a callback that takes the filename path. Only used if
         custom_dir is set. Defaults to `os.path.basename`
         :progress_callback: a callback that takes a dict
-        :raises: ExtractionError, UnsupportedCodec, OSError
+        :param shift: seconds (or timedelta) added to every cue
+        :param fps_from: frame rate the subtitles were timed for. Requires fps_to
+        :param fps_to: frame rate to convert the cue timings to
+        :param start: seconds (or timedelta) where extraction starts. FFmpeg seeks
+        to it instead of reading the whole container
+        :param end: seconds (or timedelta) where extraction stops
+        :param cancel: a CancellationToken to abort the extraction
+        :param font_store: a fese.fonts.FontStore to save the fonts of ASS/SSA
+        subtitles
+        :param validate: validate text outputs while they are written. Reports are
+        set in `ExtractionResult.validation` (see fese.validate)
+        :param output_encoding: charset of the text outputs (see extract_subtitles).
+        Copied streams in other charsets are detected and transcoded
+        :param source_encoding: charset of the text streams, if known
+        :raises: ExtractionError, UnsupportedCodec, InvalidSource, OSError,
+        ValueError, LookupError
         """
-        extract_command = [FFMPEG_PATH, "-v", FF_LOG_LEVEL]
-        if FFMPEG_STATS:
-            extract_command.append("-stats")
-        extract_command.extend(["-y", "-i", self.path])
+        if custom_dir is not None:
+            # May raise OSError
+            os.makedirs(custom_dir, exist_ok=True)
+
+        input_args, output_args = window_args(start, end)
+
+        dump_dir, dumped, dump_args = None, {}, []
+        if font_store is not None:
+            fonts = [item for item in self.probe(timeout).attachments if is_font(item)]
+            if fonts:
+                dump_dir = font_store.temp_dir()
+
+            for attachment in fonts:
+                extension = os.path.splitext(attachment.filename or "")[-1].lower()
+                path = os.path.join(dump_dir, f"{attachment.index}{extension}")
+                dumped[path] = attachment.filename
+                dump_args.extend([f"-dump_attachment:{attachment.index}", path])
+
+        try:
+            with span("extract.build", path=self.path):
+                extract_command, items = self._copy_command(
+                    subtitles,
+                    custom_dir,
+                    overwrite,
+                    fallback_to_convert,
+                    basename_callback,
+                    timing_args(shift, fps_from, fps_to) + output_args,
+                    input_args,
+                    _charset_args(source_encoding) + dump_args,
+                    start=start,
+                    open_media=bool(dump_args),
+                )
 
+            results = self._run_extraction(
+                extract_command,
+                items,
+                timeout,
+                progress_callback,
+                cancel,
+                _expected_cues(subtitles, start, end) if validate else None,
+                output_encoding,
+                source_encoding,
+                self._read_bytes(start, end),
+            )
+            if dumped:
+                styled = {
+                    result.path: result
+                    for result in results.values()
+                    if result.ok
+                    and result.mode == COPY
+                    and result.path.endswith((".ass", ".ssa"))
+                }
+                with span("extract.fonts", fonts=len(dumped)):
+                    stored = font_store.collect(styled, dumped)
+                for path, fonts in stored.items():
+                    styled[path].fonts = fonts
+        finally:
+            if dump_dir is not None:
+                shutil.rmtree(dump_dir, ignore_errors=True)
+
+        return results
+
+    def sample_subtitles(
+        self,
+        subtitles,
+        windows=3,
+        sample_seconds=30,
+        duration=None,
+        custom_dir=None,
+        timeout=600,
+        convert_format=None,
+        basename_callback=None,
+        cancel: CancellationToken = None,
+    ):
+        """Extracts short windows spread across the duration of the subtitles in a
+        single FFmpeg call, seeking to every window instead of reading the whole
+        container. Useful to fingerprint or language-check a track cheaply.
+
+        Returns a dictionary of lists of the extracted filenames (one per window)
+        by index. Cues keep their original timings.
+
+        :param subtitles: a list of FFprobeSubtitle instances
+        :param windows: number of windows (default: 3)
+        :param sample_seconds: seconds of every window (default: 30)
+        :param duration: seconds (or timedelta) to spread the windows across.
+        Defaults to the longest duration reported by the subtitles
+        :param custom_dir: a custom directory to save the samples. Defaults to
+        same directory as the media file
+        :param timeout: subprocess timeout in seconds (default: 600)
+        :param convert_format: format to convert the samples. Defaults to srt
+        :param basename_callback: a callback that takes the filename path. Only used if
+        custom_dir is set. Defaults to `os.path.basename`
+        :param cancel: a CancellationToken to abort the extraction
+        :raises: ExtractionError, UnsupportedCodec, InvalidSource, OSError, ValueError
+        """
         if custom_dir is not None:
             # May raise OSError
             os.makedirs(custom_dir, exist_ok=True)
 
+        if duration is None:
+            duration = max((_duration(sub) for sub in subtitles), default=None)
+
+        with span("extract.build", path=self.path):
+            spans = sample_windows(duration, windows, sample_seconds)
+            inputs = {}  # Input arguments -> input index
+            outputs = []
+            items = {}
+            paths = set()
+            for subtitle in subtitles:
+                extension = convert_format or subtitle.convert_default_format
+                for window, (start, end) in enumerate(spans):
+                    sub_path = self._sub_path(
+                        subtitle,
+                        f"sample{window:02}.{extension}",
+                        custom_dir,
+                        True,
+                        basename_callback,
+                        {},
+                    )
+                    if sub_path in paths:  # Same suffix (e.g. two "und" streams)
+                        stem, extension_ = os.path.splitext(sub_path)
+                        sub_path = f"{stem}.{len(paths):02}{extension_}"
+                    paths.add(sub_path)
+                    input_args = tuple(subtitle.input_args(self.path, start))
+                    if self.input is None:
+                        # One seeked input per window
+                        input_args = ("-ss", f"{start:.3f}", *input_args)
+                        seek_args = ["-to", f"{end:.3f}"]
+                    else:
+                        # A pipe can't be seeked nor read twice: every output
+                        # skips to its window
+                        seek_args = ["-ss", f"{start:.3f}", "-to", f"{end:.3f}"]
+
+                    outputs.extend(
+                        subtitle.convert_args(
+                            convert_format,
+                            sub_path,
+                            seek_args,
+                            inputs.setdefault(input_args, len(inputs)),
+                        )
+                    )
+                    items[(subtitle.index, window)] = ExtractionResult(
+                        subtitle.index, sub_path, CONVERT
+                    )
+
+            extract_command = [FFMPEG_PATH, "-v", FF_LOG_LEVEL, "-y", "-copyts"]
+            for input_args in inputs:
+                extract_command.extend(input_args)
+            extract_command.extend(outputs)
+
+        if not items:
+            logger.debug("No subtitles to sample")
+            return {}
+
+        self._run_extraction(
+            extract_command,
+            items,
+            timeout,
+            cancel=cancel,
+            read_bytes=sum(self._read_bytes(start, end) or 0 for start, end in spans),
+        )
+
+        samples = {}
+        for (index, _), result in items.items():
+            paths = samples.setdefault(index, [])
+            if result.ok:
+                paths.append(result.path)
+
+        return samples
+
+    def _run_extraction(
+        self,
+        command,
+        results,
+        timeout,
+        progress_callback=None,
+        cancel=None,
+        expected_cues=None,
+        output_encoding=None,
+        source_encoding=None,
+        read_bytes=None,
+    ):
+        """Runs an extraction command writing every output to a temporary file in
+        the target directory, renamed when ffmpeg succeeds. Fills and returns the
+        results.
+
+        :param results: a dictionary of ExtractionResult by key
+        :param expected_cues: a dictionary of expected cues by stream index (values
+        may be None). If set, text outputs are validated through pipes
+        :param output_encoding: if set, text outputs are transcoded through pipes
+        :param source_encoding: the charset of copied text streams. Detected if None
+        :param read_bytes: estimate of the bytes read (see _read_bytes)
+        :raises: ExtractionError, LookupError
+        """
+        pending = [result for result in results.values() if not result.skipped]
+        if not pending:
+            logger.debug("No subtitles to extract")
+            return results
+
+        temp_paths = {result.path: _temp_path(result.path) for result in pending}
+        pipes = {}  # Output path -> _OutputPipe
+        if expected_cues is not None or output_encoding is not None:
+            for result in pending:
+                format = validate.format_of(result.path)
+                if not result.text or not format or result.path in pipes:
+                    continue
+
+                # FFmpeg decodes converted streams to UTF-8
+                transcoder = charset.StreamTranscoder(
+                    output_encoding or "utf-8",
+                    source_encoding if result.mode == COPY else "utf-8",
+                )
+                output_filter = transcoder
+                if expected_cues is not None:
+                    output_filter = validate.StreamValidator(
+                        format, expected_cues.get(result.index), transcoder
+                    )
+                pipes[result.path] = _OutputPipe(temp_paths[result.path], output_filter)
+
+        outputs = {path: temp_paths[path] for path in temp_paths}
+        outputs.update((path, pipe.arg) for path, pipe in pipes.items())
+        command = [outputs.get(arg, arg) for arg in command]
+        stats = _MuxStats()
+        if COLLECT_STATS:
+            command = _with_log_level(command, "verbose")
+
+        logger.debug("Extracting subtitles with command %s", " ".join(command))
+
+        start = time.monotonic()
+        try:
+            try:
+                _ffmpeg_call(
+                    command,
+                    log_callback=stats,
+                    timeout=timeout,
+                    progress_callback=progress_callback,
+                    policy=self.policy,
+                    cancel=cancel,
+                    input_chunks=None if self.input is None else self.input.chunks(),
+                    pass_fds=tuple(pipe.write_fd for pipe in pipes.values()),
+                    read_bytes=read_bytes,
+                )
+            finally:
+                for pipe in pipes.values():
+                    pipe.close()
+
+            for pipe in pipes.values():
+                pipe.raise_error()
+        except BaseException as error:
+            # Nothing is renamed unless ffmpeg succeeds
+            _remove(temp_paths.values())
+            failed = {result.index: result for result in pending}
+            for result in pending:
+                result.error = error
+
+            if isinstance(error, ExtractionError):
+                error.failed = failed
+            elif isinstance(error, (subprocess.SubprocessError, FileNotFoundError)):
+                raise ExtractionError(
+                    f"Error calling ffmpeg: {error}", failed=failed
+                ) from error
+            raise
+
+        elapsed = time.monotonic() - start
+        sizes = {}  # Outputs may share a path (e.g. with a basename_callback)
+        for result in pending:
+            temp_path = temp_paths[result.path]
+            if result.path not in sizes:
+                try:
+                    sizes[result.path] = os.stat(temp_path).st_size
+                    os.replace(temp_path, result.path)
+                except FileNotFoundError:
+                    sizes[result.path] = None
+
+            if sizes[result.path] is None:
+                logger.warning("%s was not extracted", result.path)
+                result.error = "not extracted"
+                continue
+
+            result.bytes = sizes[result.path]
+            result.elapsed = elapsed
+            if result.text:
+                result.cues = stats.packets.get(outputs[result.path])
+
+            pipe = pipes.get(result.path)
+            if pipe is None:
+                continue
+
+            transcoder = pipe.filter
+            if isinstance(pipe.filter, validate.StreamValidator):
+                result.validation = pipe.filter.report
+                transcoder = pipe.filter.transcoder
+                if result.cues is None:
+                    result.cues = result.validation.cues
+
+            result.encoding = transcoder.encoding
+            if result.mode != COPY and source_encoding:
+                result.encoding = codecs.lookup(source_encoding).name
+
+        return results
+
+    def _convert_command(
+        self,
+        subtitles,
+        custom_dir,
+        overwrite,
+        convert_format,
+        basename_callback,
+        extra_args=(),
+        input_args=(),
+        media_args=(),
+        start=None,
+    ):
         items = {}
-        collected_paths = set()
+        outputs = []
 
         for subtitle in subtitles:
-            sub_path = f"{os.path.splitext(self.path)[0]}.{subtitle.suffix}.{subtitle.extension}"
-            if custom_dir is not None:
-                basename_callback = basename_callback or os.path.basename
-                sub_path = os.path.join(custom_dir, basename_callback(sub_path))
+            extension_to_use = convert_format or subtitle.convert_default_format
+            sub_path = self._sub_path(
+                subtitle,
+                extension_to_use,
+                custom_dir,
+                overwrite,
+                basename_callback,
+                items,
+            )
+            result = self._result(subtitle, sub_path, CONVERT, overwrite)
+            items[subtitle.index] = result
+            if not result.skipped:
+                outputs.append((subtitle, sub_path))
 
-            if not overwrite and sub_path in collected_paths:
-                sub_path = f"{os.path.splitext(sub_path)[0]}.{len(collected_paths):02}.{subtitle.extension}"
+        extract_command, input_indices = self._base_command(
+            [subtitle for subtitle, _ in outputs], input_args, media_args, start
+        )
+        for subtitle, sub_path in outputs:
+            extract_command.extend(
+                subtitle.convert_args(
+                    convert_format,
+                    sub_path,
+                    extra_args,
+                    input_indices[subtitle.index],
+                )
+            )
 
-            if not overwrite and os.path.isfile(sub_path):
-                logger.debug("Ignoring path (OVERWRITE TRUE): %s", sub_path)
-                continue
+            logger.debug("Appending subtitle path: %s", sub_path)
+
+        return extract_command, items
+
+    def _copy_command(
+        self,
+        subtitles,
+        custom_dir,
+        overwrite,
+        fallback_to_convert,
+        basename_callback,
+        extra_args=(),
+        input_args=(),
+        media_args=(),
+        start=None,
+        open_media=False,
+    ):
+        items = {}
+        outputs = []
+
+        for subtitle in subtitles:
+            sub_path = self._sub_path(
+                subtitle,
+                subtitle.extension,
+                custom_dir,
+                overwrite,
+                basename_callback,
+                items,
+            )
 
+            result = self._result(subtitle, sub_path, COPY, overwrite)
+            items[subtitle.index] = result
+            if not result.skipped:
+                outputs.append((subtitle, sub_path))
+
+        extract_command, input_indices = self._base_command(
+            [subtitle for subtitle, _ in outputs],
+            input_args,
+            media_args,
+            start,
+            open_media,
+        )
+        for subtitle, sub_path in outputs:
+            input_index = input_indices[subtitle.index]
             try:
-                extract_command.extend(subtitle.copy_args(sub_path))
+                extract_command.extend(
+                    subtitle.copy_args(sub_path, extra_args, input_index)
+                )
             except UnsupportedCodec:
                 if fallback_to_convert:
                     logger.warning(
                         "%s incompatible with copy. Using fallback", subtitle
                     )
-                    extract_command.extend(subtitle.convert_args(None, sub_path))
+                    extract_command.extend(
+                        subtitle.convert_args(None, sub_path, extra_args, input_index)
+                    )
+                    items[subtitle.index].mode = FALLBACK
                 else:
                     raise
 
             logger.debug("Appending subtitle path: %s", sub_path)
-            collected_paths.add(sub_path)
 
-            items[subtitle.index] = sub_path
+        return extract_command, items
 
-        if not items:
-            logger.debug("No subtitles to extract")
-            return {}
+    def _base_command(
+        self, subtitles, input_args=(), media_args=(), start=None, open_media=False
+    ):
+        """Returns the command with the inputs of the subtitles and the input
+        index of every subtitle. Subtitles read from the same input share it.
+
+        :param input_args: options of every input (e.g. seeking)
+        :param media_args: options of the media file input (e.g. its charset)
+        :param start: seconds (or timedelta) where the extraction starts
+        :param open_media: open the media file even if no subtitle is read from it
+        (e.g. to dump attachments)
+        :raises: UnsupportedCodec
+        """
+        if start is not None:
+            start = _seconds(start)
 
-        logger.debug("Extracting subtitle with command %s", " ".join(extract_command))
+        extract_command = [FFMPEG_PATH, "-v", FF_LOG_LEVEL]
+        if FFMPEG_STATS:
+            extract_command.append("-stats")
+        extract_command.append("-y")
 
-        try:
-            # subprocess.run(extract_command, timeout=timeout, check=True)
-            _ffmpeg_call(
-                extract_command, timeout=timeout, progress_callback=progress_callback
+        media = ("-i", self.path)
+        inputs = {media: 0} if open_media or not subtitles else {}
+        input_indices = {}
+        for subtitle in subtitles:
+            key = tuple(subtitle.input_args(self.path, start))
+            input_indices[subtitle.index] = inputs.setdefault(key, len(inputs))
+
+        for key in inputs:
+            if key == media:
+                extract_command.extend(media_args)
+            extract_command.extend([*input_args, *key])
+
+        return extract_command, input_indices
+
+    def _sub_path(
+        self, subtitle, extension, custom_dir, overwrite, basename_callback, items
+    ):
+        "Returns the output path of a subtitle."
+        if self.is_local:
+            stem = os.path.splitext(self.path)[0]
+        else:
+            stem = os.path.join(os.getcwd(), os.path.splitext(self.name)[0])
+
+        sub_path = f"{stem}.{subtitle.suffix}.{extension}"
+        if custom_dir is not None:
+            basename_callback = basename_callback or os.path.basename
+            sub_path = os.path.join(custom_dir, basename_callback(sub_path))
+
+        collected_paths = [item.path for item in items.values()]
+        if not overwrite and sub_path in collected_paths:
+            sub_path = (
+                f"{os.path.splitext(sub_path)[0]}.{len(collected_paths):02}.{extension}"
             )
-        except (subprocess.SubprocessError, FileNotFoundError) as error:
-            raise ExtractionError(f"Error calling ffmpeg: {error}") from error
 
-        for path in items.values():
-            if not os.path.isfile(path):
-                logger.warning("%s was not extracted", path)
+        return sub_path
+
+    def _read_bytes(self, start=None, end=None):
+        """Estimates the bytes read by a call extracting a time window: the share
+        of the source size. Returns None (the size of the input files) if the size
+        or the duration of the source aren't known, and 0 for piped sources, which
+        are charged as they're written."""
+        if self.input is not None:
+            return 0
+
+        info = None if self._probe_result is None else self._probe_result.format
+        size = None if info is None else info.size
+        if size is None and self.is_local:
+            try:
+                size = os.path.getsize(self.path)
+            except OSError:
+                return None
+
+        if start is None and end is None:
+            return size
+
+        duration = None if info is None else info.duration
+        if size is None or not duration:
+            return None
+
+        duration = duration.total_seconds()
+        start = 0 if start is None else _seconds(start)
+        end = duration if end is None else min(_seconds(end), duration)
+        return int(size * max(0.0, end - start) / duration)
 
-        return items
+    @staticmethod
+    def _result(subtitle, sub_path, mode, overwrite):
+        skipped = None
+        if not overwrite and os.path.isfile(sub_path):
+            logger.debug("Ignoring path (OVERWRITE TRUE): %s", sub_path)
+            skipped = SKIPPED_EXISTS
+
+        return ExtractionResult(
+            subtitle.index, sub_path, mode, skipped, text=subtitle.type == "text"
+        )
 
     def __repr__(self) -> str:
-        return f"<FFprobeVideoContainer {self.extension}: {self.path}>"
+        source = self.path if self.input is None else self.input
+        return f"<FFprobeVideoContainer {self.extension}: {source}>"
 
 
-_ffprobe_exceptions = (
-    subprocess.SubprocessError,
-    json.JSONDecodeError,
-    FileNotFoundError,
-    KeyError,
-)
+class _OutputPipe:
+    """An ffmpeg output (pipe:N) written to a file by a reader thread through a
+    filter (a StreamValidator or a StreamTranscoder). Without a path, the output
+    is only read by the filter."""
+
+    def __init__(self, path, output_filter):
+        self.filter = output_filter
+        self._read_fd, self.write_fd = os.pipe()
+        self.arg = f"pipe:{self.write_fd}"
+        self._error = None
+        self._thread = threading.Thread(target=self._drain, args=(path,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        "Closes the write end (ffmpeg exited) and waits for the reader."
+        if self.write_fd is not None:
+            os.close(self.write_fd)
+            self.write_fd = None
+        self._thread.join()
+
+    def raise_error(self):
+        "raises OSError if the output couldn't be written"
+        if self._error is not None:
+            raise self._error
+
+    def _drain(self, path):
+        try:
+            with os.fdopen(self._read_fd, "rb") as pipe, open(
+                os.devnull if path is None else path, "wb"
+            ) as file:
+                for chunk in iter(lambda: pipe.read1(validate.CHUNK_SIZE), b""):
+                    file.write(self.filter.feed(chunk))
+                file.write(self.filter.finish())
+        except OSError as error:
+            self._error = error
+
+
+class _MuxStats:
+    """A log callback collecting the muxed packets of every output file from
+    ffmpeg's verbose summary."""
+
+    def __init__(self):
+        self.packets = {}
+        self._outputs = {}
+
+    def __call__(self, message, line):
+        logger.debug(message, line)
+        match = _OUTPUT_FILE_RE.search(line)
+        if match:
+            self._outputs[match.group(1)] = match.group(2)
+            return
+
+        match = _OUTPUT_STREAM_RE.search(line)
+        if match and match.group(1) in self._outputs:
+            self.packets[self._outputs[match.group(1)]] = int(match.group(2))
+
+
+def _with_log_level(command, level):
+    "Raises the log level (-v) of a command to at least `level`."
+    command = list(command)
+    if "-v" in command:
+        position = command.index("-v") + 1
+        if command[position] in _LOG_LEVELS[: _LOG_LEVELS.index(level)]:
+            command[position] = level
+    return command
+
+
+def _temp_path(path):
+    directory, name = os.path.split(path)
+    return os.path.join(directory, f".{name}.{secrets.token_hex(4)}.part")
+
+
+def _remove(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as error:
+            logger.warning("Couldn't remove %s: %s", path, error)
+
+
+def _charset_args(encoding):
+    "Returns the input options decoding text subtitles in a charset."
+    return ["-sub_charenc", encoding] if encoding else []
+
+
+def _expected_cues(subtitles, start, end):
+    "Returns the cues of every subtitle by index. Unknown for time windows."
+    windowed = start is not None or end is not None
+    return {
+        subtitle.index: None if windowed else subtitle.tags.frames
+        for subtitle in subtitles
+    }
+
+
+def _duration(subtitle):
+    "Returns the duration of a subtitle stream from its properties or tags."
+    tags = subtitle.tags
+    for duration in (
+        subtitle.duration,
+        getattr(tags, "duration", None),
+        getattr(tags, "duration_eng", None),
+    ):
+        if duration:
+            return duration
+
+    return None
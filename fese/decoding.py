@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+# License: GPL
+
+"""JSON decoding of FFprobe output.
+
+msgspec is preferred if installed: streams are decoded straight into typed
+records (only the fields used by fese are read). orjson is used otherwise, and
+the standard library as the last resort.
+
+FFprobe's output can also be decoded while it's read (decode_probe_stream), one
+stream at a time, so broken files with thousands of streams or huge tags don't
+have to fit in memory: long strings are truncated before they're decoded and
+streams beyond a cap are dropped."""
+
+from __future__ import annotations
+
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Union
+
+try:
+    import msgspec
+except ImportError:  # Optional dependency
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:  # Optional dependency
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# One of "auto", "msgspec", "orjson" or "json"
+DECODER = "auto"
+
+# Limits of decode_probe_stream. None disables a limit
+MAX_STREAMS = 1024  # Streams kept. The rest are dropped
+MAX_TAG_SIZE = 16 * 1024  # Bytes of a string value. Longer ones are truncated
+MAX_ELEMENT_SIZE = 1024**2  # Bytes of a stream, chapter or format (truncated)
+
+CHUNK_SIZE = 64 * 1024
+# Outputs up to this size are decoded at once (faster), with the same stream
+# limits. Only bigger ones are split while they're read
+BUFFER_SIZE = 1024**2
+
+_SPECIAL_RE = re.compile(rb'["{}\[\]]')
+# The rest of a string after its opening quote
+_STRING_END_RE = re.compile(rb'[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_CODEC_TYPE_RE = re.compile(rb'"codec_type"\s*:\s*"(\w+)"')
+
+
+if msgspec is not None:
+
+    class _Record(msgspec.Struct, gc=False, omit_defaults=True):
+        """Mapping-like access so records can be used in place of dicts. Unset
+        fields are left out when encoded, as they're missing keys."""
+
+        def get(self, key, default=None):
+            value = getattr(self, key, None)
+            return default if value is None else value
+
+        def __getitem__(self, key):
+            value = getattr(self, key, None)
+            if value is None:
+                raise KeyError(key)
+
+            return value
+
+        def __contains__(self, key):
+            return getattr(self, key, None) is not None
+
+    class StreamRecord(_Record):
+        index: int
+        codec_type: Optional[str] = None
+        codec_name: Optional[str] = None
+        r_frame_rate: Optional[str] = None
+        avg_frame_rate: Optional[str] = None
+        time_base: Optional[str] = None
+        start_pts: Optional[int] = None
+        start_time: Optional[str] = None
+        duration_ts: Optional[int] = None
+        duration: Optional[str] = None
+        nb_frames: Optional[str] = None
+        bit_rate: Optional[str] = None
+        width: Optional[int] = None
+        height: Optional[int] = None
+        closed_captions: Optional[int] = None
+        channels: Optional[int] = None
+        channel_layout: Optional[str] = None
+        sample_rate: Optional[str] = None
+        disposition: Dict[str, int] = {}
+        tags: Dict[str, str] = {}
+
+    class ProbeRecord(_Record):
+        streams: List[StreamRecord]
+        format: Dict[str, Union[str, int, Dict[str, str]]] = {}
+        chapters: List[Dict[str, Any]] = []
+
+    _probe_decoder = msgspec.json.Decoder(ProbeRecord)
+    _stream_decoder = msgspec.json.Decoder(StreamRecord)
+    _generic_decoder = msgspec.json.Decoder()
+
+    DECODE_ERRORS = (ValueError, msgspec.DecodeError)
+else:
+    DECODE_ERRORS = (ValueError,)
+
+
+def loads(data: bytes):
+    "Decodes a JSON document into plain Python objects."
+    decoder = _get_decoder()
+    if decoder == "msgspec":
+        return _generic_decoder.decode(data)
+
+    if decoder == "orjson":
+        return orjson.loads(data)
+
+    return json.loads(data)
+
+
+def dumps(obj) -> bytes:
+    "Encodes an object (including typed records) into JSON."
+    decoder = _get_decoder()
+    if decoder == "msgspec":
+        return msgspec.json.encode(obj)
+
+    if decoder == "orjson":
+        return orjson.dumps(obj)
+
+    return json.dumps(obj).encode()
+
+
+def decode_probe(data: bytes):
+    """Decodes FFprobe's JSON output.
+
+    The result supports `result["streams"]` and each stream `stream.get(key)`,
+    whether it's a typed record or a plain dictionary.
+
+    :raises: any of DECODE_ERRORS, KeyError"""
+    if _get_decoder() == "msgspec":
+        try:
+            return _probe_decoder.decode(data)
+        except msgspec.ValidationError as error:
+            # Unexpected types from an unusual FFprobe version
+            logger.debug("Falling back to generic decoding: %s", error)
+
+    result = loads(data)
+    result["streams"]
+    return result
+
+
+def decode_probe_stream(file, stream_types=None):
+    """Decodes FFprobe's JSON output from a binary file (e.g. FFprobe's stdout)
+    while it's read. Memory is bounded by BUFFER_SIZE, MAX_STREAMS,
+    MAX_TAG_SIZE and MAX_ELEMENT_SIZE instead of the size of the output.
+
+    The result is shaped like decode_probe's.
+
+    :param file: a binary file object
+    :param stream_types: codec types of the streams kept (e.g. ("subtitle",
+    "video")). Other streams are not decoded. Defaults to every stream
+    :raises: any of DECODE_ERRORS, KeyError"""
+    decoder = _ProbeDecoder(stream_types)
+    chunks = iter(lambda: file.read(CHUNK_SIZE), b"")
+    head = bytearray()
+    for chunk in chunks:
+        head += chunk
+        if len(head) > BUFFER_SIZE:
+            break
+    else:
+        return decoder.limit(decode_probe(bytes(head)))
+
+    scanner = _Scanner(decoder.element, MAX_TAG_SIZE, MAX_ELEMENT_SIZE)
+    scanner.feed(bytes(head))
+    del head
+    for chunk in chunks:
+        scanner.feed(chunk)
+
+    scanner.finish()
+    return decoder.result()
+
+
+class _ProbeDecoder:
+    "Decodes the elements of FFprobe's output and applies the stream limits."
+
+    def __init__(self, stream_types):
+        self._stream_types = None
+        if stream_types is not None:
+            self._stream_types = {item.encode() for item in stream_types}
+        self._result = {}
+        self._dropped = 0
+
+    def element(self, key, data, in_array):
+        if in_array and data is None:  # The array starts
+            self._result[key] = []
+        elif key == "streams":
+            self._stream(data)
+        elif in_array:
+            self._result[key].append(loads(data))
+        else:
+            self._result[key] = loads(data)
+
+    def result(self):
+        self._warn()
+        self._result["streams"]
+        return self._result
+
+    def limit(self, result):
+        "Applies the stream limits to a result of decode_probe."
+        streams = result["streams"]
+        kept = [
+            stream
+            for stream in streams
+            if self._stream_types is None
+            or stream.get("codec_type") is None
+            or stream.get("codec_type").encode() in self._stream_types
+        ]
+        if MAX_STREAMS is not None and len(kept) > MAX_STREAMS:
+            self._dropped = len(kept) - MAX_STREAMS
+            del kept[MAX_STREAMS:]
+        streams[:] = kept
+        self._warn()
+        return result
+
+    def _warn(self):
+        if self._dropped:
+            logger.warning("Dropped %d streams (MAX_STREAMS)", self._dropped)
+
+    def _stream(self, data):
+        if self._stream_types is not None:
+            match = _CODEC_TYPE_RE.search(data)
+            if match is not None and match.group(1) not in self._stream_types:
+                return
+
+        streams = self._result["streams"]
+        if MAX_STREAMS is not None and len(streams) >= MAX_STREAMS:
+            self._dropped += 1
+            return
+
+        stream = None
+        if _get_decoder() == "msgspec":
+            try:
+                stream = _stream_decoder.decode(data)
+            except msgspec.ValidationError as error:
+                logger.debug("Falling back to generic decoding: %s", error)
+
+        streams.append(loads(data) if stream is None else stream)
+
+
+class _Scanner:
+    """Splits a JSON document into the elements of its top-level values: the
+    items of arrays (the callback gets None when an array starts) and whole
+    objects. Strings longer than `max_string` bytes
+    are truncated while they're read, and elements bigger than `max_element`
+    are dropped.
+
+    Only brackets and strings are tokenized (with regular expressions), so the
+    document is assumed to be valid JSON: the elements are validated by the
+    decoder.
+    """
+
+    def __init__(self, callback, max_string=None, max_element=None):
+        self._callback = callback
+        self._max_string = max_string
+        self._max_element = max_element
+        self._pending = b""  # An incomplete string
+        self._skipping = False  # Inside a truncated string
+        self._depth = 0
+        self._key = None  # The last top-level key
+        self._array = False  # If the current top-level value is an array
+        self._element = None  # Bytes of the current element
+        self._element_depth = None
+        self._oversized = False
+
+    def feed(self, chunk):
+        data = self._pending + chunk
+        self._pending = b""
+        position = 0
+        if self._skipping:
+            position = self._skip(data, 0)
+            if position is None:
+                return
+
+        while True:
+            match = _SPECIAL_RE.search(data, position)
+            if match is None:
+                self._append(data[position:])
+                return
+
+            start = match.start()
+            self._append(data[position:start])
+            char = data[start : start + 1]
+            if char == b'"':
+                position = self._string(data, start)
+                if position is None:
+                    return
+                continue
+
+            position = start + 1
+            if char in b"{[":
+                self._open(char)
+            else:
+                self._close(char)
+
+    def finish(self):
+        if self._pending or self._skipping or self._depth:
+            raise ValueError("Incomplete JSON document")
+
+    def _string(self, data, start):
+        "Returns the position after the string, or None if it's incomplete."
+        end = _STRING_END_RE.match(data, start + 1)
+        if end is not None:
+            string = data[start : end.end()]
+            if self._depth == 1:
+                self._key = string[1:-1].decode()
+            if self._max_string is not None and len(string) > self._max_string + 2:
+                string = _truncate(string[1:-1], self._max_string)
+            self._append(string)
+            return end.end()
+
+        if self._max_string is None or len(data) - start <= self._max_string + 1:
+            self._pending = data[start:]
+            return None
+
+        # Too long: the beginning is kept and the rest discarded until its end
+        self._append(_truncate(data[start + 1 :], self._max_string))
+        self._skipping = True
+        return self._skip(data, len(data))
+
+    def _skip(self, data, position):
+        "Discards the rest of a truncated string. Returns the position after it."
+        end = _STRING_END_RE.match(data, position)
+        if end is not None:
+            self._skipping = False
+            return end.end()
+
+        # An escape split between chunks is completed by the next one
+        if (len(data) - len(data.rstrip(b"\\"))) % 2:
+            self._pending = b"\\"
+        return None
+
+    def _open(self, char):
+        self._depth += 1
+        if self._depth == 2:
+            self._array = char == b"["
+            if self._array:
+                self._callback(self._key, None, True)
+        if self._element is None and self._depth == (3 if self._array else 2):
+            self._element = bytearray()
+            self._element_depth = self._depth
+            self._oversized = False
+        self._append(char)
+
+    def _close(self, char):
+        self._append(char)
+        if self._element is not None and self._depth == self._element_depth:
+            if self._oversized:
+                logger.warning(
+                    "Dropped %s item bigger than %d bytes", self._key, self._max_element
+                )
+            else:
+                self._callback(self._key, bytes(self._element), self._array)
+            self._element = None
+        self._depth -= 1
+
+    def _append(self, data):
+        if self._element is None or self._oversized or not data:
+            return
+
+        self._element += data
+        if self._max_element is not None and len(self._element) > self._max_element:
+            self._oversized = True
+            self._element = bytearray()  # Only the depth is tracked
+
+
+def _truncate(body, size):
+    "Returns a JSON string of the first `size` bytes of a string body."
+    body = body[:size]
+    # Escapes cut in half (e.g. "\u00e9")
+    escape = body.rfind(b"\\", max(0, size - 6))
+    if escape != -1:
+        body = body[:escape]
+    if (len(body) - len(body.rstrip(b"\\"))) % 2:
+        body = body[:-1]
+    # UTF-8 sequences cut in half
+    body = body.decode("utf-8", "ignore").encode("utf-8")
+    return b'"' + body + b'"'
+
+
+def _get_decoder():
+    if DECODER != "auto":
+        return DECODER
+
+    if msgspec is not None:
+        return "msgspec"
+
+    if orjson is not None:
+        return "orjson"
+
+    return "json"
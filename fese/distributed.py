@@ -0,0 +1,814 @@
+# -*- coding: utf-8 -*-
+# License: GPL
+
+"""Distributed extraction through a shared work queue.
+
+Coordinators probe media files and enqueue jobs: a path and an extraction plan
+(the method, the selected stream indices, the options of the call and the probe
+result, so workers don't probe again). Workers on any node claim jobs with a
+lease, renew it while they extract (heartbeats) and store the results.
+
+Delivery is at least once. The jobs of crashed workers are claimed again once
+their lease expires, and failed jobs are retried up to `max_attempts` times
+with a backoff. Running a job twice is harmless: outputs are renamed
+atomically and results are stored by job id. Job ids are derived from the
+path, its size and modification time and the plan, so enqueuing the same work
+twice is a no-op.
+
+Workers read the enqueued paths, so every node needs the media at the same
+paths (e.g. a shared mount) or the sources must be URLs.
+
+Queues:
+* SQLiteQueue: a database file shared by the processes of a node (or by nodes
+  through a filesystem with working locks)
+* RedisQueue: a Redis (or compatible) server. Requires redis-py
+
+Usage:
+    queue = SQLiteQueue("/srv/fese/queue.db")
+    Coordinator(queue).submit("/media/movie.mkv", "copy", selector="en | es")
+
+    # On every node
+    worker = Worker(queue, FileResultStore("/srv/fese/results"))
+    worker.run()  # Until worker.stop() is called from another thread
+"""
+
+from __future__ import annotations
+
+from collections import namedtuple
+import contextlib
+import hashlib
+import inspect
+import json
+import logging
+import os
+import secrets
+import socket
+import sqlite3
+import threading
+import time
+
+from . import decoding
+from .cancel import CancellationToken
+from .container import FFprobeVideoContainer
+from .exceptions import ExtractionError
+from .exceptions import FeseError
+from .exceptions import InvalidSource
+from .exceptions import LanguageNotFound
+from .exceptions import UnsupportedCodec
+from .probe import ProbeResult
+from .selection import Selector
+from .source import is_url
+
+try:
+    import redis
+except ImportError:  # Optional dependency
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Seconds a claimed job is owned by its worker without heartbeats
+LEASE = 60
+
+# Attempts of a job, including the ones of workers whose lease expired
+MAX_ATTEMPTS = 3
+
+# Seconds before the first retry of a failed job. Doubled on every attempt
+RETRY_DELAY = 10
+
+# Seconds between claims of idle workers
+POLL_INTERVAL = 1
+
+# Job states
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Plan methods by name
+METHODS = {"extract": "extract_subtitles", "copy": "copy_subtitles"}
+
+# Errors retrying can't fix
+_PERMANENT_ERRORS = (InvalidSource, UnsupportedCodec, LanguageNotFound, ValueError)
+
+# A claimed job. The token identifies the claim in heartbeats and reports
+Job = namedtuple("Job", ("id", "path", "plan", "attempts", "token"))
+
+
+class WorkQueue:
+    """Base class for work queues.
+
+    Claims, heartbeats and reports are atomic. Heartbeats and reports of a
+    claim whose lease expired (and may have been claimed again) are ignored.
+    """
+
+    def __init__(self, max_attempts: int = MAX_ATTEMPTS, retry_delay=RETRY_DELAY):
+        """
+        :param max_attempts: attempts of a job before it's failed
+        :param retry_delay: seconds before the first retry of a failed job
+        """
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+
+    def put(self, job_id: str, path: str, plan: dict) -> bool:
+        "Enqueues a job. Returns False if the job already exists."
+        raise NotImplementedError
+
+    def claim(self, worker: str, lease: float = LEASE):
+        "Returns the next due Job claimed for `lease` seconds, or None."
+        raise NotImplementedError
+
+    def heartbeat(self, job: Job, lease: float = LEASE) -> bool:
+        "Extends the lease of a job. Returns False if the claim was lost."
+        raise NotImplementedError
+
+    def complete(self, job: Job) -> bool:
+        "Marks a job as done. Returns False if the claim was lost."
+        raise NotImplementedError
+
+    def fail(self, job: Job, error: str, retry: bool = True) -> bool:
+        """Retries a job after a backoff, or fails it when it can't be retried.
+        Returns False if the claim was lost."""
+        raise NotImplementedError
+
+    def get(self, job_id: str):
+        "Returns the state, attempts, worker and error of a job, or None."
+        raise NotImplementedError
+
+    def counts(self) -> dict:
+        "Returns the number of jobs by state."
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def _retry_at(self, now, attempts):
+        return now + self.retry_delay * 2 ** max(0, attempts - 1)
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__}>"
+
+
+class SQLiteQueue(WorkQueue):
+    """A queue in an SQLite database. Every thread gets its own connection.
+
+    Pending and running jobs are claimable once their `due` time passes: the
+    enqueue (or retry) time of pending jobs and the lease expiration of running
+    ones.
+    """
+
+    def __init__(self, path: str, timeout: float = 30, **kwargs):
+        """
+        :param path: the database file. Created if it doesn't exist
+        :param timeout: seconds to wait for the locks of other connections
+        :param kwargs: see WorkQueue
+        :raises: sqlite3.Error
+        """
+        super().__init__(**kwargs)
+        self.path = os.fspath(path)
+        self._timeout = timeout
+        self._local = threading.local()
+        db = self._connection()
+        db.execute("PRAGMA journal_mode=WAL")
+        db.executescript(_SCHEMA)
+
+    def put(self, job_id, path, plan):
+        now = time.time()
+        cursor = self._connection().execute(
+            "INSERT OR IGNORE INTO jobs (id, path, plan, state, due, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, path, json.dumps(plan), PENDING, now, now),
+        )
+        return cursor.rowcount == 1
+
+    def claim(self, worker, lease=LEASE):
+        now = time.time()
+        token = secrets.token_hex(8)
+        with self._transaction() as db:
+            # Running jobs without attempts left expired with their last worker
+            db.execute(
+                "UPDATE jobs SET state = ?, token = NULL, error = ?, updated = ? "
+                "WHERE state = ? AND due <= ? AND attempts >= ?",
+                (FAILED, "lease expired", now, RUNNING, now, self.max_attempts),
+            )
+            row = db.execute(
+                "SELECT id, path, plan, attempts FROM jobs "
+                "WHERE state IN (?, ?) AND due <= ? ORDER BY due LIMIT 1",
+                (PENDING, RUNNING, now),
+            ).fetchone()
+            if row is None:
+                return None
+
+            db.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, token = ?, "
+                "worker = ?, due = ?, updated = ? WHERE id = ?",
+                (RUNNING, token, worker, now + lease, now, row[0]),
+            )
+
+        return Job(row[0], row[1], json.loads(row[2]), row[3] + 1, token)
+
+    def heartbeat(self, job, lease=LEASE):
+        now = time.time()
+        return self._update(
+            job, "due = ?, updated = ?", (now + lease, now), require_due=now
+        )
+
+    def complete(self, job):
+        return self._update(
+            job,
+            "state = ?, token = NULL, error = NULL, updated = ?",
+            (DONE, time.time()),
+        )
+
+    def fail(self, job, error, retry=True):
+        now = time.time()
+        state = PENDING if retry and job.attempts < self.max_attempts else FAILED
+        return self._update(
+            job,
+            "state = ?, token = NULL, error = ?, due = ?, updated = ?",
+            (state, error, self._retry_at(now, job.attempts), now),
+        )
+
+    def get(self, job_id):
+        row = (
+            self._connection()
+            .execute(
+                "SELECT state, attempts, worker, error FROM jobs WHERE id = ?",
+                (job_id,),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+
+        return dict(zip(("state", "attempts", "worker", "error"), row))
+
+    def counts(self):
+        counts = dict.fromkeys((PENDING, RUNNING, DONE, FAILED), 0)
+        counts.update(
+            self._connection().execute(
+                "SELECT state, COUNT(*) FROM jobs GROUP BY state"
+            )
+        )
+        return counts
+
+    def close(self):
+        "Closes the connection of the calling thread."
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+    def _update(self, job, assignments, values, require_due=None):
+        # Only the current claim can update a running job
+        query = (
+            f"UPDATE jobs SET {assignments} WHERE id = ? AND token = ? AND state = ?"
+        )
+        values = (*values, job.id, job.token, RUNNING)
+        if require_due is not None:
+            # Expired leases can be claimed by other workers
+            query += " AND due > ?"
+            values += (require_due,)
+
+        return self._connection().execute(query, values).rowcount == 1
+
+    def _connection(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            # Autocommit: transactions are explicit
+            db = sqlite3.connect(self.path, timeout=self._timeout, isolation_level=None)
+            self._local.db = db
+        return db
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    def __repr__(self) -> str:
+        return f"<SQLiteQueue {self.path}>"
+
+
+class RedisQueue(WorkQueue):
+    """A queue in a Redis (or compatible) server. Claims and reports run as Lua
+    scripts, so they are atomic.
+
+    Jobs are hashes (`PREFIX:job:ID`). Pending and running jobs are kept in a
+    sorted set by due time (see SQLiteQueue) and `PREFIX:counts` counts the
+    jobs by state.
+    """
+
+    def __init__(
+        self, client=None, url="redis://localhost:6379/0", prefix="fese", **kwargs
+    ):
+        """
+        :param client: a redis.Redis compatible client. Created from the URL if
+        None
+        :param url: the server URL
+        :param prefix: the prefix of the keys
+        :param kwargs: see WorkQueue
+        :raises: ImportError
+        """
+        super().__init__(**kwargs)
+        if client is None:
+            if redis is None:
+                raise ImportError(
+                    "redis is required for this queue (pip install redis)"
+                )
+            client = redis.Redis.from_url(url)
+
+        self.client = client
+        self.prefix = prefix
+        self._keys = [f"{prefix}:due", f"{prefix}:counts"]
+        self._scripts = {
+            name: client.register_script(script) for name, script in _LUA.items()
+        }
+
+    def put(self, job_id, path, plan):
+        return bool(self._run("put", job_id, time.time(), path, json.dumps(plan)))
+
+    def claim(self, worker, lease=LEASE):
+        now = time.time()
+        token = secrets.token_hex(8)
+        found = self._run(
+            "claim", "", now, now + lease, token, worker, self.max_attempts
+        )
+        if not found:
+            return None
+
+        job_id, path, plan, attempts = (_str(value) for value in found)
+        return Job(job_id, path, json.loads(plan), int(attempts), token)
+
+    def heartbeat(self, job, lease=LEASE):
+        now = time.time()
+        return bool(self._run("heartbeat", job.id, job.token, now, now + lease))
+
+    def complete(self, job):
+        return bool(self._run("complete", job.id, job.token))
+
+    def fail(self, job, error, retry=True):
+        state = PENDING if retry and job.attempts < self.max_attempts else FAILED
+        retry_at = self._retry_at(time.time(), job.attempts)
+        return bool(self._run("fail", job.id, job.token, state, error, retry_at))
+
+    def get(self, job_id):
+        values = self.client.hmget(
+            self._job_key(job_id), "state", "attempts", "worker", "error"
+        )
+        if values[0] is None:
+            return None
+
+        state, attempts, worker, error = (_str(value) for value in values)
+        return {
+            "state": state,
+            "attempts": int(attempts),
+            "worker": worker or None,
+            "error": error or None,
+        }
+
+    def counts(self):
+        counts = dict.fromkeys((PENDING, RUNNING, DONE, FAILED), 0)
+        for state, count in self.client.hgetall(self._keys[1]).items():
+            counts[_str(state)] = int(count)
+        return counts
+
+    def close(self):
+        self.client.close()
+
+    def _run(self, script, job_id, *args):
+        # The claim script reads the jobs it finds through the job key prefix
+        return self._scripts[script](
+            keys=self._keys + [self._job_key(job_id)],
+            args=[job_id, *args, self._job_key("")],
+        )
+
+    def _job_key(self, job_id):
+        return f"{self.prefix}:job:{job_id}"
+
+    def __repr__(self) -> str:
+        return f"<RedisQueue {self.prefix}>"
+
+
+class FileResultStore:
+    """Stores the result of every job as a JSON file named by the job id.
+    Files are replaced atomically, so readers never see partial results."""
+
+    def __init__(self, directory: str):
+        """
+        :param directory: the store directory. Created if it doesn't exist
+        :raises: OSError
+        """
+        self.directory = os.fspath(directory)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def put(self, job_id: str, record: dict):
+        ":raises: OSError"
+        path = self._path(job_id)
+        temp_path = f"{path}.{secrets.token_hex(4)}.part"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(record, file)
+            os.replace(temp_path, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+            raise
+
+    def get(self, job_id: str):
+        "Returns the result of a job, or None if not stored."
+        try:
+            with open(self._path(job_id), encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+
+    def __iter__(self):
+        "Yields the stored job ids."
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(".json"):
+                yield name[: -len(".json")]
+
+    def _path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def __repr__(self) -> str:
+        return f"<FileResultStore {self.directory}>"
+
+
+class RedisResultStore:
+    "Stores the result of every job in a Redis hash (`PREFIX:results`)."
+
+    def __init__(self, client=None, url="redis://localhost:6379/0", prefix="fese"):
+        ":raises: ImportError"
+        if client is None:
+            if redis is None:
+                raise ImportError(
+                    "redis is required for this store (pip install redis)"
+                )
+            client = redis.Redis.from_url(url)
+
+        self.client = client
+        self._key = f"{prefix}:results"
+
+    def put(self, job_id: str, record: dict):
+        self.client.hset(self._key, job_id, json.dumps(record))
+
+    def get(self, job_id: str):
+        value = self.client.hget(self._key, job_id)
+        return None if value is None else json.loads(value)
+
+    def __iter__(self):
+        return iter(sorted(_str(key) for key in self.client.hkeys(self._key)))
+
+    def __repr__(self) -> str:
+        return f"<RedisResultStore {self._key}>"
+
+
+class Coordinator:
+    """Probes media files and enqueues their extraction plans."""
+
+    def __init__(self, queue: WorkQueue, backend=None, policy=None, embed_probe=True):
+        """
+        :param queue: a WorkQueue
+        :param backend: the probe backend (see FFprobeVideoContainer)
+        :param policy: the execution policy of the probes
+        :param embed_probe: send the probe result to workers, so they don't
+        probe again
+        """
+        self.queue = queue
+        self.backend = backend
+        self.policy = policy
+        self.embed_probe = embed_probe
+
+    def submit(self, path, method="extract", selector=None, timeout=600, **options):
+        """Probes a media file and enqueues the extraction of its selected streams.
+        Returns the job id, or None if no stream was selected. Jobs already
+        enqueued are not enqueued again.
+
+        :param path: the media source (a path or a URL readable by the workers)
+        :param method: "extract" (convert) or "copy"
+        :param selector: a Selector or its compact form. Defaults to every stream
+        (every text stream for "extract")
+        :param timeout: probe timeout in seconds
+        :param options: JSON serializable keyword arguments of the extraction
+        method (e.g. custom_dir, convert_format, validate)
+        :raises: InvalidSource, InvalidRule, ValueError
+        """
+        if method not in METHODS:
+            raise ValueError(f"Unknown method: {method}")
+
+        try:
+            signature = inspect.signature(
+                getattr(FFprobeVideoContainer, METHODS[method])
+            )
+            signature.bind(None, [], **options)
+            json.dumps(options)
+        except TypeError as error:
+            raise ValueError(f"Invalid options: {error}") from error
+
+        video = FFprobeVideoContainer(path, backend=self.backend, policy=self.policy)
+        if video.input is not None:
+            raise ValueError("Piped sources can't be distributed")
+
+        subtitles = video.get_subtitles(timeout=timeout)
+        if isinstance(selector, str):
+            selector = Selector.parse(selector)
+        if selector is not None:
+            subtitles = selector.select(subtitles)
+        if method == "extract":
+            # Bitmap subtitles can't be converted
+            subtitles = [sub for sub in subtitles if sub.convert_default_format]
+
+        if not subtitles:
+            logger.debug("No streams selected: %s", path)
+            return None
+
+        plan = {
+            "method": method,
+            "streams": sorted(subtitle.index for subtitle in subtitles),
+            "options": options,
+            "source": _source_version(video.path),
+        }
+        job_id = hashlib.sha256(
+            json.dumps([video.path, plan], sort_keys=True).encode()
+        ).hexdigest()[:32]
+
+        if self.embed_probe:
+            # Typed records (msgspec) aren't JSON serializable by the queues
+            plan["probe"] = decoding.loads(decoding.dumps(video.probe().data))
+
+        if self.queue.put(job_id, video.path, plan):
+            logger.debug("Enqueued %s: %s", job_id, path)
+        else:
+            logger.debug("Already enqueued %s: %s", job_id, path)
+        return job_id
+
+    def __repr__(self) -> str:
+        return f"<Coordinator {self.queue}>"
+
+
+class Worker:
+    """Claims and executes jobs. The lease of the running job is renewed by a
+    heartbeat thread. If the claim is lost (e.g. the node was paused longer than
+    the lease), the extraction is cancelled."""
+
+    def __init__(
+        self,
+        queue: WorkQueue,
+        store,
+        name=None,
+        lease=LEASE,
+        backend=None,
+        policy=None,
+        poll_interval=POLL_INTERVAL,
+    ):
+        """
+        :param queue: a WorkQueue
+        :param store: a result store (e.g. FileResultStore)
+        :param name: the worker name. Defaults to HOST:PID
+        :param lease: seconds of every lease. Renewed every third of it
+        :param backend: the probe backend, if the plans don't embed probes
+        :param policy: the execution policy of the FFmpeg calls
+        :param poll_interval: seconds between claims while the queue is empty
+        """
+        self.queue = queue
+        self.store = store
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease = lease
+        self.backend = backend
+        self.policy = policy
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._cancel = None
+
+    def run(self, until_empty=False) -> int:
+        """Processes jobs until stop() is called. Returns the number of jobs run.
+
+        :param until_empty: return once no job is due
+        """
+        processed = 0
+        while not self._stop.is_set():
+            if self.run_once() is not None:
+                processed += 1
+            elif until_empty:
+                break
+            else:
+                self._stop.wait(self.poll_interval)
+
+        return processed
+
+    def stop(self):
+        "Stops the worker. The running job is cancelled and retried later."
+        self._stop.set()
+        cancel = self._cancel
+        if cancel is not None:
+            cancel.cancel()
+
+    def run_once(self):
+        "Claims and executes a job. Returns its result record, or None if no job is due."
+        job = self.queue.claim(self.name, self.lease)
+        if job is None:
+            return None
+
+        logger.debug("Claimed %s (attempt %s): %s", job.id, job.attempts, job.path)
+        self._cancel = cancel = CancellationToken()
+        lost = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, cancel, lost))
+        heartbeat.daemon = True
+        heartbeat.start()
+
+        record = {
+            "job": job.id,
+            "path": job.path,
+            "worker": self.name,
+            "attempt": job.attempts,
+        }
+        start = time.monotonic()
+        failure = None
+        try:
+            record["outputs"] = outputs = self._execute(job, cancel)
+            failed = {
+                index: output["error"]
+                for index, output in outputs.items()
+                if not output["ok"] and not output["skipped"]
+            }
+            if failed:
+                # Retried as a whole: extracted streams are cheap to redo
+                failure = ExtractionError(
+                    "; ".join(f"stream {i}: {error}" for i, error in failed.items())
+                )
+                status = "partial" if len(failed) < len(outputs) else "error"
+                record.update(status=status, error=str(failure))
+            else:
+                record["status"] = "ok"
+        except (FeseError, OSError, ValueError) as error:
+            failure = error
+            record.update(status="error", error=str(error))
+        finally:
+            self._cancel = None
+            cancel.cancel()  # Stops the heartbeat
+            heartbeat.join()
+
+        record["elapsed"] = time.monotonic() - start
+        if lost.is_set():
+            logger.warning("Lost the claim of %s. Result discarded", job.id)
+            return record
+
+        self.store.put(job.id, record)
+        if failure is None:
+            self.queue.complete(job)
+        else:
+            retry = not isinstance(failure, _PERMANENT_ERRORS)
+            logger.warning("Job %s failed (retry: %s): %s", job.id, retry, failure)
+            self.queue.fail(job, record["error"], retry)
+
+        return record
+
+    def _execute(self, job, cancel):
+        plan = job.plan
+        _check_source(job.path, plan.get("source"))
+        video = FFprobeVideoContainer(
+            job.path, backend=self.backend, policy=self.policy
+        )
+        if plan.get("probe") is not None:
+            video._probe_result = ProbeResult(plan["probe"])
+
+        streams = set(plan["streams"])
+        subtitles = [sub for sub in video.get_subtitles() if sub.index in streams]
+        extract = getattr(video, METHODS[plan["method"]])
+        results = extract(subtitles, cancel=cancel, **plan["options"])
+        return {index: result.as_dict() for index, result in results.items()}
+
+    def _heartbeat(self, job, cancel, lost):
+        while not cancel.wait(self.lease / 3):
+            try:
+                renewed = self.queue.heartbeat(job, self.lease)
+            except Exception as error:  # The lease may still be renewed in time
+                logger.warning("Heartbeat of %s failed: %s", job.id, error)
+                continue
+
+            if not renewed:
+                lost.set()
+                cancel.cancel()
+
+    def __repr__(self) -> str:
+        return f"<Worker {self.name}: {self.queue}>"
+
+
+def _source_version(path):
+    "Returns the size and modification time of a local source."
+    if is_url(path) or path.startswith("pipe:"):
+        return None
+
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _check_source(path, version):
+    ":raises: InvalidSource if the source changed since it was probed"
+    if version is not None and _source_version(path) != version:
+        raise InvalidSource(f"{path} changed since it was enqueued")
+
+
+def _str(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    plan TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    due REAL NOT NULL,
+    token TEXT,
+    worker TEXT,
+    error TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_due ON jobs (state, due);
+"""
+
+# KEYS: the due sorted set, the counts hash and the job hash. ARGV[1]: job id
+_LUA = {
+    "put": """
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    return 0
+end
+redis.call('HSET', KEYS[3], 'path', ARGV[3], 'plan', ARGV[4], 'state', 'pending',
+    'attempts', 0)
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+redis.call('HINCRBY', KEYS[2], 'pending', 1)
+return 1
+""",
+    # ARGV: -, now, lease expiration, token, worker, max attempts, job key prefix
+    "claim": """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[2], 'LIMIT', 0, 64)
+for _, id in ipairs(due) do
+    local key = ARGV[7] .. id
+    local state = redis.call('HGET', key, 'state')
+    local attempts = tonumber(redis.call('HGET', key, 'attempts'))
+    if attempts >= tonumber(ARGV[6]) then
+        -- Expired with its last worker
+        redis.call('ZREM', KEYS[1], id)
+        redis.call('HSET', key, 'state', 'failed', 'token', '', 'error',
+            'lease expired')
+        redis.call('HINCRBY', KEYS[2], state, -1)
+        redis.call('HINCRBY', KEYS[2], 'failed', 1)
+    else
+        redis.call('ZADD', KEYS[1], ARGV[3], id)
+        redis.call('HSET', key, 'state', 'running', 'attempts', attempts + 1,
+            'token', ARGV[4], 'worker', ARGV[5])
+        redis.call('HINCRBY', KEYS[2], state, -1)
+        redis.call('HINCRBY', KEYS[2], 'running', 1)
+        return {id, redis.call('HGET', key, 'path'), redis.call('HGET', key, 'plan'),
+            attempts + 1}
+    end
+end
+return false
+""",
+    # ARGV: -, token, now, lease expiration
+    "heartbeat": """
+if redis.call('HGET', KEYS[3], 'token') ~= ARGV[2]
+    or redis.call('HGET', KEYS[3], 'state') ~= 'running'
+    or tonumber(redis.call('ZSCORE', KEYS[1], ARGV[1])) <= tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[4], ARGV[1])
+return 1
+""",
+    # ARGV: -, token
+    "complete": """
+if redis.call('HGET', KEYS[3], 'token') ~= ARGV[2]
+    or redis.call('HGET', KEYS[3], 'state') ~= 'running' then
+    return 0
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HSET', KEYS[3], 'state', 'done', 'token', '', 'error', '')
+redis.call('HINCRBY', KEYS[2], 'running', -1)
+redis.call('HINCRBY', KEYS[2], 'done', 1)
+return 1
+""",
+    # ARGV: -, token, new state, error, retry time
+    "fail": """
+if redis.call('HGET', KEYS[3], 'token') ~= ARGV[2]
+    or redis.call('HGET', KEYS[3], 'state') ~= 'running' then
+    return 0
+end
+if ARGV[3] == 'pending' then
+    redis.call('ZADD', KEYS[1], ARGV[5], ARGV[1])
+else
+    redis.call('ZREM', KEYS[1], ARGV[1])
+end
+redis.call('HSET', KEYS[3], 'state', ARGV[3], 'token', '', 'error', ARGV[4])
+redis.call('HINCRBY', KEYS[2], 'running', -1)
+redis.call('HINCRBY', KEYS[2], ARGV[3], 1)
+return 1
+""",
+}
@@ -6,6 +6,17 @@ class FeseError(Exception):
 
 
 class ExtractionError(FeseError):
+    def __init__(self, *args, failed=None):
+        """
+        :param failed: dictionary of the ExtractionResult of every stream that
+        wasn't extracted by stream index. Their `error` is set. Extractions are
+        atomic: no output of the failed FFmpeg call is kept
+        """
+        super().__init__(*args)
+        self.failed = failed or {}
+
+
+class ExtractionCancelled(ExtractionError):
     pass
 
 
@@ -31,3 +42,11 @@ class LanguageNotFound(FeseError):
 
 class UnsupportedCodec(FeseError):
     pass
+
+
+class WorkerPoolError(FeseError):
+    pass
+
+
+class InvalidRule(FeseError):
+    pass
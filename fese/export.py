@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+# License: GPL
+
+"""Columnar export of probe results.
+
+Rows are one subtitle stream each. Batches are built as pyarrow tables when
+pyarrow is installed, or as NumPy structured arrays otherwise.
+
+Usage:
+    with ColumnarWriter("library.parquet") as writer:
+        for path in paths:
+            writer.add(path, FFprobeVideoContainer(path).get_subtitles())
+"""
+
+from __future__ import annotations
+
+import logging
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Optional dependency
+    pyarrow = None
+
+try:
+    import numpy
+except ImportError:  # Optional dependency
+    numpy = None
+
+logger = logging.getLogger(__name__)
+
+# Bit positions of the disposition bitmask
+DISPOSITION_FLAGS = (
+    "default",
+    "forced",
+    "hearing_impaired",
+    "visual_impaired",
+    "comment",
+    "karaoke",
+    "lyrics",
+    "dub",
+    "original",
+    "generic",
+)
+
+COLUMNS = (
+    ("path", "str"),
+    ("index", "int32"),
+    ("codec_name", "str"),
+    ("type", "str"),
+    ("language", "str"),
+    ("country", "str"),
+    ("disposition", "uint16"),
+    ("frames", "int64"),
+    ("bytes", "int64"),
+    ("bps", "int64"),
+    ("duration", "float64"),
+)
+
+
+def disposition_mask(disposition) -> int:
+    language_kwargs = disposition.language_kwargs()
+    flags = {
+        "forced": language_kwargs["forced"],
+        "hearing_impaired": language_kwargs["hi"],
+    }
+    mask = 0
+    for bit, name in enumerate(DISPOSITION_FLAGS):
+        if flags.get(name, getattr(disposition, name)):
+            mask |= 1 << bit
+
+    return mask
+
+
+def stream_row(path: str, subtitle) -> tuple:
+    "Returns the row of a FFprobeSubtitleStream, in COLUMNS order."
+    tags = subtitle.tags
+    language = subtitle.language
+    duration = subtitle.duration or _first(tags, "duration", "duration_eng")
+    return (
+        path,
+        subtitle.index,
+        subtitle.codec_name,
+        subtitle.type,
+        language.alpha3,
+        "" if language.country is None else language.country.alpha2,
+        disposition_mask(subtitle.disposition),
+        tags.frames,
+        _first(tags, "number_of_bytes", "number_of_bytes_eng"),
+        _first(tags, "bps", "bps_eng"),
+        duration.total_seconds() if duration else 0.0,
+    )
+
+
+def to_columns(rows, kind: str = "auto"):
+    """Builds a columnar batch from rows.
+
+    :param rows: a sequence of stream_row() tuples
+    :param kind: "arrow", "numpy" or "auto" (arrow if pyarrow is installed)
+    :raises: ImportError"""
+    kind = _resolve_kind(kind)
+    columns = list(zip(*rows)) if rows else [()] * len(COLUMNS)
+
+    if kind == "arrow":
+        return pyarrow.Table.from_arrays(
+            [
+                pyarrow.array(column, type=_arrow_type(type_))
+                for column, (_, type_) in zip(columns, COLUMNS)
+            ],
+            names=[name for name, _ in COLUMNS],
+        )
+
+    dtype = []
+    for column, (name, type_) in zip(columns, COLUMNS):
+        if type_ == "str":
+            # Fixed width unicode: no pickled objects in the output
+            type_ = f"U{max((len(val) for val in column), default=1) or 1}"
+        dtype.append((name, type_))
+
+    return numpy.array(rows, dtype=dtype)
+
+
+class ColumnarWriter:
+    """Streams probe results to disk in fixed-size batches.
+
+    Arrow batches are written as Parquet row groups. NumPy batches are
+    appended with numpy.save (read them back with read_numpy_batches)."""
+
+    def __init__(self, path: str, batch_size: int = 50000, kind: str = "auto"):
+        """
+        :param path: output file
+        :param batch_size: rows kept in memory before writing
+        :param kind: "arrow", "numpy" or "auto"
+        :raises: ImportError
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.kind = _resolve_kind(kind)
+        self.rows_written = 0
+        self._rows = []
+        self._writer = None
+        self._file = None
+
+    def add(self, path: str, subtitles):
+        for subtitle in subtitles:
+            self._rows.append(stream_row(path, subtitle))
+
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return None
+
+        batch = to_columns(self._rows, self.kind)
+        if self.kind == "arrow":
+            if self._writer is None:
+                self._writer = pyarrow.parquet.ParquetWriter(self.path, batch.schema)
+            self._writer.write_table(batch)
+        else:
+            if self._file is None:
+                self._file = open(self.path, "wb")
+            numpy.save(self._file, batch, allow_pickle=False)
+
+        logger.debug("Wrote %d rows to %s", len(self._rows), self.path)
+        self.rows_written += len(self._rows)
+        self._rows = []
+
+    def close(self):
+        self.flush()
+        if self._writer is not None:
+            self._writer.close()
+
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def read_numpy_batches(path: str):
+    "Yields the structured arrays written by a NumPy ColumnarWriter."
+    with open(path, "rb") as file:
+        while True:
+            try:
+                yield numpy.load(file, allow_pickle=False)
+            except EOFError:
+                break
+
+
+def _first(tags, *names):
+    for name in names:
+        value = getattr(tags, name, None)
+        if value is not None:
+            return value
+
+    return 0
+
+
+def _resolve_kind(kind):
+    if kind == "auto":
+        kind = "arrow" if pyarrow is not None else "numpy"
+
+    if kind == "arrow" and pyarrow is None:
+        raise ImportError("pyarrow is required for Arrow output (pip install pyarrow)")
+
+    if kind == "numpy" and numpy is None:
+        raise ImportError("NumPy is required for NumPy output (pip install numpy)")
+
+    if kind not in ("arrow", "numpy"):
+        raise ValueError(f"Unknown columnar kind: {kind}")
+
+    return kind
+
+
+def _arrow_type(type_):
+    if type_ == "str":
+        return pyarrow.string()
+
+    return getattr(pyarrow, type_)()
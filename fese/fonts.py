@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+# License: GPL
+
+"""Font attachments of styled (ASS/SSA) subtitles.
+
+Fonts are dumped by FFmpeg in the same pass as the subtitle copy and kept in a
+content-addressed store shared by every media file, as releases of the same
+group reuse their fonts. Only fonts referenced by the extracted subtitles are
+stored. An index maps each subtitle to its fonts.
+
+Usage:
+    store = FontStore("/subs/fonts")
+    results = video.copy_subtitles(subtitles, font_store=store)
+    store.fonts_for(results[0].path)  # [paths of the fonts in the store]
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import re
+import struct
+import tempfile
+import threading
+
+import pysubs2
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+FONT_EXTENSIONS = (".ttf", ".otf", ".ttc", ".otc")
+
+# Name IDs of the family (1), full (4), PostScript (6) and typographic family
+# (16) names
+_NAME_IDS = (1, 4, 6, 16)
+
+_FN_RE = re.compile(r"\\fn([^\\}]+)")
+
+
+class FontStore:
+    """A content-addressed font store.
+
+    Fonts are saved as `<root>/<sha256[:2]>/<sha256><extension>`, so identical
+    fonts attached to different files are stored once. `index.json` keeps the
+    names of every font and the fonts of every subtitle.
+
+    Stores can be shared by processes: index updates are serialized with an
+    exclusive lock of `index.lock` and the index is replaced atomically. File
+    locks aren't available on Windows, where a store must be used by a single
+    process.
+
+    :param root: the store directory
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.index_path = os.path.join(self.root, "index.json")
+        self.lock_path = os.path.join(self.root, "index.lock")
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def temp_dir(self) -> str:
+        "Returns a new temporary directory in the store's filesystem."
+        return tempfile.mkdtemp(prefix=".dump-", dir=self.root)
+
+    def add(self, path: str) -> str:
+        """Moves a font file into the store. Returns its SHA-256.
+
+        :raises: OSError"""
+        digest = _sha256(path)
+        target = self.font_path(digest, os.path.splitext(path)[-1].lower())
+        if os.path.exists(target):
+            logger.debug("Font already stored: %s", target)
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(path, target)
+
+        return digest
+
+    def font_path(self, digest: str, extension: str) -> str:
+        return os.path.join(self.root, digest[:2], f"{digest}{extension}")
+
+    def collect(self, subtitle_paths, dumped) -> dict:
+        """Stores the dumped fonts referenced by the subtitles and indexes them.
+        Returns the store paths of the fonts of every subtitle.
+
+        :param subtitle_paths: paths of extracted ASS/SSA subtitles
+        :param dumped: a dictionary of attachment file names by dumped path
+        :raises: OSError
+        """
+        fonts = {}  # Dumped path -> lowercased names
+        for path in dumped:
+            try:
+                with open(path, "rb") as file:
+                    fonts[path] = {name.lower() for name in font_names(file.read())}
+            except OSError as error:
+                logger.warning("Couldn't read dumped font %s: %s", path, error)
+
+        wanted = {}
+        for sub_path in subtitle_paths:
+            try:
+                references = {name.lower() for name in ass_fonts(sub_path)}
+            except Exception as error:  # pysubs2 raises many exception types
+                logger.warning("Couldn't parse fonts of %s: %s", sub_path, error)
+                continue
+
+            wanted[sub_path] = [
+                path
+                for path, names in fonts.items()
+                # Fonts without readable names are kept as they might be used
+                if not names or names & references
+            ]
+            missing = references - set().union(*fonts.values())
+            if missing:
+                logger.debug("Fonts not attached for %s: %s", sub_path, missing)
+
+        stored = {}  # Dumped path -> (digest, names)
+        for path in {path for paths in wanted.values() for path in paths}:
+            stored[path] = (self.add(path), sorted(fonts[path]))
+
+        result = {}
+        with self._locked():
+            index = self._read_index()
+            for path, (digest, names) in stored.items():
+                entry = index["fonts"].setdefault(
+                    digest,
+                    {"extension": os.path.splitext(path)[-1].lower(), "names": []},
+                )
+                entry["names"] = sorted(set(entry["names"]) | set(names))
+                filenames = set(entry.get("filenames", [])) | {dumped[path]}
+                entry["filenames"] = sorted(filenames)
+
+            for sub_path, paths in wanted.items():
+                digests = sorted({stored[path][0] for path in paths})
+                index["subtitles"][os.path.abspath(sub_path)] = digests
+                result[sub_path] = [
+                    self.font_path(digest, index["fonts"][digest]["extension"])
+                    for digest in digests
+                ]
+
+            self._write_index(index)
+
+        return result
+
+    def fonts_for(self, subtitle_path: str) -> list:
+        "Returns the store paths of the fonts of a subtitle."
+        with self._lock:
+            index = self._read_index()
+
+        return [
+            self.font_path(digest, index["fonts"][digest]["extension"])
+            for digest in index["subtitles"].get(os.path.abspath(subtitle_path), [])
+        ]
+
+    @contextlib.contextmanager
+    def _locked(self):
+        "Locks the index for the threads and processes using the store."
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+
+            with open(self.lock_path, "a") as file:
+                fcntl.flock(file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(file, fcntl.LOCK_UN)
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {"fonts": {}, "subtitles": {}}
+
+    def _write_index(self, index):
+        temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(index, file, indent=1, sort_keys=True)
+        os.replace(temp_path, self.index_path)
+
+    def __repr__(self) -> str:
+        return f"<FontStore {self.root}>"
+
+
+def is_font(attachment) -> bool:
+    "Returns True if a probe Attachment is a font."
+    mimetype = (attachment.mimetype or "").lower()
+    filename = (attachment.filename or "").lower()
+    return (
+        "font" in mimetype
+        or mimetype == "application/vnd.ms-opentype"
+        or filename.endswith(FONT_EXTENSIONS)
+    )
+
+
+def font_names(data: bytes) -> set:
+    """Returns the family, full and PostScript names of an OpenType/TrueType
+    font or collection. Returns an empty set if the data can't be parsed."""
+    try:
+        if data[:4] == b"ttcf":
+            count = struct.unpack_from(">I", data, 8)[0]
+            offsets = struct.unpack_from(f">{count}I", data, 12)
+        else:
+            offsets = (0,)
+
+        names = set()
+        for offset in offsets:
+            names |= _sfnt_names(data, offset)
+        return names
+    except (struct.error, IndexError) as error:
+        logger.debug("Invalid font data: %s", error)
+        return set()
+
+
+def ass_fonts(path: str) -> set:
+    """Returns the font names used by the styles and inline overrides (\\fn) of
+    an ASS/SSA file."""
+    subs = pysubs2.load(path, format_="ass")
+    fonts = {style.fontname for style in subs.styles.values()}
+    for event in subs.events:
+        fonts.update(match.strip() for match in _FN_RE.findall(event.text))
+
+    # "@" selects the vertical variant of a font
+    return {font.lstrip("@") for font in fonts if font.strip()}
+
+
+def _sfnt_names(data, offset):
+    num_tables = struct.unpack_from(">H", data, offset + 4)[0]
+    for i in range(num_tables):
+        tag, _, table, _ = struct.unpack_from(">4sIII", data, offset + 12 + i * 16)
+        if tag == b"name":
+            break
+    else:
+        return set()
+
+    _, count, strings = struct.unpack_from(">HHH", data, table)
+    names = set()
+    for i in range(count):
+        platform, _, _, name_id, length, start = struct.unpack_from(
+            ">HHHHHH", data, table + 6 + i * 12
+        )
+        if name_id not in _NAME_IDS:
+            continue
+
+        raw = data[table + strings + start : table + strings + start + length]
+        if platform in (0, 3):
+            name = raw.decode("utf-16-be", errors="ignore")
+        elif platform == 1:
+            name = raw.decode("mac_roman", errors="ignore")
+        else:
+            continue
+
+        name = name.strip("\x00 ")
+        if name:
+            names.add(name)
+
+    return names
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# License: GPL
+
+"""Per-phase timing hooks.
+
+Usage:
+    stats = PhaseStats()
+    add_hook(stats)
+    ...
+    print(stats.summary())
+
+Spans cost a function call and a list check while no hook is registered."""
+
+from __future__ import annotations
+
+import bisect
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_hooks = []
+
+
+class Span:
+    __slots__ = ("name", "attributes", "start_time", "duration", "error", "_start")
+
+    def __init__(self, name, attributes):
+        self.name = name
+        self.attributes = attributes
+        self.start_time = None  # Seconds since the epoch
+        self.duration = None  # Seconds
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.duration = time.perf_counter() - self._start
+        if exc_type is not None:
+            self.error = exc_type.__name__
+
+        for hook in _hooks:
+            try:
+                hook(self)
+            except Exception as error:  # A broken hook must not break extractions
+                logger.warning("Error calling %s hook: %s", hook, error)
+
+        return False
+
+    def __repr__(self) -> str:
+        return f"<Span {self.name}: {self.duration}>"
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, **attributes):
+    "Returns a context manager timing a phase."
+    if not _hooks:
+        return _NULL_SPAN
+
+    return Span(name, attributes)
+
+
+def add_hook(hook):
+    """Registers a callable which takes a finished Span.
+
+    Current phase names: probe, probe.exec, probe.decode, stream.init,
+    stream.tags, stream.disposition, extract.build and ffmpeg."""
+    if hook not in _hooks:
+        _hooks.append(hook)
+
+
+def remove_hook(hook):
+    try:
+        _hooks.remove(hook)
+    except ValueError:
+        pass
+
+
+class PhaseStats:
+    """Hook aggregating span durations into per-phase histograms."""
+
+    # Upper bounds (seconds) of the histogram buckets
+    BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._phases = {}
+
+    def __call__(self, span_: Span):
+        with self._lock:
+            phase = self._phases.get(span_.name)
+            if phase is None:
+                phase = self._phases[span_.name] = {
+                    "count": 0,
+                    "errors": 0,
+                    "total": 0.0,
+                    "min": None,
+                    "max": 0.0,
+                    "buckets": [0] * (len(self.BUCKETS) + 1),
+                }
+
+            duration = span_.duration
+            phase["count"] += 1
+            phase["total"] += duration
+            phase["max"] = max(phase["max"], duration)
+            phase["min"] = (
+                duration if phase["min"] is None else min(phase["min"], duration)
+            )
+            phase["buckets"][bisect.bisect_left(self.BUCKETS, duration)] += 1
+            if span_.error is not None:
+                phase["errors"] += 1
+
+    def summary(self) -> dict:
+        "Returns a copy of the stats by phase name."
+        with self._lock:
+            summary = {}
+            for name, phase in self._phases.items():
+                summary[name] = dict(phase, buckets=list(phase["buckets"]))
+                summary[name]["mean"] = phase["total"] / phase["count"]
+
+            return summary
+
+    def reset(self):
+        with self._lock:
+            self._phases.clear()
+
+
+class OpenTelemetryHook:
+    """Hook exporting spans through an OpenTelemetry tracer.
+
+    Usage:
+        add_hook(OpenTelemetryHook(trace.get_tracer("fese")))
+    """
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+
+    def __call__(self, span_: Span):
+        start = int(span_.start_time * 1e9)
+        otel_span = self.tracer.start_span(
+            f"fese.{span_.name}",
+            start_time=start,
+            attributes={key: str(val) for key, val in span_.attributes.items()},
+        )
+        if span_.error is not None:
+            otel_span.set_attribute("error.type", span_.error)
+
+        otel_span.end(end_time=start + int(span_.duration * 1e9))
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+# License: GPL
+
+"""Language verification of text subtitle streams.
+
+A few windows of every text stream are sampled in one FFmpeg call per container
+(see FFprobeVideoContainer.sample_subtitles) and the cues are identified with a
+character trigram detector:
+
+    subtitles = video.get_subtitles()
+    verify_languages(video, subtitles)
+    subtitles[0].tags.language, subtitles[0].tags.language_confidence
+
+Languages with their own script (e.g. Japanese, Korean, Arabic) are identified
+by script. Latin and Cyrillic languages are ranked against the profiles below
+with the out-of-place distance (Cavnar & Trenkle)."""
+
+from __future__ import annotations
+
+from collections import Counter
+from collections import namedtuple
+import logging
+import re
+import tempfile
+
+from babelfish import Language
+
+logger = logging.getLogger(__name__)
+
+# Minimum confidence to replace a container tag
+MIN_CONFIDENCE = 0.1
+
+# Minimum letters required to attempt a detection
+MIN_LETTERS = 50
+
+PROFILE_SIZE = 160
+
+Detection = namedtuple("Detection", ("language", "confidence"))
+
+_WORD_RE = re.compile(r"[^\W\d_]+")
+_TAG_RE = re.compile(r"<[^>]*>|\{[^}]*\}")
+_TIMING_RE = re.compile(r"^\d+$|-->")
+
+# (first code point, last code point, alpha3) of languages identified by script
+_SCRIPTS = (
+    (0x3040, 0x30FF, "jpn"),  # Hiragana and Katakana
+    (0xAC00, 0xD7AF, "kor"),  # Hangul syllables
+    (0x1100, 0x11FF, "kor"),  # Hangul jamo
+    (0x4E00, 0x9FFF, "zho"),  # CJK ideographs (also used by Japanese)
+    (0x0600, 0x06FF, "ara"),
+    (0x0590, 0x05FF, "heb"),
+    (0x0370, 0x03FF, "ell"),
+    (0x0E00, 0x0E7F, "tha"),
+)
+
+# Most frequent word-bounded ("_") trigrams in reference dialogue, by rank
+_PROFILES = {
+    "eng": (
+        "_th the _yo you he_ ou_ re_ ng_ _ha me_ _to at_ ing thi is_ _i_ ave ere her "
+        "to_ _an _we _wh hat hav hin ll_ ve_ _wa en_ _be _he _is and for it_ ld_ nd_ "
+        "ome on_ or_ tha we_ _do _me _no _se _wi as_ ed_ his ow_ se_ _a_ _fo _le _pl "
+        "_te ce_ er_ ill in_ now oth oul see st_ th_ uld ut_ whe _bu _co _ev _go _hi "
+        "_in _it _mo _my _s_ _sh _so _st _t_ _ta _ti _wo all een et_ eve ey_ go_ hey "
+        "ith lea my_ ne_ nk_ nt_ one pen sho tel ver was wer wha wit _ab _ar _at _ca "
+        "_di _kn _li _lo _ne _on _ot _re _si _tr abo ace ait alk app are ase ay_ be_ "
+        "bef bou but ch_ com day don eas ee_ eed efo ell ene ent ery es_ ght han hap "
+        "has him hou ht_ igh im_ ime ink "
+    ),
+    "spa": (
+        "_qu _es que ue_ os_ de_ _de do_ es_ est _co _lo en_ _el _la _no el_ la_ mos "
+        "no_ _en _ha _po ar_ lo_ or_ _te ndo por te_ to_ ás_ _di _he _to _y_ con ene "
+        "nte sta tes tod _mi _ve _vi ado amo and as_ era he_ ir_ me_ na_ nde per ro_ "
+        "ten vis _a_ _an _fa _lu _mu _na _sa _se _si _ti _un art ber da_ die emo ent "
+        "erm erí gar hab ien ist lug mi_ nad nos odo on_ qué ra_ ría sa_ sto stá ta_ "
+        "tie uga un_ ué_ ía_ _ay _ca _cr _dó _ma _pa _pe _pr _pu _tu _va abe abl aci "
+        "adi ame ana ano ant avo aña bla cha che cho co_ cre deb des dij dón ebe ede "
+        "end eng eo_ er_ ere ero esp ete ez_ fav go_ has her ho_ ie_ ión los mañ muc "
+        "más nem nes nta och oda ome ont "
+    ),
+    "por": (
+        "_qu que ue_ do_ de_ _es _o_ ar_ _de _te em_ os_ _a_ _po _vo nte ão_ _co cê_ "
+        "est eu_ ocê or_ por te_ voc ele mos tem _eu _pr _se ndo ont _di _e_ _el _mu "
+        "_nã _on _ve con da_ ent ez_ iss não se_ so_ to_ _ac _do _em _fa _ma _mi _va "
+        "_é_ ai_ amo and es_ ia_ ir_ nde nta ra_ tar _lu _me _na _sa _um _vi ado ant "
+        "as_ cis com dis eci end er_ era gar isa ito le_ lug min mui nha ond pre rar "
+        "rec sa_ sso sta ta_ uga uit vai ven vez _ai _an _at _ca _ce _ir _is _jo _mo "
+        "_ni _ou _pa _to _tu ach aco ain anh ate ava avo bri car cer cho coi dar dev "
+        "ece ens ert esc esp evi fav gad gen gué ha_ ho_ hã_ iga ind ing inh iso les "
+        "man mas me_ na_ nda ngu nhã nin "
+    ),
+    "fra": (
+        "_qu _de is_ le_ _le re_ _il ais de_ er_ it_ on_ que ue_ _la _ma _pa nt_ us_ "
+        "_es _je _tu est la_ ne_ ous tu_ ce_ es_ il_ je_ st_ _ce _mo _on _pe _vo ait "
+        "in_ lle mai se_ _av _di _et _ne _to _à_ _ét et_ ns_ oi_ ont our par qu_ rai "
+        "te_ tou _a_ _ai _c_ _ch _en _no _po _re ant end ir_ ndr nou out pas son tai "
+        "tre ur_ ut_ vou éta _au _be _do _fa _j_ _où _pr _y_ ain as_ ass ave che ez_ "
+        "ie_ ils les ls_ mat moi mon ois oit ons où_ pou ten ter tte ute voi _al _as "
+        "_at _da _hi _me _n_ _pl _s_ _sa _se _so _t_ _te _té _va _vi _vu ai_ all ans "
+        "arl art ati att au_ aut ava cho ci_ cor cou dan dep dev dit doi dre dro eau "
+        "ec_ en_ enc ens ent epu era erc "
+    ),
+    "deu": (
+        "en_ ich ch_ st_ er_ _da as_ _du _wa du_ ir_ _un das ie_ _si nd_ _ge _ic _wi "
+        "hen _di abe ass der ist wir _de _ha _mi _ni ehe sie ss_ und war _er _is cht "
+        "ges nde te_ _ab _an _we _zu and die es_ ht_ on_ seh ten was _bi _sc _se be_ "
+        "che ein em_ ern ers est fen gen ier in_ lle nic ns_ rt_ sch sen sse ste zen "
+        "ür_ _al _au _es _fü _he _hi _la _me _mu _no _wo art auf ben ber dem den dir "
+        "end ese für geh hab hn_ iel it_ las len mei mir mus noc och rge rn_ rte sic "
+        "tte uns uss wei wo_ zu_ _be _fa _ga _gl _ih _im _in _ka _ko _mo _mü _pa _re "
+        "_so _ve _vi _vo _ze agt ahr all an_ anz ar_ ast bei bis bit cho des ede ei_ "
+        "eic eit eiß ele ema ert erz etz "
+    ),
+    "ita": (
+        "to_ re_ _ch _la che he_ la_ _do no_ _di are sto ti_ _co ia_ mo_ on_ tto _no "
+        "_pe _è_ amo di_ ett iam lo_ ra_ _da _e_ _fa _il _mi _pr _qu _st _tu ai_ and "
+        "do_ dov ess il_ ma_ non per sa_ so_ ta_ ver _a_ _al _an _de _er _ha _ma _pa "
+        "_po _se _te _ve cos ell eri na_ ndo osa par pri ri_ ro_ sta tut utt _as _gi "
+        "_lo _ne _si _tr _un _vi acc art asc bbi bia con da_ er_ era erc est gli ier "
+        "ima io_ llo mi_ nes oi_ ost pos que rim rmi ssu sun tar te_ tel tta un_ uti "
+        "vis _ad _bi _ca _ce _ho _ie _in _l_ _mo _ri _sa _so _su _ti _to alt ama ami "
+        "anc ani ann arl arm asp ato att azi cce cco chi ché ci_ cia com cor dar de_ "
+        "det dev dia dob ede ele ent ere "
+    ),
+    "nld": (
+        "en_ _he et_ _de _wa at_ _je je_ ten _we aar de_ er_ _da _ik _mo dat het ik_ "
+        "ver ar_ is_ _is _zi moe oet ste we_ _al _en _ge _mi _ni _op _ve and ien iet "
+        "ij_ ijn jn_ nie _hi _me _ze ele ert ete ist oor op_ tel ter waa _be _ko _la "
+        "_te _vo an_ cht der ek_ ere eur heb lie lle me_ mij nd_ nde or_ ove pen te_ "
+        "voo wat zie _an _di _er _ov _zo aan als as_ ate beu bli den dit eet eft es_ "
+        "ft_ hee hel hie hij hte it_ kom om_ ren rt_ rte uis ven was wee ze_ zij _bi "
+        "_ee _ga _gi _jo _ka _ke _ku _ma _na _ne _no _om _pl _st _u_ _va aat ach all "
+        "bel bij bt_ daa ds_ eb_ ebe ebt eda eds een eer eld ell em_ ema end enk era "
+        "erg ers ets ezi gaa geb gen gez "
+    ),
+    "pol": (
+        "dzi _po ie_ nie _ni zie my_ wie _że em_ że_ _by _pr ać_ cze ied owi pow sz_ "
+        "_mu _na _si _to _wi _za był esz eś_ mus się to_ ym_ _a_ _do _dz _je _mi _od "
+        "_te ci_ edz go_ iał iej ię_ mie na_ prz usi zia _ci _co _cz _i_ _mn _mo _my "
+        "_o_ _ty _w_ _wc aj_ az_ ały czo ecz ejs eka idz iem ien ies iśm jes ko_ mni "
+        "mu_ raz rze rzy szy szę wsz za_ zor zę_ łem łeś śmy _al _bi _ca _ch _dl _gd "
+        "_go _ki _ko _mó _on _ra _tu _ws _z_ acz ale ana at_ awd ał_ ałe bie cał cho "
+        "cią co_ cz_ dla do_ dy_ dę_ edy ego ele emy eni era est ewi eć_ gdz hod iec "
+        "ier ieć im_ imy inn isz ić_ ięk jsc ją_ kać kie kol lac le_ liś lę_ moż myś "
+        "ni_ nik no_ obi ode odz omu oni "
+    ),
+    "rus": (
+        "то_ _по ть_ не_ _чт что _на _те _я_ ты_ _бы _не _ты но_ _пр ать был ое_ чер "
+        "_эт бе_ ебе теб это _вс _до _мо _ну _он _са аза го_ дит ере жно ить каз ли_ "
+        "на_ нуж они ра_ ска сь_ ужн шь_ _а_ _ве _да _за _и_ _ко _ме _ми _мн _мы _ни "
+        "_от _ск _че ай_ ал_ ам_ амо аю_ вер вид всё да_ дав де_ дел его ен_ есь ет_ "
+        "ешь зал иде ит_ маю мен мне му_ мы_ нам нь_ оди он_ оче сам ста сто ся_ сё_ "
+        "ход ыл_ _бо _ви _вч _гд _де _ду _ег _ещ _из _ма _но _о_ _оч _ра _с_ _то _ув "
+        "_ух ава алу ас_ аси бол вай веч вор вче гда где гов дат дес до_ дол дум ез_ "
+        "ел_ еле ем_ ень еня ера ерь ещё жал жда жен жеш за_ зат им_ ину йст ког кое "
+        "лже ло_ луй льш мин мог мое мож "
+    ),
+}
+
+_RANKS = {
+    alpha3: {gram: rank for rank, gram in enumerate(profile.split())}
+    for alpha3, profile in _PROFILES.items()
+}
+
+
+def trigrams(text: str) -> Counter:
+    "Returns the word-bounded character trigram counts of a text."
+    counts = Counter()
+    for word in _WORD_RE.findall(text.lower()):
+        word = f"_{word}_"
+        counts.update(word[i : i + 3] for i in range(len(word) - 2))
+
+    return counts
+
+
+def detect(text: str):
+    """Identifies the language of a text. Returns a Detection or None if the
+    text is too short.
+
+    The confidence of trigram detections is the relative distance between the
+    best and the second best profiles."""
+    letters = [char for char in text if char.isalpha()]
+    if len(letters) < MIN_LETTERS:
+        return None
+
+    by_script = _detect_script(letters)
+    if by_script is not None:
+        return by_script
+
+    ranked = [
+        gram
+        for gram, _ in sorted(
+            trigrams(text).items(), key=lambda item: (-item[1], item[0])
+        )[:PROFILE_SIZE]
+    ]
+    distances = sorted(
+        (_distance(ranked, ranks), alpha3) for alpha3, ranks in _RANKS.items()
+    )
+    (best, alpha3), (second, _) = distances[0], distances[1]
+    confidence = (second - best) / second if second else 0.0
+    logger.debug("Trigram distances: %s", distances)
+    return Detection(Language(alpha3), round(confidence, 3))
+
+
+def _distance(ranked, ranks):
+    # Out-of-place measure. Missing trigrams get the maximum penalty
+    return sum(
+        abs(rank - ranks[gram]) if gram in ranks else PROFILE_SIZE
+        for rank, gram in enumerate(ranked)
+    )
+
+
+def _detect_script(letters):
+    counts = Counter()
+    for char in letters:
+        point = ord(char)
+        for first, last, alpha3 in _SCRIPTS:
+            if first <= point <= last:
+                counts[alpha3] += 1
+                break
+
+    if not counts:
+        return None
+
+    # Kanji are shared, kana are not
+    if counts["jpn"]:
+        counts["jpn"] += counts.pop("zho", 0)
+
+    alpha3, count = counts.most_common(1)[0]
+    if count < len(letters) / 2:
+        return None
+
+    return Detection(Language(alpha3), round(count / len(letters), 3))
+
+
+def subtitle_text(path: str) -> str:
+    "Returns the text of the cues of a SubRip file without markup."
+    lines = []
+    with open(path, encoding="utf-8", errors="replace") as file:
+        for line in file:
+            line = line.strip()
+            if line and not _TIMING_RE.search(line):
+                lines.append(_TAG_RE.sub("", line).replace("\\N", " "))
+
+    return "\n".join(lines)
+
+
+def verify_languages(
+    video,
+    subtitles,
+    windows: int = 3,
+    sample_seconds=60,
+    timeout: int = 600,
+    min_confidence: float = None,
+) -> dict:
+    """Verifies the language tags of text subtitles sampling their cues in a
+    single FFmpeg call. Returns a dictionary of Detections by index.
+
+    Every verified stream gets `tags.language_confidence`: the confidence of the
+    detection if it confirms or replaces the tag, or 0.0 if it disagrees with
+    the tag without enough confidence to replace it. Confirmed tags keep their
+    country.
+
+    :param video: a FFprobeVideoContainer
+    :param subtitles: a list of FFprobeSubtitle instances. Bitmap streams are
+    ignored
+    :param windows: number of sampled windows per stream
+    :param sample_seconds: seconds of every window
+    :param timeout: subprocess timeout in seconds (default: 600)
+    :param min_confidence: minimum confidence to replace a tag. Defaults to
+    `MIN_CONFIDENCE`
+    :raises: ExtractionError, OSError
+    """
+    if min_confidence is None:
+        min_confidence = MIN_CONFIDENCE
+
+    text_subtitles = [sub for sub in subtitles if sub.type == "text"]
+    if not text_subtitles:
+        return {}
+
+    detections = {}
+    with tempfile.TemporaryDirectory(prefix="fese-langid-") as tmp_dir:
+        samples = video.sample_subtitles(
+            text_subtitles,
+            windows=windows,
+            sample_seconds=sample_seconds,
+            custom_dir=tmp_dir,
+            timeout=timeout,
+            convert_format="srt",
+        )
+        for subtitle in text_subtitles:
+            text = "\n".join(
+                subtitle_text(path) for path in samples.get(subtitle.index, ())
+            )
+            detection = detect(text)
+            if detection is None:
+                logger.debug("Not enough text to verify %s", subtitle)
+                continue
+
+            _apply(subtitle, detection, min_confidence)
+            detections[subtitle.index] = detection
+
+    return detections
+
+
+def _apply(subtitle, detection, min_confidence):
+    tags = subtitle.tags
+    if detection.language.alpha3 == tags.language.alpha3:
+        logger.debug("Confirmed language of %s: %s", subtitle, detection)
+        tags.language_confidence = detection.confidence
+    elif detection.confidence >= min_confidence:
+        logger.info("Correcting language of %s: %s", subtitle, detection)
+        tags.language = detection.language
+        tags.language_confidence = detection.confidence
+        tags._language_fallback = False
+    else:
+        logger.debug("Unconfident language of %s: %s", subtitle, detection)
+        tags.language_confidence = 0.0
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+# License: GPL
+
+"""Resource policies for FFmpeg processes.
+
+Priorities and limits are applied by prefixing the command with the standard
+util-linux/coreutils wrappers (taskset, ionice, nice, prlimit) instead of a
+`preexec_fn`, which is unsafe in threaded programs. A Limiter shared by every
+policy bounds the concurrent processes and the aggregate read bandwidth.
+
+Usage:
+    from fese import container
+    from fese.policy import ExecutionPolicy, Limiter
+
+    container.EXECUTION_POLICY = ExecutionPolicy(
+        nice=15,
+        ionice_class="idle",
+        threads=1,
+        limiter=Limiter(max_processes=2, read_rate=50 * 1024**2),
+    )
+"""
+
+from __future__ import annotations
+
+import contextlib
+import logging
+import os
+import shutil
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_IONICE_CLASSES = {"realtime": 1, "best-effort": 2, "idle": 3}
+
+
+class TokenBucket:
+    """A token bucket that admits requests larger than its capacity.
+
+    A request waits until the bucket isn't in debt and then takes its tokens,
+    possibly leaving it in debt. The average rate is kept without blocking
+    requests bigger than the burst forever.
+
+    :param rate: tokens added per second
+    :param capacity: maximum tokens stored (burst). Defaults to `rate`
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        if rate <= 0:
+            raise ValueError(f"Invalid rate: {rate}")
+
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, tokens: float, timeout: float = None) -> bool:
+        "Returns False if the tokens couldn't be taken before the timeout."
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 0:
+                    self._tokens -= tokens
+                    return True
+
+                wait = -self._tokens / self.rate
+
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    return False
+
+            time.sleep(wait)
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+
+class Limiter:
+    """Bounds concurrent FFmpeg processes and the bytes they read per second.
+
+    Every call is charged an estimate of the bytes it reads before it starts
+    (see ExecutionPolicy.acquire). Piped input is charged as it's written
+    instead (see meter).
+
+    :param max_processes: maximum concurrent processes (None: unlimited)
+    :param read_rate: bytes per second (None: unlimited)
+    :param burst: bytes that can be read at once. Defaults to `read_rate`
+    """
+
+    def __init__(self, max_processes: int = None, read_rate: float = None, burst=None):
+        self._semaphore = (
+            None if max_processes is None else threading.BoundedSemaphore(max_processes)
+        )
+        self._bucket = None if read_rate is None else TokenBucket(read_rate, burst)
+
+    @contextlib.contextmanager
+    def acquire(self, read_bytes: int = 0):
+        # Throttled calls wait for their bytes without holding a process slot
+        if self._bucket is not None and read_bytes:
+            self._bucket.consume(read_bytes)
+
+        if self._semaphore is not None:
+            self._semaphore.acquire()
+
+        try:
+            yield
+        finally:
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+    def meter(self, chunks):
+        "Yields the chunks charging their bytes as they're taken."
+        for chunk in chunks:
+            if self._bucket is not None:
+                self._bucket.consume(len(chunk))
+            yield chunk
+
+
+class ExecutionPolicy:
+    """Priorities and limits of FFmpeg processes.
+
+    Wrappers not found in PATH are skipped with a warning.
+
+    :param nice: niceness increment (0-19)
+    :param ionice_class: "realtime", "best-effort" or "idle"
+    :param ionice_level: priority within the class (0-7)
+    :param memory_limit: maximum address space in bytes (RLIMIT_AS)
+    :param cpus: CPU numbers the process can run on
+    :param threads: FFmpeg `-threads` for every input
+    :param limiter: a Limiter, usually shared by every policy
+    """
+
+    def __init__(
+        self,
+        nice: int = None,
+        ionice_class: str = None,
+        ionice_level: int = None,
+        memory_limit: int = None,
+        cpus=None,
+        threads: int = None,
+        limiter: Limiter = None,
+    ):
+        if ionice_class is not None and ionice_class not in _IONICE_CLASSES:
+            raise ValueError(f"Invalid ionice class: {ionice_class}")
+
+        self.nice = nice
+        self.ionice_class = ionice_class
+        self.ionice_level = ionice_level
+        self.memory_limit = memory_limit
+        self.cpus = None if cpus is None else tuple(cpus)
+        self.threads = threads
+        self.limiter = limiter
+
+    def wrap(self, command) -> list:
+        "Returns the command with the wrappers and FFmpeg options of the policy."
+        command = list(command)
+        if self.threads is not None:
+            command = _with_threads(command, self.threads)
+
+        prefix = []
+        if self.cpus:
+            prefix += _tool("taskset", "-c", ",".join(str(cpu) for cpu in self.cpus))
+
+        if self.ionice_class is not None or self.ionice_level is not None:
+            args = ["-c", str(_IONICE_CLASSES[self.ionice_class or "best-effort"])]
+            if self.ionice_level is not None and self.ionice_class != "idle":
+                args += ["-n", str(self.ionice_level)]
+            prefix += _tool("ionice", *args)
+
+        if self.nice:
+            prefix += _tool("nice", "-n", str(self.nice))
+
+        if self.memory_limit is not None:
+            prefix += _tool("prlimit", f"--as={int(self.memory_limit)}", "--")
+
+        return prefix + command
+
+    @contextlib.contextmanager
+    def acquire(self, command, read_bytes: int = None):
+        """Waits for the limiter (if any) to admit the command.
+
+        :param read_bytes: estimate of the bytes read by the command (e.g. the
+        share of a time window). Defaults to the size of its input files
+        """
+        if self.limiter is None:
+            yield
+            return
+
+        if read_bytes is None:
+            read_bytes = _input_bytes(command)
+
+        with self.limiter.acquire(read_bytes):
+            yield
+
+    def meter(self, chunks):
+        "Returns the chunks of a piped input, charged by the limiter (if any)."
+        if self.limiter is None:
+            return chunks
+
+        return self.limiter.meter(chunks)
+
+    def __repr__(self) -> str:
+        settings = ", ".join(
+            f"{key}={val}" for key, val in vars(self).items() if val is not None
+        )
+        return f"<ExecutionPolicy {settings}>"
+
+
+def _with_threads(command, threads):
+    result = []
+    for arg in command:
+        if arg == "-i":
+            result += ["-threads", str(threads)]
+        result.append(arg)
+
+    return result
+
+
+def _tool(name, *args):
+    path = shutil.which(name)
+    if path is None:
+        logger.warning("%s not found. Ignoring policy option", name)
+        return []
+
+    return [path, *args]
+
+
+def _input_bytes(command):
+    total = 0
+    # Windows of the same file are charged once
+    for path in {val for flag, val in zip(command, command[1:]) if flag == "-i"}:
+        try:
+            total += os.path.getsize(path)
+        except (OSError, TypeError, ValueError):
+            pass
+
+    return total
@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+# License: GPL
+
+"""Pool of long-lived probe workers.
+
+Every worker is a Python process with fese already imported and the FFprobe
+path already resolved. Paths are sent over the worker's stdin and the probe
+data is returned through its stdout (one JSON document per line)."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import queue
+import select
+import shutil
+import subprocess
+import sys
+import threading
+import time
+
+from .backends import get_backend
+from .backends import ProbeBackend
+from .decoding import dumps
+from .exceptions import InvalidSource
+from .exceptions import WorkerPoolError
+
+logger = logging.getLogger(__name__)
+
+_PACKAGE_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class _Worker:
+    def __init__(self, command):
+        # Make sure the workers import this same fese package
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(
+            item for item in (_PACKAGE_ROOT, env.get("PYTHONPATH")) if item
+        )
+        self.proc = subprocess.Popen(
+            command,
+            env=env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+            bufsize=1,
+        )
+        self.jobs = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def alive(self):
+        return self.proc.poll() is None
+
+    def request(self, data: dict, timeout=None) -> dict:
+        """:raises: WorkerPoolError"""
+        try:
+            self.proc.stdin.write(json.dumps(data) + "\n")
+            self.proc.stdin.flush()
+        except (BrokenPipeError, ValueError) as error:
+            raise WorkerPoolError(f"Worker {self.proc.pid} is gone: {error}") from error
+
+        ready, _, _ = select.select([self.proc.stdout], [], [], timeout)
+        line = self.proc.stdout.readline() if ready else ""
+        if not line:
+            self.kill()
+            raise WorkerPoolError(
+                f"Worker {self.proc.pid} didn't answer in {timeout} seconds"
+            )
+
+        self.last_used = time.monotonic()
+        return json.loads(line)
+
+    def ping(self, timeout=10):
+        try:
+            return self.request({"op": "ping"}, timeout=timeout).get("ok", False)
+        except WorkerPoolError as error:
+            logger.debug("Health check failed: %s", error)
+            return False
+
+    def kill(self):
+        if self.alive:
+            self.proc.kill()
+
+        self.proc.wait()
+        for file in (self.proc.stdin, self.proc.stdout):
+            try:
+                file.close()
+            except OSError:
+                pass
+
+    def __repr__(self) -> str:
+        return f"<_Worker {self.proc.pid}: {self.jobs} jobs>"
+
+
+class FFprobeWorkerPool(ProbeBackend):
+    """Probe backend which dispatches probes to long-lived worker processes.
+
+    Usage:
+        with FFprobeWorkerPool(size=4) as pool:
+            video = FFprobeVideoContainer(path, backend=pool)
+            subtitles = video.get_subtitles()
+    """
+
+    name = "pool"
+
+    def __init__(
+        self,
+        size: int = 2,
+        backend: str = "ffprobe",
+        max_jobs: int = 500,
+        health_interval: float = 30,
+        acquire_timeout: float = None,
+        warmup: bool = True,
+    ):
+        """
+        :param size: number of worker processes (default: 2)
+        :param backend: name of the backend used by the workers (default: ffprobe)
+        :param max_jobs: recycle a worker after this number of probes (default: 500)
+        :param health_interval: ping workers idle for longer than this number of
+        seconds before using them (default: 30)
+        :param acquire_timeout: seconds to wait for a free worker. Callers block
+        indefinitely by default
+        :param warmup: start all the workers now instead of on first use
+        """
+        from . import container
+
+        if size < 1:
+            raise ValueError("The pool needs at least one worker")
+
+        self.size = size
+        self.max_jobs = max_jobs
+        self.health_interval = health_interval
+        self.acquire_timeout = acquire_timeout
+
+        ffprobe_path = shutil.which(container.FFPROBE_PATH) or container.FFPROBE_PATH
+        self._command = [
+            sys.executable,
+            "-m",
+            __name__,
+            "--backend",
+            backend,
+            "--ffprobe-path",
+            ffprobe_path,
+            "--log-level",
+            container.FF_LOG_LEVEL,
+        ]
+        self._idle = queue.Queue()
+        self._workers = set()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        for _ in range(size):
+            self._idle.put(self._spawn() if warmup else None)
+
+        if warmup:
+            self.health_check()
+
+    def probe(self, path, timeout=600):
+        worker = self._acquire()
+        try:
+            response = worker.request(
+                {"op": "probe", "path": path, "timeout": timeout},
+                # Leave some room for the worker to report the timeout itself
+                timeout=None if timeout is None else timeout + 5,
+            )
+        except WorkerPoolError as error:
+            self._release(worker, discard=True)
+            raise InvalidSource(
+                f"{error} trying to get information from {path}"
+            ) from error
+        except BaseException:
+            # The worker might be half-way through a response
+            self._release(worker, discard=True)
+            raise
+
+        worker.jobs += 1
+        self._release(worker)
+
+        if not response["ok"]:
+            raise InvalidSource(response["error"])
+
+        return response["data"]
+
+    def health_check(self):
+        "Pings every idle worker, replacing the unhealthy ones."
+        checked = []
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+
+            if worker is not None and not worker.ping():
+                logger.warning("Replacing unhealthy worker: %s", worker)
+                self._discard(worker)
+                worker = self._spawn()
+
+            checked.append(worker)
+
+        for worker in checked:
+            self._idle.put(worker)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            workers = list(self._workers)
+            self._workers.clear()
+
+        for worker in workers:
+            worker.kill()
+
+    def _acquire(self) -> _Worker:
+        if self._closed:
+            raise WorkerPoolError("The pool is closed")
+
+        try:
+            worker = self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise WorkerPoolError(
+                f"No free worker after {self.acquire_timeout} seconds"
+            ) from None
+
+        try:
+            if worker is None:
+                return self._spawn()
+
+            if not worker.alive:
+                self._discard(worker)
+                return self._spawn()
+
+            if time.monotonic() - worker.last_used > self.health_interval:
+                if not worker.ping():
+                    logger.warning("Replacing unhealthy worker: %s", worker)
+                    self._discard(worker)
+                    return self._spawn()
+        except BaseException:
+            self._idle.put(None)  # Keep the slot
+            raise
+
+        return worker
+
+    def _release(self, worker, discard=False):
+        if discard or worker.jobs >= self.max_jobs or self._closed:
+            logger.debug("Recycling worker: %s", worker)
+            self._discard(worker)
+            worker = None  # Respawned lazily
+
+        self._idle.put(worker)
+
+    def _spawn(self) -> _Worker:
+        worker = _Worker(self._command)
+        with self._lock:
+            self._workers.add(worker)
+
+        logger.debug("Spawned worker: %s", worker)
+        return worker
+
+    def _discard(self, worker):
+        with self._lock:
+            self._workers.discard(worker)
+
+        worker.kill()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __repr__(self) -> str:
+        return f"<FFprobeWorkerPool: {len(self._workers)}/{self.size} workers>"
+
+
+def _worker_main(argv=None):
+    from . import container
+
+    parser = argparse.ArgumentParser(prog="fese-worker")
+    parser.add_argument("--backend", default="ffprobe")
+    parser.add_argument("--ffprobe-path", default=container.FFPROBE_PATH)
+    parser.add_argument("--log-level", default=container.FF_LOG_LEVEL)
+    args = parser.parse_args(argv)
+
+    container.FFPROBE_PATH = args.ffprobe_path
+    container.FF_LOG_LEVEL = args.log_level
+    backend = get_backend(args.backend)
+
+    for line in sys.stdin:
+        request = json.loads(line)
+        if request["op"] == "ping":
+            response = {"ok": True, "pid": os.getpid()}
+        else:
+            try:
+                data = backend.probe(request["path"], timeout=request["timeout"])
+                response = {"ok": True, "data": data}
+            except InvalidSource as error:
+                response = {"ok": False, "error": str(error)}
+
+        sys.stdout.write(dumps(response).decode() + "\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    _worker_main()
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+# License: GPL
+
+"""Container-level probe results.
+
+A ProbeResult wraps the FFprobe-shaped dictionary returned by a backend. Views
+(format, subtitles, audio, video, attachments, chapters) are built on first
+access and kept, so a single probe serves every consumer.
+
+Usage:
+    video = FFprobeVideoContainer(path)
+    result = video.probe()
+    print(result.format.duration, [audio.language for audio in result.audio])
+    subtitles = video.get_subtitles()  # No extra probe
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+import logging
+
+from .exceptions import LanguageNotFound
+from .exceptions import UnsupportedCodec
+from .stream import FFprobeClosedCaptionStream
+from .stream import FFprobeSubtitleStream
+from .stream import is_captioned
+from .tags import _get_language
+from .tags import _safe_int
+from .tags import _safe_td
+
+logger = logging.getLogger(__name__)
+
+
+class FormatInfo:
+    "The format section of a probe."
+
+    def __init__(self, data: dict):
+        self.filename = data.get("filename")
+        self.format_name = data.get("format_name")
+        self.format_long_name = data.get("format_long_name")
+        self.nb_streams = _safe_int(data.get("nb_streams"), 0)
+        self.start_time = _seconds(data.get("start_time"))
+        self.duration = _seconds(data.get("duration"))
+        self.size = _safe_int(data.get("size"))
+        self.bit_rate = _safe_int(data.get("bit_rate"))
+        self.tags = dict(data.get("tags") or {})
+
+    def __repr__(self) -> str:
+        return f"<FormatInfo {self.format_name}: {self.duration}>"
+
+
+class MediaStream:
+    "A non-subtitle stream of a probe."
+
+    def __init__(self, stream: dict):
+        self.index = int(stream["index"])
+        self.codec_type = stream.get("codec_type")
+        self.codec_name = stream.get("codec_name")
+        self.start_time = _seconds(stream.get("start_time"))
+        self.bit_rate = _safe_int(stream.get("bit_rate"))
+        self.tags = dict(stream.get("tags") or {})
+        # Matroska stream durations are only tagged
+        self.duration = _seconds(stream.get("duration")) or _safe_td(
+            self.tags.get("DURATION")
+        )
+        self.disposition = dict(stream.get("disposition") or {})
+
+    @property
+    def language(self):
+        "The babelfish Language of the stream or None if it's not tagged."
+        try:
+            return _get_language(self.tags)
+        except LanguageNotFound:
+            return None
+
+    @property
+    def title(self):
+        return self.tags.get("title")
+
+    @property
+    def default(self) -> bool:
+        return bool(self.disposition.get("default"))
+
+    def __repr__(self) -> str:
+        return f"<{type(self).__name__} {self.index}: {self.codec_name}>"
+
+
+class AudioStream(MediaStream):
+    def __init__(self, stream: dict):
+        super().__init__(stream)
+        self.channels = _safe_int(stream.get("channels"))
+        self.channel_layout = stream.get("channel_layout")
+        self.sample_rate = _safe_int(stream.get("sample_rate"))
+
+
+class VideoStream(MediaStream):
+    def __init__(self, stream: dict):
+        super().__init__(stream)
+        self.width = _safe_int(stream.get("width"))
+        self.height = _safe_int(stream.get("height"))
+        self.r_frame_rate = stream.get("r_frame_rate")
+        self.avg_frame_rate = stream.get("avg_frame_rate")
+        self.closed_captions = is_captioned(stream)
+
+
+class Attachment(MediaStream):
+    "An attached file (usually a font of styled subtitles)."
+
+    @property
+    def filename(self):
+        return self.tags.get("filename")
+
+    @property
+    def mimetype(self):
+        return self.tags.get("mimetype")
+
+    def __repr__(self) -> str:
+        return f"<Attachment {self.index}: {self.filename} ({self.mimetype})>"
+
+
+class Chapter:
+    def __init__(self, data: dict):
+        self.id = data.get("id")
+        self.start = _seconds(data.get("start_time")) or timedelta(0)
+        self.end = _seconds(data.get("end_time")) or timedelta(0)
+        self.tags = dict(data.get("tags") or {})
+
+    @property
+    def title(self):
+        return self.tags.get("title")
+
+    def __repr__(self) -> str:
+        return f"<Chapter {self.title}: {self.start} - {self.end}>"
+
+
+_VIEWS = {"audio": AudioStream, "video": VideoStream, "attachment": Attachment}
+
+
+class ProbeResult:
+    """The result of probing a container.
+
+    Views are constructed lazily and memoized: repeated accesses return the
+    same objects.
+    """
+
+    def __init__(self, data: dict):
+        """
+        :param data: a dictionary shaped like FFprobe's JSON output
+        """
+        self.data = data
+        self._format = None
+        self._subtitles = None
+        self._views = {}
+        self._chapters = None
+
+    @property
+    def streams(self) -> list:
+        "The raw stream dictionaries."
+        return self.data.get("streams") or []
+
+    @property
+    def format(self) -> FormatInfo:
+        if self._format is None:
+            self._format = FormatInfo(self.data.get("format") or {})
+        return self._format
+
+    @property
+    def subtitles(self) -> list:
+        """The extractable subtitle streams, followed by the closed captions of
+        video streams. Streams without a valid language or with unsupported
+        codecs are ignored."""
+        if self._subtitles is None:
+            self._subtitles = []
+            for stream in self._streams_of("subtitle"):
+                try:
+                    self._subtitles.append(FFprobeSubtitleStream(stream))
+                except (LanguageNotFound, UnsupportedCodec) as error:
+                    logger.debug("Ignoring %s: %s", stream.get("codec_name"), error)
+
+            for stream in self._streams_of("video"):
+                if not is_captioned(stream):
+                    continue
+
+                try:
+                    self._subtitles.append(FFprobeClosedCaptionStream(stream))
+                except LanguageNotFound as error:
+                    logger.debug("Ignoring captions of %s: %s", stream["index"], error)
+
+        return self._subtitles
+
+    @property
+    def audio(self) -> list:
+        return self._view("audio")
+
+    @property
+    def video(self) -> list:
+        return self._view("video")
+
+    @property
+    def attachments(self) -> list:
+        return self._view("attachment")
+
+    @property
+    def chapters(self) -> list:
+        if self._chapters is None:
+            self._chapters = [Chapter(item) for item in self.data.get("chapters", [])]
+        return self._chapters
+
+    def _view(self, codec_type):
+        if codec_type not in self._views:
+            self._views[codec_type] = [
+                _VIEWS[codec_type](stream) for stream in self._streams_of(codec_type)
+            ]
+        return self._views[codec_type]
+
+    def _streams_of(self, codec_type):
+        return [
+            stream
+            for stream in self.streams
+            if stream.get("codec_type", "n/a") == codec_type
+        ]
+
+    def __repr__(self) -> str:
+        return f"<ProbeResult {self.format.format_name}: {len(self.streams)} streams>"
+
+
+def _seconds(value):
+    if value is None:
+        return None
+
+    try:
+        return timedelta(seconds=float(value))
+    except (TypeError, ValueError):
+        logger.debug("Invalid seconds value: %s", value)
+        return None
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# License: GPL
+
+from __future__ import annotations
+
+# Extraction modes
+CONVERT = "convert"
+COPY = "copy"
+FALLBACK = "fallback"  # Converted as the codec doesn't support copy
+
+# Skipped reasons
+SKIPPED_EXISTS = "exists"
+
+
+class ExtractionResult:
+    """The outcome of the extraction of a subtitle stream.
+
+    Results are path-like (os.fspath returns the output path). Statistics are
+    collected during the FFmpeg run: `cues` is the number of muxed packets of
+    text streams (None if unknown) and `elapsed` the seconds of the FFmpeg call
+    shared by every stream.
+    """
+
+    def __init__(
+        self, index: int, path: str, mode: str, skipped: str = None, text=True
+    ):
+        """
+        :param index: the stream index
+        :param path: the output path
+        :param mode: CONVERT, COPY or FALLBACK
+        :param skipped: the reason the stream wasn't extracted (e.g. SKIPPED_EXISTS)
+        :param text: if the output is text (packets are cues)
+        """
+        self.index = index
+        self.path = path
+        self.mode = mode
+        self.skipped = skipped
+        self.bytes = 0
+        self.cues = None
+        self.elapsed = None
+        self.error = None
+        self.text = text
+        self.fonts = None  # Font store paths (see fese.fonts)
+        self.validation = None  # A fese.validate.ValidationReport
+        self.encoding = None  # Source charset of transcoded text (see fese.charset)
+
+    @property
+    def ok(self) -> bool:
+        "True if the output was written."
+        return self.elapsed is not None and not self.skipped and self.error is None
+
+    def as_dict(self) -> dict:
+        return {
+            "path": self.path,
+            "ok": self.ok,
+            "mode": self.mode,
+            "bytes": self.bytes,
+            "cues": self.cues,
+            "elapsed": self.elapsed,
+            "skipped": self.skipped,
+            "error": None if self.error is None else str(self.error),
+            "fonts": self.fonts,
+            "encoding": self.encoding,
+            "validation": (
+                None if self.validation is None else self.validation.as_dict()
+            ),
+        }
+
+    def __fspath__(self) -> str:
+        return self.path
+
+    def __repr__(self) -> str:
+        if self.skipped:
+            status = f"skipped: {self.skipped}"
+        elif self.error is not None:
+            status = f"error: {self.error}"
+        else:
+            status = f"{self.bytes} bytes"
+        return f"<ExtractionResult {self.index} ({self.mode}) {self.path} [{status}]>"
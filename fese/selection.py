@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+# License: GPL
+
+"""Preference rules over subtitle streams.
+
+A selector is a list of rules in order of preference. It can be written in a
+compact form where rules are separated by "|" and terms by spaces:
+
+    selector = Selector.parse("en text !forced !hi | en hi | *")
+    subtitle = selector.first(video.get_subtitles())
+
+Terms: a language tag (e.g. "es", "es-MX") or "*", "text"/"bitmap", the flags
+"forced", "hi" and "default" (negated with "!"), "codec=NAME" and
+"frames>N"/"frames<N".
+
+Rules are compiled once and evaluated against compact stream records, which
+LibraryIndex also keeps for whole libraries."""
+
+from __future__ import annotations
+
+from collections import namedtuple
+import logging
+
+from babelfish import Language
+from babelfish.exceptions import LanguageError
+
+from .exceptions import InvalidRule
+
+logger = logging.getLogger(__name__)
+
+
+StreamRecord = namedtuple(
+    "StreamRecord",
+    (
+        "index",
+        "alpha3",
+        "country",
+        "hi",
+        "forced",
+        "default",
+        "type",
+        "codec_name",
+        "frames",
+    ),
+)
+
+
+def stream_record(subtitle) -> StreamRecord:
+    "Returns the compact record of a FFprobeSubtitleStream."
+    language = subtitle.language
+    language_kwargs = subtitle.disposition.language_kwargs()
+    return StreamRecord(
+        subtitle.index,
+        language.alpha3,
+        None if language.country is None else language.country.alpha2,
+        language_kwargs["hi"],
+        language_kwargs["forced"],
+        subtitle.disposition.default,
+        subtitle.type,
+        subtitle.codec_name,
+        subtitle.tags.frames,
+    )
+
+
+class Rule:
+    """A conjunction of conditions. None means "don't care".
+
+    :param language: a language tag (e.g. "en", "es-MX"). A tag without country
+    matches any country
+    """
+
+    def __init__(
+        self,
+        language: str = None,
+        hi: bool = None,
+        forced: bool = None,
+        default: bool = None,
+        type: str = None,
+        codec_name: str = None,
+        min_frames: int = None,
+        max_frames: int = None,
+    ):
+        self.language = language
+        self.alpha3 = self.country = None
+        if language is not None:
+            try:
+                lang = Language.fromietf(language)
+            except (LanguageError, ValueError) as error:
+                raise InvalidRule(f"Invalid language: {language}") from error
+
+            self.alpha3 = lang.alpha3
+            self.country = None if lang.country is None else lang.country.alpha2
+
+        self.hi = hi
+        self.forced = forced
+        self.default = default
+        self.type = type
+        self.codec_name = codec_name
+        self.min_frames = min_frames
+        self.max_frames = max_frames
+        self._checks = self._compile()
+
+    def _compile(self):
+        # (record field position, expected value) pairs
+        return tuple(
+            (StreamRecord._fields.index(field), value)
+            for field, value in (
+                ("alpha3", self.alpha3),
+                ("country", self.country),
+                ("type", self.type),
+                ("codec_name", self.codec_name),
+                ("hi", self.hi),
+                ("forced", self.forced),
+                ("default", self.default),
+            )
+            if value is not None
+        )
+
+    def matches(self, record: StreamRecord) -> bool:
+        for position, value in self._checks:
+            if record[position] != value:
+                return False
+
+        if self.min_frames is not None and record.frames < self.min_frames:
+            return False
+
+        if self.max_frames is not None and record.frames > self.max_frames:
+            return False
+
+        return True
+
+    @classmethod
+    def parse(cls, text: str) -> "Rule":
+        ":raises: InvalidRule"
+        kwargs = {}
+        for term in text.split():
+            negated = term.startswith("!")
+            name = term.lstrip("!")
+            if name == "*":
+                continue
+            elif name in ("forced", "hi", "default"):
+                kwargs[name] = not negated
+            elif name in ("text", "bitmap"):
+                kwargs["type"] = name
+            elif name.startswith("codec="):
+                kwargs["codec_name"] = name.split("=", 1)[1]
+            elif name.startswith(("frames>", "frames<")):
+                try:
+                    value = int(name[7:])
+                except ValueError as error:
+                    raise InvalidRule(f"Invalid term: {term}") from error
+                if name[6] == ">":
+                    kwargs["min_frames"] = value + 1
+                else:
+                    kwargs["max_frames"] = value - 1
+            elif not negated and "language" not in kwargs:
+                kwargs["language"] = name
+            else:
+                raise InvalidRule(f"Invalid term: {term}")
+
+        return cls(**kwargs)
+
+    def __repr__(self) -> str:
+        conditions = ", ".join(
+            f"{key}={val}"
+            for key, val in vars(self).items()
+            if val is not None and not key.startswith("_") and key != "alpha3"
+        )
+        return f"<Rule {conditions or '*'}>"
+
+
+class Selector:
+    """Rules in order of preference."""
+
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+
+    @classmethod
+    def parse(cls, text: str) -> "Selector":
+        ":raises: InvalidRule"
+        return cls(Rule.parse(item) for item in text.split("|"))
+
+    def first(self, subtitles):
+        "Returns the stream matching the most preferred rule, or None."
+        records = [(stream_record(sub), sub) for sub in subtitles]
+        for rule in self.rules:
+            for record, subtitle in records:
+                if rule.matches(record):
+                    return subtitle
+
+        return None
+
+    def select(self, subtitles):
+        "Returns all the matching streams sorted by preference."
+        records = [(stream_record(sub), sub) for sub in subtitles]
+        selected, seen = [], set()
+        for rule in self.rules:
+            for record, subtitle in records:
+                if record.index not in seen and rule.matches(record):
+                    seen.add(record.index)
+                    selected.append(subtitle)
+
+        return selected
+
+    def __repr__(self) -> str:
+        return f"<Selector {self.rules}>"
+
+
+class LibraryIndex:
+    """Compact records and inverted indexes of a library's probe results.
+
+    Usage:
+        index = LibraryIndex()
+        index.add(path, video.get_subtitles())
+        index.missing(Rule("es-MX"))
+    """
+
+    def __init__(self):
+        self._records = {}
+        self._index = {}
+
+    def add(self, path: str, subtitles):
+        "Adds (or replaces) the streams of a media file."
+        self.remove(path)
+        records = tuple(stream_record(sub) for sub in subtitles)
+        self._records[path] = records
+        for key in {key for record in records for key in _index_keys(record)}:
+            self._index.setdefault(key, set()).add(path)
+
+    def remove(self, path: str):
+        records = self._records.pop(path, ())
+        for key in {key for record in records for key in _index_keys(record)}:
+            paths = self._index[key]
+            paths.discard(path)
+            if not paths:
+                del self._index[key]
+
+    def records(self, path: str):
+        return self._records[path]
+
+    def matching(self, rule: Rule) -> set:
+        "Returns the paths with at least one stream matching the rule."
+        candidates = None
+        for key in _rule_keys(rule):
+            paths = self._index.get(key, set())
+            candidates = paths if candidates is None else candidates & paths
+            if not candidates:
+                return set()
+
+        if candidates is None:
+            candidates = self._records.keys()
+
+        # The indexes are per file, so conditions are verified per stream
+        return {
+            path
+            for path in candidates
+            if any(rule.matches(record) for record in self._records[path])
+        }
+
+    def missing(self, rule: Rule) -> set:
+        "Returns the paths without any stream matching the rule."
+        return set(self._records) - self.matching(rule)
+
+    def select(self, selector: Selector) -> dict:
+        "Returns the most preferred stream index by path (None if no match)."
+        selected = {}
+        for path, records in self._records.items():
+            selected[path] = None
+            for rule in selector.rules:
+                match = next((rec for rec in records if rule.matches(rec)), None)
+                if match is not None:
+                    selected[path] = match.index
+                    break
+
+        return selected
+
+    def __len__(self):
+        return len(self._records)
+
+    def __repr__(self) -> str:
+        return f"<LibraryIndex: {len(self)} files>"
+
+
+def _index_keys(record):
+    yield "alpha3", record.alpha3
+    yield "country", record.country
+    yield "type", record.type
+    yield "codec_name", record.codec_name
+    for flag in ("hi", "forced", "default"):
+        yield flag, getattr(record, flag)
+
+
+def _rule_keys(rule):
+    for key in ("alpha3", "country", "type", "codec_name", "hi", "forced", "default"):
+        value = getattr(rule, key)
+        if value is not None:
+            yield key, value
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+# License: GPL
+
+"""Media sources other than local paths.
+
+URLs are passed to FFmpeg as they are: its protocols read remote files with
+range requests, so probing and seeking don't download whole files. File objects
+(e.g. sys.stdin.buffer) are piped to FFmpeg. Only their head is buffered, so
+the probe can read the container header and the extraction still streams the
+whole file once."""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+from urllib.parse import unquote
+from urllib.parse import urlparse
+
+from .exceptions import InvalidSource
+
+logger = logging.getLogger(__name__)
+
+# Bytes read by FFprobe from remote sources (FFmpeg's default is 5000000)
+REMOTE_PROBESIZE = 2 * 1024 * 1024
+
+# Bytes of file objects buffered for probing. Containers must have their
+# stream headers there (e.g. MP4 files need the moov atom at the start)
+FILE_HEAD_SIZE = 8 * 1024 * 1024
+
+CHUNK_SIZE = 1024 * 1024
+
+_URL_RE = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.\-]*://")
+
+
+def is_url(path) -> bool:
+    return isinstance(path, str) and _URL_RE.match(path) is not None
+
+
+def is_file_object(source) -> bool:
+    return hasattr(source, "read") and not isinstance(source, (str, bytes))
+
+
+def source_name(source) -> str:
+    """Returns the file name of a source, used to name the outputs. Falls back
+    to "stdin" for anonymous file objects."""
+    if is_file_object(source):
+        name = getattr(source, "name", None)
+        if isinstance(name, str) and not name.startswith("<"):
+            return os.path.basename(name)
+        return "stdin"
+
+    if is_url(source):
+        return os.path.basename(unquote(urlparse(source).path)) or "stream"
+
+    return os.path.basename(source)
+
+
+class FileInput:
+    """A file object read by FFmpeg through a pipe.
+
+    Seekable files are rewound for every read. Non-seekable streams (pipes,
+    sockets) can be probed and then streamed once: the head is kept in memory
+    and replayed before the rest of the stream.
+    """
+
+    def __init__(self, file, head_size: int = None):
+        self.file = file
+        self.head_size = head_size or FILE_HEAD_SIZE
+        self._head = None
+        self._consumed = False
+
+    @property
+    def seekable(self) -> bool:
+        try:
+            return self.file.seekable()
+        except (AttributeError, OSError, ValueError):
+            return False
+
+    def head(self) -> bytes:
+        "Returns the first bytes of the file (the probe region)."
+        if self.seekable:
+            self.file.seek(0)
+            return self.file.read(self.head_size)
+
+        if self._head is None:
+            if self._consumed:
+                raise InvalidSource("The stream was already consumed")
+            self._head = self.file.read(self.head_size)
+
+        return self._head
+
+    def chunks(self):
+        """Returns an iterator over the whole file.
+
+        :raises: InvalidSource"""
+        if self.seekable:
+            self.file.seek(0)
+            return self._read()
+
+        if self._consumed:
+            raise InvalidSource("The stream was already consumed")
+
+        self._consumed = True
+        head, self._head = self._head, None
+        return self._read(head)
+
+    def _read(self, head=None):
+        if head:
+            yield head
+
+        while True:
+            chunk = self.file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+    def __repr__(self) -> str:
+        return f"<FileInput {source_name(self.file)}>"
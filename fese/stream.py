@@ -2,17 +2,43 @@
 
 from __future__ import annotations
 
+from collections import namedtuple
 from datetime import timedelta
+import functools
 import logging
+import re
+import threading
+from types import MappingProxyType
 
 from babelfish import Language
 
 from .disposition import FFprobeSubtitleDisposition
 from .exceptions import UnsupportedCodec
+from .instrument import span
+from .tags import _safe_int
+from .tags import _safe_td
 from .tags import FFprobeGenericSubtitleTags
 
 logger = logging.getLogger(__name__)
 
+# Capabilities of a subtitle codec. `copy_format` and `convert_default_format`
+# are FFmpeg muxer names
+Codec = namedtuple(
+    "Codec",
+    ("name", "type", "copy", "copy_format", "convert", "convert_default_format"),
+)
+
+_CODEC_TYPES = ("text", "bitmap")
+
+# Language of closed captions carried by untagged video streams
+CAPTION_LANGUAGE = "en"
+
+# Decoder threads of the video carrying closed captions
+CAPTION_DECODE_THREADS = 1
+
+# Index of the captions in the outputs of the lavfi movie source
+_CAPTION_OUTPUT_INDEX = 1
+
 
 class FFprobeSubtitleStream:
     """Base class for FFprobe (FFmpeg) extractable subtitle streams."""
@@ -21,6 +47,10 @@ class FFprobeSubtitleStream:
         """
         :raises: LanguageNotFound, UnsupportedCodec
         """
+        with span("stream.init"):
+            self._init(stream)
+
+    def _init(self, stream):
         self.index = int(stream["index"])
         self.codec_name = stream.get("codec_name", "Unknown")
 
@@ -36,51 +66,67 @@ class FFprobeSubtitleStream:
         self.duration_ts = timedelta(milliseconds=int(stream.get("duration_ts", 0)))
         self.duration = timedelta(seconds=float(stream.get("duration", 0)))
 
-        self.tags = FFprobeGenericSubtitleTags.detect_cls_from_data(
-            stream.get("tags", {})
-        )
-        self.disposition = FFprobeSubtitleDisposition(stream.get("disposition", {}))
+        with span("stream.tags"):
+            self.tags = FFprobeGenericSubtitleTags.detect_cls_from_data(
+                stream.get("tags", {})
+            )
 
-        self.disposition.update_from_tags(stream.get("tags", {}) or {})
+        with span("stream.disposition"):
+            self.disposition = FFprobeSubtitleDisposition(stream.get("disposition", {}))
+            self.disposition.update_from_tags(stream.get("tags", {}) or {})
 
-    def convert_args(self, convert_format, outfile):
+    def convert_args(self, convert_format, outfile, extra_args=(), input_index=0):
         """
         convert_format: Union[str, None] = the codec format to convert. if None is set, defaults
         to 'convert_default_format' codec's key
         outfile: str = output file
+        extra_args: Sequence[str] = output options placed before the output file
+        input_index: int = index of the FFmpeg input to map the stream from
 
         raises UnsupportedCodec if convert_format doesn't exist or if the codec doesn't
         support conversion
         """
-        convert_format = convert_format or self._codec["convert_default_format"]
+        convert_format = convert_format or self._codec.convert_default_format
 
-        if convert_format is None or not any(
-            convert_format == item["copy_format"] for item in _codecs.values()
-        ):
+        if convert_format not in _formats:
             raise UnsupportedCodec(f"Unknown convert format: {convert_format}")
 
-        if not self._codec["convert"]:
+        if not self._codec.convert:
             raise UnsupportedCodec(
                 f"{self.codec_name} codec doesn't support conversion"
             )
 
-        return ["-map", f"0:{self.index}", "-f", convert_format, outfile]
+        return [
+            *_convert_template(input_index, self.map_index, convert_format),
+            *extra_args,
+            outfile,
+        ]
 
-    def copy_args(self, outfile):
+    def copy_args(self, outfile, extra_args=(), input_index=0):
         "raises UnsupportedCodec if the codec doesn't support copy"
-        if not self._codec["copy"] or not self._codec["copy_format"]:
+        if not self._codec.copy or not self._codec.copy_format:
             raise UnsupportedCodec(f"{self.codec_name} doesn't support copy")
 
         return [
-            "-map",
-            f"0:{self.index}",
-            "-c:s",
-            "copy",
-            "-f",
-            self._codec["copy_format"],
+            *_copy_template(input_index, self.map_index, self._codec.copy_format),
+            *extra_args,
             outfile,
         ]
 
+    def input_args(self, path, start=None):
+        """Returns the FFmpeg input arguments the stream is read from.
+
+        :param path: the media source
+        :param start: seconds where the extraction starts. Seeking is done by
+        the container, except for inputs which seek by themselves
+        """
+        return ["-i", path]
+
+    @property
+    def map_index(self):
+        "The index of the stream in its FFmpeg input."
+        return self.index
+
     @property
     def language(self):
         # Legacy
@@ -92,15 +138,15 @@ class FFprobeSubtitleStream:
 
     @property
     def extension(self):
-        return self._codec["copy_format"] or self._codec["convert_default_format"] or ""
+        return self._codec.copy_format or self._codec.convert_default_format or ""
 
     @property
     def convert_default_format(self):
-        return self._codec["convert_default_format"]
+        return self._codec.convert_default_format
 
     @property
     def type(self):
-        return self._codec["type"]
+        return self._codec.type
 
     @property
     def suffix(self):
@@ -114,54 +160,218 @@ class FFprobeSubtitleStream:
         return f"<{self.codec_name.upper()}: {self.tags}@{self.disposition}>"
 
 
-_codecs = {
-    "ass": {
-        "type": "text",
-        "copy": True,
-        "copy_format": "ass",
-        "convert": True,
-        "convert_default_format": "srt",
-    },
-    "subrip": {
-        "type": "text",
-        "copy": True,
-        "copy_format": "srt",
-        "convert": True,
-        "convert_default_format": "srt",
-    },
-    "webvtt": {
-        "type": "text",
-        "copy": True,
-        "copy_format": "webvtt",
-        "convert": True,
-        "convert_default_format": "srt",
-    },
-    "mov_text": {
-        "type": "text",
-        "copy": False,
-        "copy_format": None,
-        "convert": True,
-        "convert_default_format": "srt",
-    },
-    "hdmv_pgs_subtitle": {
-        "type": "bitmap",
-        "copy": True,
-        "copy_format": "sup",
-        "convert": False,
-        "convert_default_format": None,
-    },
-    "dvb_subtitle": {
-        "type": "bitmap",
-        "copy": True,
-        "copy_format": "sup",
-        "convert": False,
-        "convert_default_format": None,
-    },
-    "dvd_subtitle": {
-        "type": "bitmap",
-        "copy": True,
-        "copy_format": "sup",
-        "convert": False,
-        "convert_default_format": None,
-    },
-}
+class FFprobeClosedCaptionStream(FFprobeSubtitleStream):
+    """CEA-608/708 closed captions carried in a video stream (ATSC A/53 side
+    data), detected from FFprobe's `closed_captions` flag.
+
+    Captions are decoded from the video frames through the lavfi movie source,
+    so only the carrying video stream is decoded. Their index is the index of
+    the video stream.
+    """
+
+    def __init__(self, video_stream: dict):
+        """
+        :param video_stream: the FFprobe dictionary of the video stream
+        :raises: LanguageNotFound
+        """
+        tags = video_stream.get("tags") or {}
+        language = tags.get("language")
+        if not language or language == "und":
+            language = CAPTION_LANGUAGE
+
+        duration = video_stream.get("duration")
+        if duration is None:
+            # Matroska stream durations are only tagged
+            duration = _safe_td(tags.get("DURATION"), timedelta(0)).total_seconds()
+
+        super().__init__(
+            {
+                "index": video_stream["index"],
+                "codec_name": "eia_608",
+                "codec_type": "subtitle",
+                "start_time": video_stream.get("start_time", 0),
+                "duration": duration,
+                "tags": {"language": language},
+            }
+        )
+
+    def input_args(self, path, start=None):
+        """The movie source seeks the media file itself (FFmpeg can't seek lavfi
+        inputs), so frames before the start aren't decoded.
+
+        raises UnsupportedCodec for piped sources"""
+        if path.startswith("pipe:"):
+            raise UnsupportedCodec("Closed captions can't be read from pipes")
+
+        source = f"movie={_graph_escape(path)}:si={self.index}"
+        if start:
+            source = f"{source}:sp={start:.3f}"
+
+        source = f"{source}:dec_threads={CAPTION_DECODE_THREADS}[out0+subcc]"
+        return ["-f", "lavfi", "-i", source]
+
+    @property
+    def map_index(self):
+        return _CAPTION_OUTPUT_INDEX
+
+    @property
+    def suffix(self):
+        return ".".join(item for item in (self.tags.suffix, "cc") if item)
+
+
+def is_captioned(stream: dict) -> bool:
+    "Returns True if an FFprobe video stream dictionary carries closed captions."
+    return stream.get("codec_type") == "video" and bool(
+        _safe_int(stream.get("closed_captions"), 0)
+    )
+
+
+def register_codec(
+    name: str,
+    type: str,
+    copy: bool = False,
+    copy_format: str = None,
+    convert: bool = False,
+    convert_default_format: str = None,
+) -> Codec:
+    """Registers (or replaces) a subtitle codec, e.g. for new FFmpeg decoders.
+
+    The table is replaced as a whole, so concurrent readers never see a partial
+    update. Streams constructed before keep the capabilities they were created
+    with.
+
+    Usage:
+        register_codec("arib_caption", "text", convert=True, convert_default_format="srt")
+
+    :param name: FFmpeg codec name (codec_name in FFprobe's output)
+    :param type: "text" or "bitmap"
+    :param copy: if the codec can be copied
+    :param copy_format: muxer used to copy the codec
+    :param convert: if the codec can be converted
+    :param convert_default_format: muxer used to convert the codec by default
+    :raises: ValueError
+    """
+    if type not in _CODEC_TYPES:
+        raise ValueError(f"Invalid codec type: {type}")
+
+    if copy and not copy_format:
+        raise ValueError("Copyable codecs need a copy format")
+
+    if convert and not convert_default_format:
+        raise ValueError("Convertible codecs need a default convert format")
+
+    codec = Codec(name, type, copy, copy_format, convert, convert_default_format)
+
+    global _codecs, _formats
+    with _registry_lock:
+        table = dict(_codecs)
+        table[name] = codec
+        _codecs, _formats = _compile(table)
+
+    logger.debug("Registered codec: %s", codec)
+    return codec
+
+
+def codecs():
+    "Returns the (read-only) table of supported codecs by name."
+    return _codecs
+
+
+def _compile(table):
+    codecs_ = MappingProxyType(table)
+    # Valid convert formats: every muxer known by the table
+    formats = frozenset(
+        fmt
+        for codec in table.values()
+        for fmt in (codec.copy_format, codec.convert_default_format)
+        if fmt
+    )
+    return codecs_, formats
+
+
+def _graph_escape(value):
+    # Option value escaping of the filter graph, then of the graph description
+    value = re.sub(r"([\\':])", r"\\\1", value)
+    return re.sub(r"([\\'\[\],;])", r"\\\1", value)
+
+
+@functools.lru_cache(maxsize=1024)
+def _convert_template(input_index, index, convert_format):
+    return ("-map", f"{input_index}:{index}", "-f", convert_format)
+
+
+@functools.lru_cache(maxsize=1024)
+def _copy_template(input_index, index, copy_format):
+    return ("-map", f"{input_index}:{index}", "-c:s", "copy", "-f", copy_format)
+
+
+_registry_lock = threading.Lock()
+
+_codecs, _formats = _compile(
+    {
+        "ass": Codec(
+            "ass",
+            type="text",
+            copy=True,
+            copy_format="ass",
+            convert=True,
+            convert_default_format="srt",
+        ),
+        "subrip": Codec(
+            "subrip",
+            type="text",
+            copy=True,
+            copy_format="srt",
+            convert=True,
+            convert_default_format="srt",
+        ),
+        "webvtt": Codec(
+            "webvtt",
+            type="text",
+            copy=True,
+            copy_format="webvtt",
+            convert=True,
+            convert_default_format="srt",
+        ),
+        "mov_text": Codec(
+            "mov_text",
+            type="text",
+            copy=False,
+            copy_format=None,
+            convert=True,
+            convert_default_format="srt",
+        ),
+        "eia_608": Codec(
+            "eia_608",
+            type="text",
+            copy=False,
+            copy_format=None,
+            convert=True,
+            convert_default_format="srt",
+        ),
+        "hdmv_pgs_subtitle": Codec(
+            "hdmv_pgs_subtitle",
+            type="bitmap",
+            copy=True,
+            copy_format="sup",
+            convert=False,
+            convert_default_format=None,
+        ),
+        "dvb_subtitle": Codec(
+            "dvb_subtitle",
+            type="bitmap",
+            copy=True,
+            copy_format="sup",
+            convert=False,
+            convert_default_format=None,
+        ),
+        "dvd_subtitle": Codec(
+            "dvd_subtitle",
+            type="bitmap",
+            copy=True,
+            copy_format="sup",
+            convert=False,
+            convert_default_format=None,
+        ),
+    }
+)
@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+# License: GPL
+
+"""Synchronization analysis of subtitles against the audio of a container.
+
+The audio is decoded by one FFmpeg call to low-rate mono PCM read from a pipe.
+Speech is detected with an energy voice activity detector (VAD) and the result
+is cross-correlated (FFT) with the on/off signal of the cues, one segment of
+audio at a time, so memory doesn't grow with the duration of the file:
+
+    estimate = estimate_offset(video, "movie.en.srt")
+    estimate.offset, estimate.drift, estimate.confidence
+
+The offset can be passed as `shift` to extract_subtitles. Requires NumPy
+(`pip install fese[sync]`)."""
+
+from __future__ import annotations
+
+from collections import namedtuple
+import logging
+import os
+import subprocess
+
+try:
+    import numpy
+except ImportError:  # Optional dependency
+    numpy = None
+
+import pysubs2
+
+from .exceptions import ExtractionError
+from .instrument import span
+from .timing import _seconds
+
+logger = logging.getLogger(__name__)
+
+# Sample rate of the decoded audio
+SAMPLE_RATE = 8000
+
+# Seconds of every activity frame (the resolution of the estimates)
+RESOLUTION = 0.01
+
+# Seconds of audio analyzed at a time
+SEGMENT_SECONDS = 120
+
+# Maximum offset searched, in seconds (either direction)
+MAX_OFFSET = 60
+
+# Frames louder than the noise floor (this percentile of every segment) by
+# VAD_THRESHOLD decibels are voiced. Frames under SILENCE_DB never are
+NOISE_PERCENTILE = 20
+VAD_THRESHOLD = 10
+SILENCE_DB = 30
+
+# Unvoiced gaps up to these seconds are filled, so pauses between words aren't
+# taken as silence
+MAX_GAP = 0.3
+
+# Minimum confidence of the segments used to estimate the drift
+MIN_CONFIDENCE = 0.2
+
+# Band of the human voice, applied by FFmpeg
+_AUDIO_FILTER = (
+    f"aresample={SAMPLE_RATE}:async=1:first_pts=0,highpass=f=200,lowpass=f=3400"
+)
+
+Segment = namedtuple("Segment", ("time", "offset", "confidence"))
+
+SyncEstimate = namedtuple("SyncEstimate", ("offset", "drift", "confidence", "segments"))
+SyncEstimate.__doc__ = """The result of estimate_offset.
+
+offset: seconds to add to the cues to align them with the speech (None if the
+audio or the cues don't have enough variation). drift: change of the offset
+per second of media, estimated from the segments with MIN_CONFIDENCE (None if
+there are less than two). confidence: the normalized correlation of the
+offset, from 0 to 1. segments: the Segment estimates of every analyzed part."""
+
+
+def voice_activity(samples, sample_rate: int = SAMPLE_RATE):
+    """Returns a boolean array of the voiced frames (RESOLUTION seconds each) of
+    mono PCM samples.
+
+    :param samples: a NumPy array of 16-bit samples
+    :param sample_rate: sample rate of the samples"""
+    size = max(1, int(sample_rate * RESOLUTION))
+    count = len(samples) // size
+    if not count:
+        return numpy.zeros(0, dtype=bool)
+
+    frames = samples[: count * size].reshape(count, size).astype(numpy.float32)
+    energy = 10 * numpy.log10(numpy.mean(frames**2, axis=1) + 1.0)
+    floor = numpy.percentile(energy, NOISE_PERCENTILE)
+    voiced = energy > max(floor + VAD_THRESHOLD, SILENCE_DB)
+
+    gap = int(round(MAX_GAP / RESOLUTION))
+    if gap:
+        # Closing: a dilation and an erosion fill the gaps without moving edges
+        kernel = numpy.ones(gap + 1)
+        dilated = numpy.convolve(voiced, kernel, "full")[:count] > 0
+        voiced = numpy.convolve(~dilated, kernel, "full")[gap : gap + count] == 0
+
+    return voiced
+
+
+def cue_activity(starts, ends, start, length: int):
+    """Returns a boolean array of the frames (RESOLUTION seconds each) covered by
+    cues.
+
+    :param starts: NumPy array of the start of every cue in seconds
+    :param ends: NumPy array of the end of every cue in seconds
+    :param start: seconds of the first frame
+    :param length: number of frames"""
+    first = numpy.floor((starts - start) / RESOLUTION).astype(numpy.int64)
+    last = numpy.ceil((ends - start) / RESOLUTION).astype(numpy.int64)
+    inside = (last > 0) & (first < length) & (last > first)
+
+    changes = numpy.zeros(length + 1, dtype=numpy.int64)
+    numpy.add.at(changes, numpy.clip(first[inside], 0, length), 1)
+    numpy.add.at(changes, numpy.clip(last[inside], 0, length), -1)
+    return numpy.cumsum(changes[:-1]) > 0
+
+
+def load_cues(subtitles):
+    """Returns the (starts, ends) NumPy arrays in seconds of the dialogue cues
+    of a subtitle file.
+
+    :param subtitles: a path (e.g. an ExtractionResult) or a pysubs2.SSAFile
+    :raises: OSError, ValueError"""
+    if not isinstance(subtitles, pysubs2.SSAFile):
+        try:
+            subtitles = pysubs2.load(os.fspath(subtitles), encoding="utf-8")
+        except pysubs2.Pysubs2Error as error:
+            raise ValueError(f"Invalid subtitles: {error}") from error
+
+    times = [
+        (event.start, event.end)
+        for event in subtitles.events
+        if not event.is_comment and event.end > event.start
+    ]
+    times = numpy.array(times, dtype=numpy.float64).reshape(-1, 2) / 1000
+    return times[:, 0], times[:, 1]
+
+
+class OffsetEstimator:
+    """Cross-correlates voice activity with the activity of cues, one segment
+    at a time.
+
+    Usage:
+        estimator = OffsetEstimator(*load_cues(path))
+        for start, activity in segments:
+            estimator.add(activity, start)
+        estimator.result()
+    """
+
+    def __init__(self, starts, ends, max_offset=None):
+        """
+        :param starts: NumPy array of the start of every cue in seconds
+        :param ends: NumPy array of the end of every cue in seconds
+        :param max_offset: maximum offset searched in seconds (or timedelta).
+        Defaults to `MAX_OFFSET`
+        """
+        self.starts = starts
+        self.ends = ends
+        self.max_offset = _seconds(MAX_OFFSET if max_offset is None else max_offset)
+        self.segments = []
+        self._lags = int(round(self.max_offset / RESOLUTION))
+        # Sums of every segment (global correlation)
+        self._products = numpy.zeros(2 * self._lags + 1)
+        self._cue_power = numpy.zeros(2 * self._lags + 1)
+        self._voice_power = 0.0
+
+    def add(self, activity, start=0):
+        """Correlates the voice activity of a segment.
+
+        :param activity: boolean NumPy array of voiced frames (see voice_activity)
+        :param start: seconds of the first frame
+        :returns: the Segment or None if it can't be estimated"""
+        length = len(activity)
+        if not length:
+            return None
+
+        voice = activity.astype(numpy.float64)
+        voice -= voice.mean()
+        voice_power = float(voice @ voice)
+
+        cues = cue_activity(
+            self.starts,
+            self.ends,
+            start - self._lags * RESOLUTION,
+            length + 2 * self._lags,
+        ).astype(numpy.float64)
+        products = _correlate(voice, cues)
+
+        # Power of the cues under every lag, without their mean
+        sums = numpy.concatenate(([0.0], numpy.cumsum(cues)))
+        window = sums[length:] - sums[:-length]
+        cue_power = window - window**2 / length  # The cues are 0 or 1
+
+        self._products += products
+        self._cue_power += cue_power
+        self._voice_power += voice_power
+
+        lag, confidence = _peak(products, cue_power, voice_power)
+        if lag is None:
+            return None
+
+        segment = Segment(
+            start + length * RESOLUTION / 2,
+            round((self._lags - lag) * RESOLUTION, 3),
+            confidence,
+        )
+        logger.debug("Segment estimate: %s", segment)
+        self.segments.append(segment)
+        return segment
+
+    def result(self) -> SyncEstimate:
+        lag, confidence = _peak(self._products, self._cue_power, self._voice_power)
+        offset = None if lag is None else round((self._lags - lag) * RESOLUTION, 3)
+
+        reliable = [item for item in self.segments if item.confidence >= MIN_CONFIDENCE]
+        drift = None
+        if len({item.time for item in reliable}) > 1:
+            times, offsets, weights = numpy.array(reliable).T
+            drift = float(numpy.polyfit(times, offsets, 1, w=weights)[0])
+
+        return SyncEstimate(offset, drift, confidence, list(self.segments))
+
+
+def estimate_offset(
+    video,
+    subtitles,
+    audio: int = None,
+    max_offset=None,
+    timeout: int = 3600,
+    cancel=None,
+) -> SyncEstimate:
+    """Estimates the offset and drift of subtitles against the speech of a
+    container. The audio is read in SEGMENT_SECONDS parts.
+
+    :param video: a FFprobeVideoContainer
+    :param subtitles: a subtitle file path (e.g. an ExtractionResult) or a
+    pysubs2.SSAFile
+    :param audio: index of the audio stream. Defaults to the default audio
+    stream (or the first one)
+    :param max_offset: maximum offset searched in seconds (or timedelta).
+    Defaults to `MAX_OFFSET`
+    :param timeout: subprocess timeout in seconds (default: 3600)
+    :param cancel: a CancellationToken to abort the analysis
+    :raises: ImportError, InvalidSource, ExtractionError, OSError, ValueError
+    """
+    if numpy is None:
+        raise ImportError("NumPy is required: pip install fese[sync]")
+
+    if audio is None:
+        audio = _default_audio(video)
+
+    estimator = OffsetEstimator(*load_cues(subtitles), max_offset=max_offset)
+    with span("sync", path=video.path):
+        _analyze_audio(video, audio, estimator, timeout, cancel)
+
+    estimate = estimator.result()
+    logger.debug("Estimated synchronization of %s: %s", subtitles, estimate)
+    return estimate
+
+
+def _default_audio(video):
+    streams = video.probe().audio
+    if not streams:
+        raise ValueError(f"{video.name} doesn't have audio streams")
+
+    return next((item for item in streams if item.default), streams[0]).index
+
+
+def _analyze_audio(video, index, estimator, timeout, cancel):
+    "Decodes an audio stream and adds its voice activity to the estimator."
+    from . import container
+
+    pipe = container._OutputPipe(None, _AudioAnalyzer(estimator))
+    command = [
+        container.FFMPEG_PATH,
+        "-v",
+        container.FF_LOG_LEVEL,
+        "-nostdin",
+        "-i",
+        video.path,
+        "-map",
+        f"0:{index}",
+        "-vn",
+        "-sn",
+        "-dn",
+        "-ac",
+        "1",
+        "-af",
+        _AUDIO_FILTER,
+        "-f",
+        "s16le",
+        "-acodec",
+        "pcm_s16le",
+        pipe.arg,
+    ]
+    logger.debug("Decoding audio with command %s", " ".join(command))
+    try:
+        try:
+            container._ffmpeg_call(
+                command,
+                timeout=timeout,
+                policy=video.policy,
+                cancel=cancel,
+                input_chunks=None if video.input is None else video.input.chunks(),
+                pass_fds=(pipe.write_fd,),
+            )
+        finally:
+            pipe.close()
+    except subprocess.SubprocessError as error:
+        raise ExtractionError(
+            f"Error decoding the audio of {video.path}: {error}"
+        ) from error
+
+    pipe.raise_error()
+
+
+class _AudioAnalyzer:
+    """An output filter of the decoded audio. The voice activity of every
+    SEGMENT_SECONDS of PCM is added to an OffsetEstimator."""
+
+    def __init__(self, estimator):
+        self.estimator = estimator
+        self._size = int(SEGMENT_SECONDS * SAMPLE_RATE) * 2
+        self._buffer = bytearray()
+        self._position = 0  # Samples analyzed
+
+    def feed(self, chunk):
+        self._buffer += chunk
+        while len(self._buffer) >= self._size:
+            self._add(self._buffer[: self._size])
+            del self._buffer[: self._size]
+
+        return b""
+
+    def finish(self):
+        self._add(self._buffer[: len(self._buffer) // 2 * 2])
+        self._buffer.clear()
+        return b""
+
+    def _add(self, data):
+        if not data:
+            return
+
+        samples = numpy.frombuffer(bytes(data), "<i2")
+        self.estimator.add(voice_activity(samples), self._position / SAMPLE_RATE)
+        self._position += len(samples)
+
+
+def _correlate(voice, cues):
+    "Returns the products of `voice` with every window of `cues`."
+    size = len(voice) + len(cues) - 1
+    size = 1 << (size - 1).bit_length()
+    spectrum = numpy.fft.rfft(cues, size) * numpy.conj(numpy.fft.rfft(voice, size))
+    return numpy.fft.irfft(spectrum, size)[: len(cues) - len(voice) + 1]
+
+
+def _peak(products, cue_power, voice_power):
+    "Returns the (lag, confidence) of the best normalized correlation."
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        scores = products / numpy.sqrt(cue_power * voice_power)
+
+    scores[~numpy.isfinite(scores) | (cue_power < 1e-6)] = -1
+    lag = int(numpy.argmax(scores))
+    if scores[lag] <= 0:
+        return None, 0.0
+
+    return lag, round(min(float(scores[lag]), 1.0), 3)
@@ -16,6 +16,8 @@ class FFprobeGenericSubtitleTags:
 
     def __init__(self, data: dict):
         self._language_fallback = False
+        # Set by fese.langid.verify_languages
+        self.language_confidence = None
 
         try:
             self.language = _get_language(data)
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+# License: GPL
+
+"""Timing operations applied by FFmpeg while extracting.
+
+The operations are expressed as a `setts` bitstream filter on the output
+subtitle packets, so cues are retimed as they are muxed: no second pass and
+constant memory.
+
+Time windows use input seeking, so FFmpeg jumps to the start of the window
+through the container index and stops reading at its end."""
+
+from __future__ import annotations
+
+from datetime import timedelta
+from fractions import Fraction
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _fraction(value) -> Fraction:
+    """Accepts numbers and FFprobe rate strings ("24000/1001", "23.976").
+
+    :raises: ValueError"""
+    fraction = Fraction(str(value))
+    if fraction <= 0:
+        raise ValueError(f"Invalid frame rate: {value}")
+
+    return fraction
+
+
+def _seconds(value) -> float:
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+
+    return float(value)
+
+
+def window_args(start=None, end=None) -> tuple:
+    """Returns the (input, output) FFmpeg arguments limiting the extraction to
+    a time window.
+
+    Timestamps are kept (-copyts), so the cues match the original timings. As
+    seeking is done to the nearest index point, a few cues before `start` may be
+    included.
+
+    :param start: seconds (or timedelta) where the window starts
+    :param end: seconds (or timedelta) where the window ends
+    :raises: ValueError
+    """
+    input_args, output_args = [], []
+    if start is not None:
+        start = _seconds(start)
+        if start < 0:
+            raise ValueError(f"Invalid start: {start}")
+        if start:
+            input_args = ["-copyts", "-ss", f"{start:.3f}"]
+
+    if end is not None:
+        end = _seconds(end)
+        if end <= (start or 0):
+            raise ValueError(f"Invalid end: {end} (start: {start})")
+        output_args = ["-to", f"{end:.3f}"]
+
+    return input_args, output_args
+
+
+def sample_windows(duration, windows: int = 3, sample_seconds=30) -> list:
+    """Returns (start, end) tuples of evenly spaced windows across a duration.
+
+    Every window is centered in one of `windows` equal parts of the duration. If
+    the windows don't fit, a single window covering the duration is returned.
+
+    :param duration: seconds (or timedelta). If None, a single window from the
+    start is returned
+    :param windows: number of windows
+    :param sample_seconds: seconds (or timedelta) of every window
+    :raises: ValueError
+    """
+    sample_seconds = _seconds(sample_seconds)
+    if windows < 1 or sample_seconds <= 0:
+        raise ValueError(f"Invalid sample: {windows} x {sample_seconds}s")
+
+    if not duration:
+        return [(0.0, sample_seconds)]
+
+    duration = _seconds(duration)
+    if duration <= windows * sample_seconds:
+        return [(0.0, duration)]
+
+    part = duration / windows
+    offset = (part - sample_seconds) / 2
+    return [
+        (part * i + offset, part * i + offset + sample_seconds) for i in range(windows)
+    ]
+
+
+def timing_args(shift=None, fps_from=None, fps_to=None) -> list:
+    """Returns per-output FFmpeg arguments retiming subtitle cues.
+
+    Every timestamp `t` becomes `t * fps_from / fps_to + shift`, so a track
+    authored for 23.976 fps video is fixed for 25 fps with fps_from=23.976 and
+    fps_to=25. Cues moved before zero are clamped to zero.
+
+    :param shift: seconds (or timedelta) added to every cue
+    :param fps_from: frame rate the subtitles were timed for
+    :param fps_to: frame rate of the target video
+    :raises: ValueError
+    """
+    if shift is not None:
+        shift = _seconds(shift)
+
+    if (fps_from is None) != (fps_to is None):
+        raise ValueError("fps_from and fps_to must be set together")
+
+    ratio = Fraction(1)
+    if fps_from is not None:
+        ratio = _fraction(fps_from) / _fraction(fps_to)
+
+    if not shift and ratio == 1:
+        return []
+
+    ts_expr = "PTS" if ratio == 1 else f"PTS*{ratio.numerator}/{ratio.denominator}"
+    if shift:
+        ts_expr = f"max({ts_expr}{float(shift):+f}/TB\\,0)"
+
+    filter_ = f"setts=ts={ts_expr}"
+    if ratio != 1:
+        filter_ += f":duration=DURATION*{ratio.numerator}/{ratio.denominator}"
+
+    logger.debug("Timing filter: %s", filter_)
+    return ["-bsf:s", filter_]
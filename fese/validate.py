@@ -0,0 +1,377 @@
+# -*- coding: utf-8 -*-
+# License: GPL
+
+"""Integrity validation of extracted text subtitles.
+
+Outputs are validated while FFmpeg writes them: with `validate=True`,
+extractions mux text outputs to pipes read by the library, which checks every
+chunk before writing it, so files aren't read a second time. The checks are:
+
+* Encoding: outputs are written as UTF-8 (or another `output_encoding`).
+  Legacy charsets (e.g. copied ASS files) are detected and converted (see
+  fese.charset). Undecodable bytes are replaced and counted
+* Headers: ASS/SSA need a [Script Info] section and an [Events] format line,
+  WebVTT its signature
+* Timings: cues need valid timings and a positive duration. SubRip and WebVTT
+  cues must be sorted and not overlap (ASS events are layered)
+* Completeness: the cues are compared with the frames reported by the
+  container (Matroska NUMBER_OF_FRAMES tags). FFmpeg drops cues it can't
+  decode, so garbled sources show up as missing cues
+
+Usage:
+    results = video.extract_subtitles(subtitles, validate=True)
+    results[2].validation.score  # 0.0 (unusable) - 1.0
+    validate_file("movie.en.srt")
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+
+from .charset import StreamTranscoder
+
+logger = logging.getLogger(__name__)
+
+# Reports with lower scores are not ok
+MIN_SCORE = 0.9
+
+CHUNK_SIZE = 64 * 1024
+
+# Issues
+ENCODING = "encoding"  # Replaced characters
+HEADER = "header"
+TIMING = "timing"  # Invalid timings or cues ending before they start
+ZERO_LENGTH = "zero_length"
+NON_MONOTONIC = "non_monotonic"
+OVERLAP = "overlap"
+
+_CUE_ISSUES = (TIMING, ZERO_LENGTH, NON_MONOTONIC, OVERLAP)
+
+# Output extensions by validated format
+_FORMATS = {
+    "srt": "srt",
+    "ass": "ass",
+    "ssa": "ass",
+    "vtt": "webvtt",
+    "webvtt": "webvtt",
+}
+
+_SRT_TIMING_RE = re.compile(
+    r"^[ \t]*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})[ \t]*-->[ \t]*"
+    r"(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})",
+    re.MULTILINE,
+)
+_VTT_TIMING_RE = re.compile(
+    r"^[ \t]*(?:(\d+):)?(\d{2}):(\d{2})\.(\d{3})[ \t]*-->[ \t]*"
+    r"(?:(\d+):)?(\d{2}):(\d{2})\.(\d{3})",
+    re.MULTILINE,
+)
+_ASS_TIME_RE = re.compile(r"^\s*(\d+):(\d{1,2}):(\d{1,2})[.:](\d{1,3})\s*$")
+
+
+class ValidationReport:
+    """The outcome of the validation of a subtitle file.
+
+    `issues` counts the problems found by type (ENCODING counts characters,
+    the others cues). The score is the product of:
+
+    * completeness: extracted cues / expected cues (1 if unknown). 0 if there
+      are no cues
+    * the ratio of cues without timing issues
+    * the ratio of decodable characters
+    * 0.5 if the header is malformed
+    """
+
+    def __init__(self, format: str, expected_cues: int = None):
+        self.format = format
+        self.expected_cues = expected_cues or None
+        self.cues = 0
+        self.characters = 0
+        self.encoding = "utf-8"
+        self.issues = dict.fromkeys((ENCODING, HEADER) + _CUE_ISSUES, 0)
+        self.score = None
+
+    @property
+    def ok(self) -> bool:
+        return self.score is not None and self.score >= MIN_SCORE
+
+    def _compute_score(self):
+        if not self.cues:
+            return 0.0
+
+        completeness = 1.0
+        if self.expected_cues:
+            completeness = min(1.0, self.cues / self.expected_cues)
+
+        bad_cues = sum(self.issues[issue] for issue in _CUE_ISSUES)
+        score = completeness * (1 - min(1.0, bad_cues / self.cues))
+        if self.characters:
+            score *= 1 - min(1.0, self.issues[ENCODING] / self.characters)
+
+        if self.issues[HEADER]:
+            score *= 0.5
+
+        return round(score, 3)
+
+    def as_dict(self) -> dict:
+        return {
+            "score": self.score,
+            "ok": self.ok,
+            "format": self.format,
+            "cues": self.cues,
+            "expected_cues": self.expected_cues,
+            "encoding": self.encoding,
+            "issues": {key: value for key, value in self.issues.items() if value},
+        }
+
+    def __repr__(self) -> str:
+        return f"<ValidationReport {self.format}: {self.score} ({self.cues} cues)>"
+
+
+class StreamValidator:
+    """Validates a subtitle file chunk by chunk.
+
+    Chunks are decoded and encoded again by a StreamTranscoder, which detects
+    legacy charsets.
+
+    Usage:
+        validator = StreamValidator("srt", expected_cues=500)
+        for chunk in chunks:
+            file.write(validator.feed(chunk))
+        file.write(validator.finish())
+        validator.report.score
+    """
+
+    def __init__(
+        self,
+        format: str,
+        expected_cues: int = None,
+        transcoder: StreamTranscoder = None,
+    ):
+        """
+        :param format: "srt", "ass" or "webvtt"
+        :param expected_cues: the number of cues of the source (if known)
+        :param transcoder: decodes and encodes the chunks. Defaults to a
+        UTF-8 output with the input charset detected
+        :raises: ValueError
+        """
+        try:
+            self._parser = _PARSERS[format]()
+        except KeyError:
+            raise ValueError(f"Unsupported format: {format}")
+
+        self.report = ValidationReport(format, expected_cues)
+        self.transcoder = transcoder or StreamTranscoder()
+        self._line = ""
+
+    def feed(self, data: bytes) -> bytes:
+        "Validates a chunk. Returns it transcoded."
+        return self._process(self.transcoder.decode(data))
+
+    def finish(self) -> bytes:
+        "Validates the remaining data and scores the report. Returns it transcoded."
+        data = self._process(self.transcoder.decode(b"", True), True)
+        if self._line:
+            self._parser.block(self._line, self.report)
+            self._line = ""
+
+        self._parser.finish(self.report)
+        self.report.encoding = self.transcoder.encoding
+        self.report.score = self.report._compute_score()
+        return data
+
+    def _process(self, text, final=False):
+        if not text:
+            return self.transcoder.encode("", final)
+
+        self.report.characters += len(text)
+        self.report.issues[ENCODING] += text.count("\ufffd")
+        # Complete lines are parsed, the last one waits for the next chunk
+        block = self._line + text
+        end = block.rfind("\n") + 1
+        self._line = block[end:]
+        if end:
+            self._parser.block(block[:end], self.report)
+
+        return self.transcoder.encode(text, final)
+
+
+def format_of(path: str):
+    "Returns the validated format of a subtitle path or None if not supported."
+    return _FORMATS.get(os.path.splitext(path)[-1].lstrip(".").lower())
+
+
+def validate_file(path: str, expected_cues: int = None, format: str = None):
+    """Validates a subtitle file. The file is not modified.
+
+    :param path: the subtitle file
+    :param expected_cues: the number of cues of the source (if known)
+    :param format: "srt", "ass" or "webvtt". Defaults to the format of the
+    extension
+    :raises: OSError, ValueError
+    """
+    validator = StreamValidator(format or format_of(path), expected_cues)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            validator.feed(chunk)
+
+    validator.finish()
+    return validator.report
+
+
+class _Parser:
+    "Parser of blocks of complete lines of a subtitle format."
+
+    ordered = True
+
+    def __init__(self):
+        self._last = None  # (start, end) of the previous cue
+
+    def block(self, text, report):
+        raise NotImplementedError
+
+    def finish(self, report):
+        pass
+
+    def _cue(self, start, end, report):
+        report.cues += 1
+        if end < start:
+            report.issues[TIMING] += 1
+        elif end == start:
+            report.issues[ZERO_LENGTH] += 1
+        elif self.ordered and self._last is not None:
+            if start < self._last[0]:
+                report.issues[NON_MONOTONIC] += 1
+            elif start < self._last[1]:
+                report.issues[OVERLAP] += 1
+
+        self._last = (start, end)
+
+
+class _SrtParser(_Parser):
+    _timing_re = _SRT_TIMING_RE
+
+    def block(self, text, report):
+        # Timing lines are matched over the whole block: a line loop would be
+        # the bottleneck of the validation
+        valid = 0
+        for match in self._timing_re.finditer(text):
+            self._cue(*_timing(match.groups()), report)
+            valid += 1
+
+        invalid = text.count("-->") - valid
+        if invalid > 0:
+            report.cues += invalid
+            report.issues[TIMING] += invalid
+
+
+class _WebVTTParser(_SrtParser):
+    _timing_re = _VTT_TIMING_RE
+
+    def __init__(self):
+        super().__init__()
+        self._signature = None
+
+    def block(self, text, report):
+        if self._signature is None:
+            first = text.lstrip("\ufeff \t\r\n")
+            if not first:
+                return
+
+            self._signature = first.startswith("WEBVTT")
+            if not self._signature:
+                report.issues[HEADER] += 1
+
+        super().block(text, report)
+
+
+class _AssParser(_Parser):
+    # Events are layered: overlaps and order are not checked
+    ordered = False
+
+    def __init__(self):
+        super().__init__()
+        self._section = None
+        self._fields = None
+
+    def block(self, text, report):
+        for line in text.split("\n"):
+            self._line(line, report)
+
+    def _line(self, line, report):
+        stripped = line.strip().lstrip("\ufeff")
+        if not stripped or stripped.startswith(";"):
+            return
+
+        if stripped.startswith("[") and stripped.endswith("]"):
+            if self._section is None and stripped.lower() != "[script info]":
+                report.issues[HEADER] += 1
+            self._section = stripped.lower()
+            return
+
+        if self._section is None:
+            report.issues[HEADER] += 1
+            self._section = "n/a"
+
+        if self._section != "[events]":
+            return
+
+        key, _, value = stripped.partition(":")
+        if key == "Format":
+            self._fields = [field.strip().lower() for field in value.split(",")]
+        elif key == "Dialogue":
+            self._dialogue(value, report)
+
+    def finish(self, report):
+        if self._fields is None:
+            report.issues[HEADER] += 1
+
+    def _dialogue(self, value, report):
+        if self._fields is None:
+            # Dialogues before the format line can't be read
+            report.issues[HEADER] += 1
+            self._fields = []
+
+        values = value.split(",", len(self._fields) - 1)
+        try:
+            start = _ass_millis(values[self._fields.index("start")])
+            end = _ass_millis(values[self._fields.index("end")])
+        except (ValueError, IndexError):
+            report.cues += 1
+            report.issues[TIMING] += 1
+            return
+
+        self._cue(start, end, report)
+
+
+_PARSERS = {"srt": _SrtParser, "webvtt": _WebVTTParser, "ass": _AssParser}
+
+
+def _timing(groups):
+    "Returns the (start, end) milliseconds of the groups of a timing line."
+    if None in groups or len(groups[3]) != 3 or len(groups[7]) != 3:
+        return _millis(*groups[:4]), _millis(*groups[4:])
+
+    hours, minutes, seconds, millis, hours_, minutes_, seconds_, millis_ = map(
+        int, groups
+    )
+    return (
+        ((hours * 60 + minutes) * 60 + seconds) * 1000 + millis,
+        ((hours_ * 60 + minutes_) * 60 + seconds_) * 1000 + millis_,
+    )
+
+
+def _millis(hours, minutes, seconds, fraction):
+    return ((int(hours or 0) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(
+        fraction.ljust(3, "0")
+    )
+
+
+def _ass_millis(value):
+    match = _ASS_TIME_RE.match(value)
+    if match is None:
+        raise ValueError(f"Invalid time: {value}")
+
+    return _millis(*match.groups())
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+# License: GPL
+
+"""Watching of library roots for new or modified media files.
+
+Events come from inotify on Linux (through ctypes, no extra dependencies) or
+from periodic scans elsewhere. A path is published once no events arrived for
+`debounce` seconds and its size didn't change between two checks, so files
+being copied or muxed are not probed half-written.
+
+Usage:
+    watcher = Watcher(["/media/tv"], callback=print, include=["*.mkv"])
+    watcher.run()  # Blocks until watcher.stop() is called from another thread
+"""
+
+from __future__ import annotations
+
+import ctypes
+import ctypes.util
+import errno
+import fnmatch
+import logging
+import os
+import select
+import struct
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of pending paths
+TICK = 0.5
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (
+    IN_MODIFY
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+)
+
+_EVENT = struct.Struct("iIII")
+
+
+class Inotify:
+    """Minimal inotify wrapper.
+
+    :raises: OSError
+    """
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            _raise_errno()
+
+        self._paths = {}  # Watch descriptor -> directory
+
+    def add_watch(self, path: str, mask: int = _WATCH_MASK):
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            _raise_errno(path)
+
+        self._paths[wd] = path
+        return wd
+
+    def read(self, timeout: float = None):
+        """Yields (directory, name, mask) tuples. `directory` is None for queue
+        overflows."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_IGNORED:
+                self._paths.pop(wd, None)
+                continue
+
+            yield self._paths.get(wd), name, mask
+
+    @property
+    def watches(self):
+        return len(self._paths)
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class Watcher:
+    """Publishes new or modified media paths under the roots once they are
+    stable.
+
+    :param roots: directories to watch recursively
+    :param callback: called with every stable path. It may block (e.g. a bounded
+    queue's put) to apply backpressure
+    :param include: globs of files to publish (matched against names and full
+    paths)
+    :param exclude: globs of files and directories to ignore
+    :param debounce: seconds without events before a path is checked
+    :param max_pending: maximum paths tracked at once. Events of new paths are
+    dropped (and counted in `dropped`) while the limit is reached
+    :param poll_interval: seconds between scans if inotify is not available
+    :param use_inotify: None to use inotify when available
+    """
+
+    def __init__(
+        self,
+        roots,
+        callback,
+        include=("*",),
+        exclude=(),
+        debounce: float = 2.0,
+        max_pending: int = 10000,
+        poll_interval: float = 60.0,
+        use_inotify: bool = None,
+    ):
+        self.roots = [os.path.abspath(root) for root in roots]
+        self.callback = callback
+        self.include = tuple(include)
+        self.exclude = tuple(exclude)
+        self.debounce = debounce
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        self.dropped = 0
+
+        if use_inotify is None:
+            use_inotify = sys.platform.startswith("linux")
+        self.use_inotify = use_inotify
+
+        self._pending = {}  # Path -> [last event time, last seen size]
+        self._snapshot = {}  # Path -> (mtime, size). Only used while polling
+        self._running = False
+
+    def run(self):
+        "Watches until stop() is called."
+        self._running = True
+        if self.use_inotify:
+            with Inotify() as inotify:
+                for root in self.roots:
+                    self._watch_tree(inotify, root)
+
+                logger.info("Watching %d directories", inotify.watches)
+                while self._running:
+                    for directory, name, mask in inotify.read(TICK):
+                        self._handle_event(inotify, directory, name, mask)
+                    self._check_pending()
+        else:
+            self._scan(initial=True)
+            last_scan = time.monotonic()
+            while self._running:
+                time.sleep(TICK)
+                if time.monotonic() - last_scan >= self.poll_interval:
+                    self._scan()
+                    last_scan = time.monotonic()
+                self._check_pending()
+
+    def stop(self):
+        self._running = False
+
+    def _handle_event(self, inotify, directory, name, mask):
+        if directory is None:
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("inotify queue overflow: events were lost")
+            return
+
+        path = os.path.join(directory, name)
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO) and not self._excluded(path):
+                # Files may land before the watch is set
+                self._watch_tree(inotify, path, publish=True)
+            return
+
+        if mask & (IN_DELETE | IN_MOVED_FROM):
+            self._pending.pop(path, None)
+        elif mask & (IN_CREATE | IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO):
+            self._touch(path)
+
+    def _watch_tree(self, inotify, root, publish=False):
+        for directory, dirnames, filenames in os.walk(root):
+            dirnames[:] = [
+                name
+                for name in dirnames
+                if not self._excluded(os.path.join(directory, name))
+            ]
+            try:
+                inotify.add_watch(directory)
+            except OSError as error:
+                logger.warning("Can't watch %s: %s", directory, error)
+                if error.errno == errno.ENOSPC:
+                    logger.warning("Raise fs.inotify.max_user_watches")
+                continue
+
+            if publish:
+                for name in filenames:
+                    self._touch(os.path.join(directory, name))
+
+    def _scan(self, initial=False):
+        snapshot = {}
+        for root in self.roots:
+            for directory, dirnames, filenames in os.walk(root):
+                dirnames[:] = [
+                    name
+                    for name in dirnames
+                    if not self._excluded(os.path.join(directory, name))
+                ]
+                for name in filenames:
+                    path = os.path.join(directory, name)
+                    if not self._accepted(path):
+                        continue
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+
+                    snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+                    if not initial and self._snapshot.get(path) != snapshot[path]:
+                        self._touch(path)
+
+        self._snapshot = snapshot
+
+    def _touch(self, path):
+        if not self._accepted(path):
+            return
+
+        if path in self._pending:
+            self._pending[path][0] = time.monotonic()
+        elif len(self._pending) < self.max_pending:
+            self._pending[path] = [time.monotonic(), None]
+        else:
+            self.dropped += 1
+            logger.debug("Too many pending paths. Dropping %s", path)
+
+    def _check_pending(self):
+        now = time.monotonic()
+        ready = []
+        for path, item in self._pending.items():
+            last_event, last_size = item
+            if now - last_event < self.debounce:
+                continue
+
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                ready.append((path, False))
+                continue
+
+            if size == last_size:
+                ready.append((path, True))
+            else:
+                # Check again after another debounce period
+                item[:] = [now, size]
+
+        for path, exists in ready:
+            del self._pending[path]
+            if exists:
+                logger.debug("Stable path: %s", path)
+                self.callback(path)
+
+    def _accepted(self, path):
+        return _matches(path, self.include) and not self._excluded(path)
+
+    def _excluded(self, path):
+        return _matches(path, self.exclude)
+
+
+def _matches(path, globs):
+    name = os.path.basename(path)
+    return any(
+        fnmatch.fnmatch(name, glob) or fnmatch.fnmatch(path, glob) for glob in globs
+    )
+
+
+def _raise_errno(path=None):
+    code = ctypes.get_errno()
+    raise OSError(code, os.strerror(code), path)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import sys
+
+import pytest
+
+from fese import backends
+from fese import container
+from fese import decoding
+from fese import source
+from fese.container import FFprobeVideoContainer
+from fese.exceptions import InvalidSource
+
+_DATA = os.path.join(os.path.abspath(os.path.dirname(__file__)), "data")
+
+_FILES = ("file_1.mkv", "file.mp4")
+
+requires_pyav = pytest.mark.skipif(backends.av is None, reason="PyAV not installed")
+requires_ffprobe = pytest.mark.skipif(
+    shutil.which(container.FFPROBE_PATH) is None, reason="FFprobe not found"
+)
+
+
+def _signature(stream):
+    return (
+        stream.index,
+        stream.codec_name,
+        stream.r_frame_rate,
+        stream.avg_frame_rate,
+        stream.start_time,
+        stream.start_pts,
+        stream.duration_ts,
+        stream.duration,
+        type(stream.tags),
+        stream.tags.language,
+        stream.tags.frames,
+        stream.disposition.language_kwargs(),
+        stream.suffix,
+    )
+
+
+def test_get_backend():
+    assert isinstance(backends.get_backend("ffprobe"), backends.FFprobeBackend)
+
+
+def test_get_backend_raises_value_error():
+    with pytest.raises(ValueError):
+        backends.get_backend("unknown")
+
+
+def test_ffprobe_backend_uses_container_globals(monkeypatch):
+    monkeypatch.setattr(container, "FFPROBE_PATH", "/custom/ffprobe")
+    assert backends.FFprobeBackend().command("file.mkv")[0] == "/custom/ffprobe"
+    assert backends.FFprobeBackend("other").command("file.mkv")[0] == "other"
+
+
+def test_ffprobe_backend_url_probesize(monkeypatch):
+    monkeypatch.setattr(source, "REMOTE_PROBESIZE", 1000)
+    command = backends.FFprobeBackend().command("https://host/file.mkv")
+    assert command[command.index("-probesize") + 1] == "1000"
+    assert "-probesize" not in backends.FFprobeBackend().command("file.mkv")
+
+
+def test_ffprobe_backend_raises_invalid_source():
+    with pytest.raises(InvalidSource):
+        backends.FFprobeBackend("/non/existent/ffprobe").probe("file.mkv")
+
+
+def _fake_ffprobe(tmp_path, code):
+    "An executable which runs `code` instead of FFprobe."
+    path = tmp_path / "ffprobe"
+    path.write_text(f"#!{sys.executable}\nimport sys, time\n{code}\n")
+    path.chmod(0o755)
+    return str(path)
+
+
+_OUTPUT = (
+    'sys.stdin.buffer.read() if sys.argv[-1] == "pipe:0" else None\n'
+    "sys.stdout.write('{\"streams\": [')\n"
+    "for index in range(1000):\n"
+    '    sys.stdout.write(("," if index else "") + \'{"index": %d, '
+    '"codec_type": "%s", "tags": {"title": "%s"}}\' % '
+    '(index, "subtitle" if index % 2 else "data", "x" * 20000))\n'
+    'sys.stdout.write("]}")'
+)
+
+
+@pytest.mark.parametrize("streaming", [True, False])
+def test_ffprobe_backend_streaming(tmp_path, monkeypatch, streaming):
+    monkeypatch.setattr(decoding, "MAX_STREAMS", 100)
+    backend = backends.FFprobeBackend(
+        _fake_ffprobe(tmp_path, _OUTPUT), streaming=streaming, stream_types=["subtitle"]
+    )
+    for data in (backend.probe("file.mkv"), backend.probe_data(b"\0" * 10**6)):
+        if streaming:
+            assert [stream["index"] for stream in data["streams"]] == list(
+                range(1, 200, 2)
+            )
+            assert len(data["streams"][0]["tags"]["title"]) == decoding.MAX_TAG_SIZE
+        else:
+            assert len(data["streams"]) == 1000
+
+
+@pytest.mark.parametrize(
+    "code", ["time.sleep(10)", "sys.stdout.write('{\"streams\": [')\nsys.exit(1)"]
+)
+def test_ffprobe_backend_streaming_raises_invalid_source(tmp_path, code):
+    backend = backends.FFprobeBackend(_fake_ffprobe(tmp_path, code))
+    with pytest.raises(InvalidSource):
+        backend.probe("file.mkv", timeout=0.5)
+
+
+@requires_pyav
+@pytest.mark.parametrize("filename", _FILES)
+def test_pyav_backend_probe(filename):
+    data = backends.PyAVBackend().probe(os.path.join(_DATA, filename))
+    assert data["format"]["nb_streams"] == len(data["streams"])
+    for stream in data["streams"]:
+        assert "codec_type" in stream
+        assert isinstance(stream["disposition"], dict)
+
+
+@requires_pyav
+def test_pyav_backend_raises_invalid_source(tmp_path):
+    with pytest.raises(InvalidSource):
+        backends.PyAVBackend().probe(str(tmp_path / "missing.mkv"))
+
+
+@requires_pyav
+@pytest.mark.parametrize("filename", _FILES)
+def test_pyav_backend_probe_data(filename):
+    with open(os.path.join(_DATA, filename), "rb") as file:
+        data = backends.PyAVBackend().probe_data(file.read())
+
+    assert data["streams"]
+
+
+@requires_pyav
+def test_pyav_backend_closed_captions():
+    path = os.path.join(_DATA, "file_cc.mkv")
+    assert "closed_captions" not in backends.PyAVBackend().probe(path)["streams"][0]
+
+    data = backends.PyAVBackend(caption_frames=3).probe(path)
+    assert data["streams"][0]["closed_captions"] == 1
+
+
+@requires_pyav
+def test_pyav_backend_closed_captions_not_found():
+    path = os.path.join(_DATA, "file.mp4")
+    data = backends.PyAVBackend(caption_frames=3).probe(path)
+    assert not any("closed_captions" in stream for stream in data["streams"])
+
+
+@requires_pyav
+@pytest.mark.parametrize("filename", _FILES)
+def test_base_backend_probe_data(filename):
+    class Backend(backends.PyAVBackend):
+        probe_data = backends.ProbeBackend.probe_data
+
+    with open(os.path.join(_DATA, filename), "rb") as file:
+        data = Backend().probe_data(file.read())
+
+    assert data["streams"]
+
+
+@requires_pyav
+@pytest.mark.parametrize("filename", _FILES)
+def test_container_w_pyav_backend(filename):
+    video = FFprobeVideoContainer(
+        os.path.join(_DATA, filename), backend=backends.PyAVBackend()
+    )
+    subtitles = video.get_subtitles()
+    assert subtitles
+    assert all(sub.language.alpha3 == "eng" for sub in subtitles)
+
+
+@requires_pyav
+@requires_ffprobe
+@pytest.mark.parametrize("filename", _FILES)
+def test_backends_conformance(filename):
+    path = os.path.join(_DATA, filename)
+    ffprobe_subs = FFprobeVideoContainer(
+        path, backends.FFprobeBackend()
+    ).get_subtitles()
+    pyav_subs = FFprobeVideoContainer(path, backends.PyAVBackend()).get_subtitles()
+
+    assert [_signature(sub) for sub in ffprobe_subs] == [
+        _signature(sub) for sub in pyav_subs
+    ]
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from fese import charset
+from fese.charset import detect_encoding
+from fese.charset import StreamTranscoder
+
+_TEXT = "1\n00:00:01,000 --> 00:00:02,000\n¿Qué tal? Adiós\n" * 20
+
+
+def _transcode(data, chunk_size=None, **kwargs):
+    transcoder = StreamTranscoder(**kwargs)
+    chunk_size = chunk_size or len(data) or 1
+    output = b"".join(
+        transcoder.feed(data[i : i + chunk_size])
+        for i in range(0, len(data), chunk_size)
+    )
+    return transcoder, output + transcoder.finish()
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 5])
+def test_utf8_unchanged(chunk_size):
+    data = _TEXT.encode("utf-8")
+    transcoder, output = _transcode(data, chunk_size)
+    assert output == data
+    assert transcoder.encoding == "utf-8"
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 7])
+def test_legacy_charset_detected(monkeypatch, chunk_size):
+    monkeypatch.setattr(charset, "charset_normalizer", None)
+    transcoder, output = _transcode(_TEXT.encode("cp1252"), chunk_size)
+    assert output.decode("utf-8") == _TEXT
+    assert transcoder.encoding == "cp1252"
+
+
+def test_legacy_charset_detected_after_detect_size(monkeypatch):
+    monkeypatch.setattr(charset, "charset_normalizer", None)
+    monkeypatch.setattr(charset, "DETECT_SIZE", 16)
+    transcoder = StreamTranscoder()
+    assert transcoder.feed(b"abc \xe9") == b"abc "
+    # Buffered until DETECT_SIZE bytes are available
+    assert transcoder.feed(b"\xe9") == b""
+    assert transcoder.feed(b" 0123456789abcdef") == "éé 0123456789abcdef".encode()
+    assert transcoder.finish() == b""
+
+
+def test_shift_jis_detected():
+    if charset.charset_normalizer is None:
+        pytest.skip("charset_normalizer not installed")
+
+    text = "こんにちは、世界。今日はいい天気ですね。\n" * 40
+    transcoder, output = _transcode(text.encode("shift_jis"), 64)
+    assert output.decode("utf-8") == text
+    assert transcoder.encoding in ("shift_jis", "cp932")
+
+
+@pytest.mark.parametrize("chunk_size", [None, 3])
+def test_known_input_encoding(chunk_size):
+    transcoder, output = _transcode(
+        _TEXT.encode("latin-1"), chunk_size, input_encoding="latin-1"
+    )
+    assert output.decode("utf-8") == _TEXT
+    assert transcoder.encoding == "iso8859-1"
+
+
+def test_legacy_output_encoding():
+    transcoder, output = _transcode(
+        "Adiós → 世界\n".encode("utf-8"), 1, output_encoding="cp1252"
+    )
+    assert output == "Adiós ? ??\n".encode("cp1252")
+    assert transcoder.output_encoding == "cp1252"
+
+
+def test_utf16_output_has_one_bom():
+    _, output = _transcode(_TEXT.encode("utf-8"), 8, output_encoding="utf-16")
+    assert output.decode("utf-16") == _TEXT
+
+
+def test_unknown_encoding_raises_lookup_error():
+    with pytest.raises(LookupError):
+        StreamTranscoder("unknown")
+
+    with pytest.raises(LookupError):
+        StreamTranscoder(input_encoding="unknown")
+
+
+def test_detect_encoding_fallback(monkeypatch):
+    monkeypatch.setattr(charset, "charset_normalizer", None)
+    assert detect_encoding("¿Qué?".encode("cp1252")) == charset.FALLBACK_ENCODING
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import shutil
+
+import pytest
+
+from fese import backends
+from fese import cli
+from fese.container import FFprobeVideoContainer
+from fese.result import COPY
+from fese.result import ExtractionResult
+
+_DATA = os.path.join(os.path.abspath(os.path.dirname(__file__)), "data")
+
+requires_pyav = pytest.mark.skipif(backends.av is None, reason="PyAV not installed")
+
+
+@pytest.fixture
+def library(tmp_path):
+    for directory in ("movies/a", "movies/extras", "tv"):
+        (tmp_path / directory).mkdir(parents=True)
+
+    shutil.copy(os.path.join(_DATA, "file_1.mkv"), tmp_path / "movies/a/movie.mkv")
+    shutil.copy(os.path.join(_DATA, "file.mp4"), tmp_path / "tv/episode.mp4")
+    shutil.copy(os.path.join(_DATA, "file.mp4"), tmp_path / "movies/extras/bonus.mp4")
+    (tmp_path / "movies/a/notes.txt").write_text("n/a")
+    return tmp_path
+
+
+def _results(capsys):
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+def test_walk(library):
+    paths = list(cli.walk([str(library)]))
+    assert len(paths) == 3
+    assert not any(path.endswith(".txt") for path in paths)
+
+
+def test_walk_include_exclude(library):
+    paths = list(cli.walk([str(library)], include=["*.mp4"], exclude=["extras"]))
+    assert paths == [str(library / "tv/episode.mp4")]
+
+
+def test_walk_url(library):
+    url = "https://host/movie.mkv"
+    assert list(cli.walk([url])) == [url]
+
+
+def test_probe_error_exit_code(library, capsys):
+    assert (
+        cli.main(["probe", str(library), "--backend", "ffprobe", "--include", "*.txt"])
+        == 1
+    )
+    assert _results(capsys)[0]["status"] == "error"
+
+
+@requires_pyav
+def test_probe(library, capsys):
+    assert cli.main(["probe", str(library), "--backend", "pyav"]) == 0
+    results = _results(capsys)
+    assert len(results) == 3
+    assert all(result["streams"] for result in results)
+
+
+@requires_pyav
+def test_extract_dry_run(library, tmp_path, capsys):
+    custom_dir = tmp_path / "subs"
+    args = ["extract", str(library / "tv"), "--backend", "pyav", "--dry-run"]
+    assert cli.main(args + ["--custom-dir", str(custom_dir)]) == 0
+
+    result = _results(capsys)[0]
+    assert result["command"][-1] in result["outputs"].values()
+    assert not custom_dir.exists()
+
+
+@requires_pyav
+def test_extract_dry_run_language(library, capsys):
+    args = ["extract", str(library / "tv"), "--backend", "pyav", "--dry-run"]
+    assert cli.main(args + ["--language", "es"]) == 0
+    assert _results(capsys)[0]["command"] is None
+
+
+@requires_pyav
+def test_copy_font_store(library, tmp_path, capsys):
+    store = tmp_path / "fonts"
+    args = ["copy", str(library / "movies/a"), "--backend", "pyav"]
+    assert cli.main(args + ["--font-store", str(store)]) == 0
+
+    outputs = _results(capsys)[0]["outputs"].values()
+    assert all(len(output["fonts"]) == 6 for output in outputs)
+    assert (store / "index.json").is_file()
+
+
+@requires_pyav
+def test_extract_validate(library, tmp_path, capsys):
+    args = ["extract", str(library / "movies/a"), "--backend", "pyav", "--validate"]
+    assert cli.main(args + ["--custom-dir", str(tmp_path / "subs")]) == 0
+
+    outputs = _results(capsys)[0]["outputs"].values()
+    assert all(output["validation"]["ok"] for output in outputs)
+
+
+@requires_pyav
+def test_copy_output_encoding(library, tmp_path, capsys):
+    args = ["copy", str(library / "movies/a"), "--backend", "pyav"]
+    args += ["--output-encoding", "utf-16", "--custom-dir", str(tmp_path / "subs")]
+    assert cli.main(args) == 0
+
+    outputs = _results(capsys)[0]["outputs"].values()
+    assert all(output["encoding"] == "utf-8" for output in outputs)
+    for output in outputs:
+        with open(output["path"], encoding="utf-16") as file:
+            assert file.read().startswith("[Script Info]")
+
+
+@requires_pyav
+def test_copy_failed_streams_are_not_checkpointed(
+    library, tmp_path, capsys, monkeypatch
+):
+    def copy_subtitles(video, subtitles, **kwargs):
+        items = {}
+        for subtitle in subtitles:
+            items[subtitle.index] = ExtractionResult(subtitle.index, "out.ass", COPY)
+            items[subtitle.index].elapsed = 1.0
+        items[subtitles[0].index].error = "not extracted"
+        return items
+
+    monkeypatch.setattr(FFprobeVideoContainer, "copy_subtitles", copy_subtitles)
+    checkpoint = tmp_path / "checkpoint.txt"
+    args = ["copy", str(library / "movies/a"), "--backend", "pyav"]
+    assert cli.main(args + ["--checkpoint", str(checkpoint)]) == 1
+
+    result = _results(capsys)[0]
+    assert result["status"] == "partial"
+    assert not checkpoint.read_text()
+
+
+def test_unknown_encoding_exits(library):
+    with pytest.raises(SystemExit):
+        cli.main(["extract", str(library), "--source-encoding", "unknown"])
+
+
+@requires_pyav
+def test_probe_checkpoint_resume(library, tmp_path, capsys):
+    checkpoint = str(tmp_path / "checkpoint.txt")
+    args = ["probe", str(library), "--backend", "pyav", "--checkpoint", checkpoint]
+
+    assert cli.main(args) == 0
+    assert len(_results(capsys)) == 3
+
+    assert cli.main(args) == 0
+    assert not _results(capsys)
@@ -1,15 +1,40 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import http.server
+import io
+import json
 import os
+import re
+import subprocess
+import sys
+import threading
+import time
 
 import pysubs2
 import pytest
 
+from fese import charset
+from fese import container
+from fese import decoding
+from fese import source
+from fese.backends import ProbeBackend
+from fese.cancel import CancellationToken
+from fese.container import _ffmpeg_call
+from fese.container import _MuxStats
 from fese.container import FFprobeVideoContainer
+from fese.container import PROBE_BACKEND
+from fese.exceptions import ExtractionCancelled
 from fese.exceptions import ExtractionError
 from fese.exceptions import InvalidSource
 from fese.exceptions import UnsupportedCodec
+from fese.fonts import FontStore
+from fese.policy import ExecutionPolicy
+from fese.policy import Limiter
+from fese.probe import ProbeResult
+from fese.result import CONVERT
+from fese.result import FALLBACK
+from fese.result import SKIPPED_EXISTS
 
 _DATA = os.path.join(os.path.abspath(os.path.dirname(__file__)), "data")
 
@@ -33,6 +58,29 @@ def test_get_subtitles(video):
     assert isinstance(subtitles, list)
 
 
+def test_probe_is_memoized(video, monkeypatch):
+    result = video.probe()
+    monkeypatch.setattr(
+        "fese.container.PROBE_BACKEND.probe", pytest.fail, raising=False
+    )
+    assert video.probe() is result
+    assert video.get_subtitles() == result.subtitles
+
+
+def test_probe_views(video):
+    result = video.probe()
+    assert result.format.duration.total_seconds() > 0
+    assert len(result.subtitles) == 2
+    assert {attachment.mimetype for attachment in result.attachments} == {
+        "application/x-truetype-font"
+    }
+    assert [chapter.title for chapter in result.chapters] == [
+        "Opening",
+        "Episode",
+        "Ending",
+    ]
+
+
 @pytest.mark.parametrize("convert_format", ["srt", "ass", "webvtt"])
 def test_extract_subtitles_convert_w_format(tmp_path, video, convert_format):
     subtitles = video.get_subtitles()
@@ -42,7 +90,8 @@ def test_extract_subtitles_convert_w_format(tmp_path, video, convert_format):
         convert_format=convert_format,
         progress_callback=lambda d: print(f"Progress: {d}"),
     )
-    for path in subs.values():
+    for result in subs.values():
+        path = result.path
         _is_text_sub_file_valid(path)
         assert os.path.isfile(path) is True
         assert path.endswith(f".{convert_format}")
@@ -52,7 +101,8 @@ def test_extract_subtitles_convert_w_format(tmp_path, video, convert_format):
 def test_extract_subtitles_convert_w_o_format(tmp_path, video):
     subtitles = video.get_subtitles()
     subs = video.extract_subtitles(subtitles, custom_dir=tmp_path, convert_format=None)
-    for path in subs.values():
+    for result in subs.values():
+        path = result.path
         assert os.path.isfile(path) is True
         assert path.endswith(".srt")
         assert _is_text_sub_file_valid(path)
@@ -66,7 +116,8 @@ def test_extract_subtitles_convert_w_basename_callback(tmp_path, video):
         basename_callback=lambda d: "file.dummy",
         progress_callback=lambda d: print(f"Progress: {d}"),
     )
-    for path in subs.values():
+    for result in subs.values():
+        path = result.path
         assert os.path.basename(path) == "file.dummy"
         assert _is_text_sub_file_valid(path)
 
@@ -74,7 +125,8 @@ def test_extract_subtitles_convert_w_basename_callback(tmp_path, video):
 def test_extract_subtitles_copy(tmp_path, video):
     subtitles = video.get_subtitles()
     subs = video.copy_subtitles(subtitles, custom_dir=tmp_path)
-    for path in subs.values():
+    for result in subs.values():
+        path = result.path
         assert os.path.isfile(path) is True
         assert path.endswith(".ass")
         assert _is_text_sub_file_valid(path)
@@ -85,11 +137,369 @@ def test_extract_subtitles_copy_w_basename_callback(tmp_path, video):
     subs = video.copy_subtitles(
         subtitles, custom_dir=tmp_path, basename_callback=lambda d: "file.dummy"
     )
-    for path in subs.values():
+    for result in subs.values():
+        path = result.path
         assert os.path.basename(path) == "file.dummy"
         assert _is_text_sub_file_valid(path)
 
 
+@pytest.mark.parametrize("method", ["extract_subtitles", "copy_subtitles"])
+def test_extract_subtitles_w_timing(tmp_path, video, method):
+    subtitles = video.get_subtitles()[:1]
+    original = getattr(video, method)(subtitles, custom_dir=tmp_path / "original")
+    shifted = getattr(video, method)(
+        subtitles,
+        custom_dir=tmp_path / "shifted",
+        shift=2,
+        fps_from=24,
+        fps_to=25,
+    )
+    original_events = pysubs2.load(original[subtitles[0].index]).events
+    shifted_events = pysubs2.load(shifted[subtitles[0].index]).events
+
+    assert len(original_events) == len(shifted_events)
+    for orig, new in zip(original_events, shifted_events):
+        assert new.start == pytest.approx(orig.start * 24 / 25 + 2000, abs=20)
+
+
+@pytest.mark.parametrize("method", ["extract_subtitles", "copy_subtitles"])
+def test_extract_subtitles_w_window(tmp_path, video, method):
+    subtitles = video.get_subtitles()[:1]
+    subs = getattr(video, method)(subtitles, custom_dir=tmp_path, start=600, end=660)
+    events = pysubs2.load(subs[subtitles[0].index]).events
+
+    assert events
+    assert all(event.start < 660000 for event in events)
+    assert events[-1].end > 600000
+
+
+def test_sample_subtitles(tmp_path, video):
+    subtitles = video.get_subtitles()
+    samples = video.sample_subtitles(
+        subtitles, windows=4, sample_seconds=60, custom_dir=tmp_path
+    )
+    assert sorted(samples) == [sub.index for sub in subtitles]
+
+    for paths in samples.values():
+        assert len(paths) == 4
+        assert all(os.path.isfile(path) for path in paths)
+
+    last_window = pysubs2.load(samples[subtitles[0].index][-1]).events
+    assert last_window
+    assert all(900000 < event.end and event.start < 1085000 for event in last_window)
+
+
+def test_sample_subtitles_same_path(tmp_path, video):
+    subtitles = video.get_subtitles()[:2]
+    samples = video.sample_subtitles(
+        subtitles,
+        windows=2,
+        sample_seconds=60,
+        custom_dir=tmp_path,
+        basename_callback=lambda path: "sample.srt",
+    )
+    paths = [path for index in sorted(samples) for path in samples[index]]
+    assert len(set(paths)) == 4
+    first, second = (pysubs2.load(samples[sub.index][0]) for sub in subtitles)
+    assert first.events[0].text != second.events[0].text
+
+
+class _CaptionBackend(ProbeBackend):
+    "Flags the closed captions of the first video stream, as FFprobe does."
+
+    name = "captions"
+
+    def probe(self, path, timeout=600):
+        # Plain dictionaries, as backends may return read-only typed records
+        data = json.loads(decoding.dumps(PROBE_BACKEND.probe(path, timeout)))
+        data["streams"][0]["closed_captions"] = 1
+        return data
+
+
+@pytest.fixture
+def cc_video():
+    return FFprobeVideoContainer(
+        os.path.join(_DATA, "file_cc.mkv"), backend=_CaptionBackend()
+    )
+
+
+def test_extract_closed_captions(tmp_path, cc_video):
+    subtitles = cc_video.get_subtitles()
+    assert [sub.codec_name for sub in subtitles] == ["eia_608"]
+
+    result = cc_video.extract_subtitles(subtitles, custom_dir=tmp_path)[0]
+    assert result.ok
+    assert result.path.endswith("file_cc.en.cc.srt")
+    events = pysubs2.load(result.path).events
+    assert [event.plaintext for event in events] == [
+        f"CAPTION {number}" for number in range(1, 5)
+    ]
+
+
+def test_extract_closed_captions_w_window(tmp_path, cc_video):
+    subtitles = cc_video.get_subtitles()
+    result = cc_video.copy_subtitles(subtitles, custom_dir=tmp_path, start=6)[0]
+    assert result.mode == FALLBACK
+
+    events = pysubs2.load(result.path).events
+    assert [event.plaintext for event in events] == ["CAPTION 3", "CAPTION 4"]
+    # Timings are kept
+    assert events[0].start > 6000
+
+
+def test_sample_closed_captions(tmp_path, cc_video):
+    subtitles = cc_video.get_subtitles()
+    samples = cc_video.sample_subtitles(
+        subtitles, windows=2, sample_seconds=2, custom_dir=tmp_path
+    )
+    assert len(samples[0]) == 2
+    assert pysubs2.load(samples[0][1]).events
+
+
+def test_closed_captions_command_inputs(video):
+    data = video.probe().data
+    video._probe_result = ProbeResult(
+        {
+            "streams": data["streams"]
+            + [{"index": 8, "codec_type": "video", "closed_captions": 1}]
+        }
+    )
+    subtitles = video.get_subtitles()
+    captions = subtitles[-1]
+    assert captions.index == 8
+
+    command, items = video._convert_command(subtitles, None, True, None, None)
+    assert command.count("-i") == 2
+    assert command[command.index("lavfi") + 2].startswith("movie=")
+    assert command[command.index(items[captions.index].path) - 3] == "1:1"
+
+    command, _ = video._convert_command([captions], None, True, None, None)
+    assert command.count("-i") == 1
+
+    # The charset only applies to the media file
+    command, _ = video._convert_command(
+        subtitles, None, True, None, None, media_args=["-sub_charenc", "cp1252"]
+    )
+    assert command.index("-sub_charenc") + 2 == command.index(video.path) - 1
+    command, _ = video._convert_command(
+        [captions], None, True, None, None, media_args=["-sub_charenc", "cp1252"]
+    )
+    assert "-sub_charenc" not in command
+
+
+def test_extract_closed_captions_pipe_raises_unsupported_codec(tmp_path):
+    with open(os.path.join(_DATA, "file_cc.mkv"), "rb") as file:
+        video = FFprobeVideoContainer(file, backend=_CaptionBackend())
+        video._probe_result = ProbeResult(
+            {"streams": [{"index": 0, "codec_type": "video", "closed_captions": 1}]}
+        )
+        with pytest.raises(UnsupportedCodec):
+            video.extract_subtitles(video.get_subtitles(), custom_dir=tmp_path)
+
+
+def test_extract_subtitles_w_policy(tmp_path):
+    video = FFprobeVideoContainer(
+        os.path.join(_DATA, "file_1.mkv"),
+        policy=ExecutionPolicy(
+            nice=10,
+            ionice_class="idle",
+            threads=1,
+            limiter=Limiter(max_processes=1, read_rate=10 * 1024**2),
+        ),
+    )
+    subtitles = video.get_subtitles()
+    subs = video.extract_subtitles(subtitles, custom_dir=tmp_path)
+    assert all(os.path.isfile(result) for result in subs.values())
+
+
+class _RecordingLimiter(Limiter):
+    def __init__(self):
+        super().__init__()
+        self.charged = []
+
+    def acquire(self, read_bytes=0):
+        self.charged.append(read_bytes)
+        return super().acquire(read_bytes)
+
+
+def test_windowed_calls_charge_their_window(tmp_path):
+    limiter = _RecordingLimiter()
+    video = FFprobeVideoContainer(
+        os.path.join(_DATA, "file_1.mkv"), policy=ExecutionPolicy(limiter=limiter)
+    )
+    subtitles = video.get_subtitles()
+    size = os.path.getsize(video.path)
+
+    video.extract_subtitles(subtitles, custom_dir=tmp_path)
+    video.extract_subtitles(subtitles, custom_dir=tmp_path, start=60, end=120)
+    video.sample_subtitles(subtitles, windows=2, sample_seconds=30, custom_dir=tmp_path)
+
+    duration = video.probe().format.duration.total_seconds()
+    assert limiter.charged[0] == size
+    assert limiter.charged[1] == pytest.approx(size * 60 / duration, rel=0.01)
+    assert limiter.charged[2] == pytest.approx(size * 60 / duration, rel=0.01)
+
+
+def test_extract_subtitles_results(tmp_path, video, monkeypatch):
+    monkeypatch.setattr(container, "COLLECT_STATS", True)
+    subtitles = video.get_subtitles()
+    results = video.extract_subtitles(subtitles, custom_dir=tmp_path)
+
+    for subtitle in subtitles:
+        result = results[subtitle.index]
+        assert result.ok
+        assert result.mode == CONVERT
+        assert result.bytes == os.path.getsize(result)
+        assert result.cues == len(pysubs2.load(result.path).events)
+        assert result.elapsed > 0
+
+
+def test_extract_subtitles_without_stats(tmp_path, video):
+    progress = []
+    results = video.extract_subtitles(
+        video.get_subtitles(), custom_dir=tmp_path, progress_callback=progress.append
+    )
+    assert all(result.ok and result.cues is None for result in results.values())
+    assert all(info["time"] != "n/a" for info in progress)
+
+
+@pytest.mark.parametrize("method", ["extract_subtitles", "copy_subtitles"])
+def test_extract_subtitles_validate(tmp_path, video, method):
+    subtitles = video.get_subtitles()
+    extract = getattr(video, method)
+    plain = extract(subtitles, custom_dir=tmp_path / "plain")
+    validated = extract(subtitles, custom_dir=tmp_path / "validated", validate=True)
+
+    for index, result in validated.items():
+        assert plain[index].validation is None
+        assert result.validation.cues == result.cues
+        assert result.validation.ok
+        assert result.as_dict()["validation"]["score"] == result.validation.score
+        # Written as received
+        with open(plain[index].path, "rb") as file:
+            assert file.read() == open(result.path, "rb").read()
+
+
+def test_extract_subtitles_validate_expected_cues(tmp_path, video, monkeypatch):
+    subtitles = video.get_subtitles()[:1]
+    monkeypatch.setattr(type(subtitles[0].tags), "frames", 1000)
+
+    result = video.extract_subtitles(subtitles, custom_dir=tmp_path, validate=True)
+    report = result[subtitles[0].index].validation
+    assert report.expected_cues == 1000
+    assert report.score < 0.2
+    assert not report.ok
+
+
+@pytest.fixture
+def legacy_video():
+    # A Spanish ASS stream stored in cp1252
+    return FFprobeVideoContainer(os.path.join(_DATA, "file_cp1252.mkv"))
+
+
+@pytest.mark.parametrize("validate", [False, True])
+def test_copy_subtitles_output_encoding(tmp_path, legacy_video, monkeypatch, validate):
+    monkeypatch.setattr(charset, "charset_normalizer", None)
+    subtitles = legacy_video.get_subtitles()
+    results = legacy_video.copy_subtitles(
+        subtitles, custom_dir=tmp_path, validate=validate, output_encoding="utf-8"
+    )
+
+    result = results[subtitles[0].index]
+    assert result.ok
+    assert result.encoding == "cp1252"
+    assert result.as_dict()["encoding"] == "cp1252"
+    assert result.bytes == os.path.getsize(result)
+    with open(result, encoding="utf-8") as file:
+        assert "¿Qué tal? Adiós" in file.read()
+
+
+def test_copy_subtitles_legacy_output_encoding(tmp_path, video):
+    subtitles = video.get_subtitles()
+    plain = video.copy_subtitles(subtitles, custom_dir=tmp_path / "plain")
+    results = video.copy_subtitles(
+        subtitles, custom_dir=tmp_path / "utf16", output_encoding="utf-16-le"
+    )
+
+    for index, result in results.items():
+        assert result.encoding == "utf-8"
+        with open(plain[index], encoding="utf-8") as file:
+            assert open(result, encoding="utf-16-le").read() == file.read()
+
+
+def test_extract_subtitles_source_encoding(video, monkeypatch):
+    commands = []
+    monkeypatch.setattr(
+        "fese.container._ffmpeg_call",
+        lambda command, **kwargs: commands.append(command),
+    )
+    subtitles = video.get_subtitles()
+    video.extract_subtitles(subtitles, source_encoding="cp1252")
+    video.copy_subtitles(subtitles, source_encoding="cp1252")
+
+    for command in commands:
+        position = command.index("-sub_charenc")
+        assert command[position : position + 4] == [
+            "-sub_charenc",
+            "cp1252",
+            "-i",
+            video.path,
+        ]
+
+
+def test_extract_subtitles_unknown_encoding_raises_lookup_error(tmp_path, video):
+    with pytest.raises(LookupError):
+        video.extract_subtitles(
+            video.get_subtitles(), custom_dir=tmp_path, output_encoding="unknown"
+        )
+    assert not os.listdir(tmp_path)
+
+
+def test_extract_subtitles_results_skipped(tmp_path, video):
+    subtitles = video.get_subtitles()
+    video.extract_subtitles(subtitles, custom_dir=tmp_path)
+    results = video.extract_subtitles(subtitles, custom_dir=tmp_path, overwrite=False)
+
+    assert all(result.skipped == SKIPPED_EXISTS for result in results.values())
+    assert not any(result.ok for result in results.values())
+
+
+def test_copy_subtitles_w_font_store(tmp_path, video):
+    store = FontStore(str(tmp_path / "fonts"))
+    subtitles = video.get_subtitles()
+    for directory in ("a", "b"):
+        results = video.copy_subtitles(
+            subtitles, custom_dir=tmp_path / directory, font_store=store
+        )
+        for result in results.values():
+            assert len(result.fonts) == 6
+            assert all(os.path.isfile(path) for path in result.fonts)
+
+    # The fonts of both copies are stored once
+    stored = [name for _, _, names in os.walk(store.root) for name in names]
+    assert len(stored) == 6 + 2  # Fonts, the index and its lock
+    assert store.fonts_for(results[0].path) == results[0].fonts
+
+
+def test_copy_subtitles_results_fallback(tmp_path, mp4_video):
+    results = mp4_video.copy_subtitles(mp4_video.get_subtitles(), custom_dir=tmp_path)
+    assert all(result.mode == FALLBACK and result.ok for result in results.values())
+
+
+def test_mux_stats():
+    stats = _MuxStats()
+    for line in (
+        "[out#0/srt @ 0x1] Output file #0 (/tmp/a.srt):",
+        "[out#0/srt @ 0x1]   Output stream #0:0 (subtitle): 117 frames encoded; "
+        "117 packets muxed (8071 bytes); ",
+        "Output file #1 (/tmp/b.ass):",
+        "  Output stream #1:0 (subtitle): 16 packets muxed (1194 bytes); ",
+    ):
+        stats("ffmpeg: %s", line)
+
+    assert stats.packets == {"/tmp/a.srt": 117, "/tmp/b.ass": 16}
+
+
 def test_get_subtitles_raises_timeout(video):
     with pytest.raises(InvalidSource):
         assert video.get_subtitles(timeout=0.0001)
@@ -104,6 +514,78 @@ def test_extract_subtitles_raises_timeout(video):
         assert video.extract_subtitles(subtitles, timeout=0.0001)
 
 
+def test_extract_subtitles_cancelled(tmp_path, video):
+    subtitles = video.get_subtitles()
+    token = CancellationToken()
+    token.cancel()
+
+    with pytest.raises(ExtractionCancelled) as exc_info:
+        video.extract_subtitles(subtitles, custom_dir=tmp_path, cancel=token)
+
+    assert sorted(exc_info.value.failed) == [sub.index for sub in subtitles]
+    assert not os.listdir(tmp_path)
+
+
+def test_extract_subtitles_cancelled_while_running(tmp_path, video):
+    token = CancellationToken()
+
+    with pytest.raises(ExtractionCancelled):
+        video.extract_subtitles(
+            video.get_subtitles(),
+            custom_dir=tmp_path,
+            cancel=token,
+            progress_callback=lambda info: token.cancel(),
+        )
+
+    assert not os.listdir(tmp_path)
+
+
+def test_extract_subtitles_progress_callback_error(tmp_path, video):
+    def callback(info):
+        raise RuntimeError("Callback error")
+
+    with pytest.raises(RuntimeError):
+        video.extract_subtitles(
+            video.get_subtitles(), custom_dir=tmp_path, progress_callback=callback
+        )
+
+    assert not os.listdir(tmp_path)
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="procfs not available")
+def test_ffmpeg_call_terminates_process_group(tmp_path):
+    pid_file = tmp_path / "child.pid"
+    script = (
+        "import subprocess, sys, time; "
+        "child = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)']); "
+        f"open({str(pid_file)!r}, 'w').write(str(child.pid)); "
+        "print('started', file=sys.stderr, flush=True); time.sleep(60)"
+    )
+    token = CancellationToken()
+    threading.Timer(0.5, token.cancel).start()
+
+    start = time.monotonic()
+    with pytest.raises(ExtractionCancelled):
+        _ffmpeg_call([sys.executable, "-c", script], cancel=token)
+
+    assert time.monotonic() - start < 5
+    time.sleep(0.2)
+    assert not _is_running(int(pid_file.read_text()))
+
+
+def _is_running(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as file:
+            return file.read().split(")")[-1].split()[0] != "Z"  # Zombie
+    except FileNotFoundError:
+        return False
+
+
+def test_ffmpeg_call_raises_called_process_error():
+    with pytest.raises(subprocess.CalledProcessError):
+        _ffmpeg_call([sys.executable, "-c", "import sys; sys.exit(3)"])
+
+
 def test_get_subtitles_mp4(mp4_video):
     subtitles = mp4_video.get_subtitles()
     assert isinstance(subtitles, list)
@@ -115,7 +597,8 @@ def test_extract_subtitles_mp4(tmp_path, mp4_video, convert_format):
     subs = mp4_video.extract_subtitles(
         subtitles, custom_dir=tmp_path, convert_format=convert_format
     )
-    for path in subs.values():
+    for result in subs.values():
+        path = result.path
         assert os.path.isfile(path) is True
         assert path.endswith(f".{convert_format}")
         assert _is_text_sub_file_valid(path)
@@ -136,7 +619,8 @@ def test_subtitles_copy_mp4_w_fallback(tmp_path, mp4_video):
     subs = mp4_video.copy_subtitles(
         subtitles, custom_dir=tmp_path, fallback_to_convert=True
     )
-    for path in subs.values():
+    for result in subs.values():
+        path = result.path
         assert os.path.isfile(path) is True
         assert path.endswith(f".srt")
         assert _is_text_sub_file_valid(path)
@@ -145,3 +629,151 @@ def test_subtitles_copy_mp4_w_fallback(tmp_path, mp4_video):
 def _is_text_sub_file_valid(path):
     loaded = pysubs2.load(path)
     return len(loaded.events) > 0
+
+
+class _RangeHandler(http.server.SimpleHTTPRequestHandler):
+    "Serves tests/data with byte range support, like object storage."
+
+    ranges = []  # Range header of every request
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, directory=_DATA, **kwargs)
+
+    def do_GET(self):
+        path = self.translate_path(self.path)
+        try:
+            file = open(path, "rb")
+        except OSError:
+            self.send_error(404)
+            return
+
+        with file:
+            size = os.fstat(file.fileno()).st_size
+            start, end = 0, size - 1
+            match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+            if match:
+                start = int(match.group(1))
+                end = min(int(match.group(2) or end), end)
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+            else:
+                self.send_response(200)
+
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+
+            self.ranges.append(self.headers.get("Range"))
+            file.seek(start)
+            try:
+                self.wfile.write(file.read(end - start + 1))
+            except OSError:  # The client seeked elsewhere
+                pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _RangeHandler)
+    _RangeHandler.ranges = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+class _Pipe(io.RawIOBase):
+    "A non-seekable stream (e.g. stdin)."
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._file.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def test_url_source(http_server):
+    video = FFprobeVideoContainer(f"{http_server}/file_1.mkv")
+    assert not video.is_local
+    assert video.name == "file_1.mkv"
+    assert video.extension == "mkv"
+
+
+def test_extract_subtitles_url(tmp_path, http_server):
+    video = FFprobeVideoContainer(f"{http_server}/file_1.mkv")
+    subtitles = video.get_subtitles()
+    assert len(subtitles) == 2
+
+    results = video.extract_subtitles(subtitles, custom_dir=tmp_path)
+    for result in results.values():
+        assert result.ok
+        assert os.path.basename(result.path).startswith("file_1.")
+        _is_text_sub_file_valid(result.path)
+
+
+def test_get_subtitles_url_range_requests(http_server):
+    video = FFprobeVideoContainer(f"{http_server}/file_1.mkv")
+    assert video.get_subtitles()
+    assert _RangeHandler.ranges
+    assert all(value is not None for value in _RangeHandler.ranges)
+
+
+def test_get_subtitles_pipe_reads_head(monkeypatch):
+    monkeypatch.setattr(source, "FILE_HEAD_SIZE", 128 * 1024)
+    path = os.path.join(_DATA, "file.mp4")
+    with io.BufferedReader(_Pipe(path), buffer_size=4096) as pipe:
+        video = FFprobeVideoContainer(pipe)
+        assert video.get_subtitles()
+        assert pipe.raw._file.tell() < os.path.getsize(path)
+
+
+def test_extract_subtitles_url_default_dir(tmp_path, monkeypatch, http_server):
+    monkeypatch.chdir(tmp_path)
+    video = FFprobeVideoContainer(f"{http_server}/file_1.mkv")
+    results = video.extract_subtitles(video.get_subtitles()[:1])
+    assert results[0].path == str(tmp_path / "file_1.en.ass.srt")
+    assert results[0].ok
+
+
+def test_extract_subtitles_file_object(tmp_path):
+    with open(os.path.join(_DATA, "file_1.mkv"), "rb") as file:
+        video = FFprobeVideoContainer(file)
+        assert video.name == "file_1.mkv"
+
+        subtitles = video.get_subtitles()
+        results = video.copy_subtitles(subtitles, custom_dir=tmp_path)
+        # Seekable files can be read again
+        samples = video.sample_subtitles(subtitles, custom_dir=tmp_path)
+
+    for result in results.values():
+        _is_text_sub_file_valid(result.path)
+
+    assert len(samples[0]) == 3
+
+
+def test_extract_subtitles_pipe(tmp_path):
+    with io.BufferedReader(_Pipe(os.path.join(_DATA, "file_1.mkv"))) as pipe:
+        video = FFprobeVideoContainer(pipe)
+        subtitles = video.get_subtitles()
+        results = video.extract_subtitles(subtitles, custom_dir=tmp_path, validate=True)
+
+        for result in results.values():
+            assert os.path.basename(result.path).startswith("stdin.")
+            assert result.validation.ok
+            _is_text_sub_file_valid(result.path)
+
+        # Pipes are streamed once
+        with pytest.raises(InvalidSource):
+            video.extract_subtitles(subtitles, custom_dir=tmp_path)
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+
+import pytest
+
+from fese import decoding
+from fese.probe import ProbeResult
+from fese.stream import FFprobeClosedCaptionStream
+from fese.stream import FFprobeSubtitleStream
+
+_DOCUMENT = {
+    "streams": [
+        {
+            "index": 0,
+            "codec_name": "h264",
+            "codec_type": "video",
+            "r_frame_rate": "24000/1001",
+            "avg_frame_rate": "24000/1001",
+            "closed_captions": 0,
+        },
+        {
+            "index": 1,
+            "codec_name": "subrip",
+            "codec_type": "subtitle",
+            "r_frame_rate": "0/0",
+            "avg_frame_rate": "0/0",
+            "time_base": "1/1000",
+            "start_pts": 0,
+            "start_time": "0.000000",
+            "duration_ts": 1218718,
+            "duration": "1218.718000",
+            "disposition": {"default": 1, "forced": 0},
+            "tags": {"language": "spa", "title": "Latino", "NUMBER_OF_FRAMES": "12"},
+        },
+    ],
+    "format": {"filename": "file.mkv", "nb_streams": 2, "tags": {"title": "n/a"}},
+}
+
+_DECODERS = [
+    name
+    for name, module in (
+        ("json", json),
+        ("orjson", decoding.orjson),
+        ("msgspec", decoding.msgspec),
+    )
+    if module is not None
+]
+
+
+@pytest.fixture(params=_DECODERS)
+def decoder(request, monkeypatch):
+    monkeypatch.setattr(decoding, "DECODER", request.param)
+    return request.param
+
+
+def test_decode_probe(decoder):
+    result = decoding.decode_probe(json.dumps(_DOCUMENT).encode())
+    stream = FFprobeSubtitleStream(result["streams"][1])
+    assert result["streams"][0].get("codec_type") == "video"
+    assert stream.index == 1
+    assert stream.language.country == "MX"
+    assert stream.tags.frames == 12
+    assert stream.disposition.default is True
+
+
+def test_decode_probe_raises_key_error(decoder):
+    with pytest.raises((KeyError,) + decoding.DECODE_ERRORS):
+        decoding.decode_probe(b'{"format": {}}')
+
+
+def test_decode_probe_raises_decode_error(decoder):
+    with pytest.raises(decoding.DECODE_ERRORS):
+        decoding.decode_probe(b"{not json")
+
+
+def test_decode_probe_unexpected_types(decoder):
+    document = {"streams": [{"index": 1, "codec_name": "ass", "start_pts": "N/A"}]}
+    result = decoding.decode_probe(json.dumps(document).encode())
+    assert result["streams"][0]["start_pts"] == "N/A"
+
+
+def test_dumps_round_trip(decoder):
+    result = decoding.decode_probe(json.dumps(_DOCUMENT).encode())
+    data = json.loads(decoding.dumps(result))
+    assert data["streams"][1]["index"] == 1
+    # Unset fields of typed records are missing keys, not nulls
+    assert "start_time" not in data["streams"][0]
+    assert FFprobeSubtitleStream(data["streams"][1]).start_time.total_seconds() == 0
+
+
+@pytest.fixture(params=[0, 1024**2], ids=["split", "buffered"])
+def buffer_size(request, monkeypatch):
+    monkeypatch.setattr(decoding, "BUFFER_SIZE", request.param)
+    return request.param
+
+
+def _decode_stream(data, chunk_size=None, stream_types=None):
+    chunks = [data]
+    if chunk_size:
+        chunks = [data[i : i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+    class _File:
+        def read(self, size):
+            return chunks.pop(0) if chunks else b""
+
+    return decoding.decode_probe_stream(_File(), stream_types)
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 7])
+def test_decode_probe_stream(decoder, buffer_size, chunk_size):
+    data = json.dumps(_DOCUMENT, indent=2).encode()
+    result = _decode_stream(data, chunk_size)
+    expected = json.loads(decoding.dumps(decoding.decode_probe(data)))
+    assert json.loads(decoding.dumps(result["streams"])) == expected["streams"]
+    assert result["format"] == expected["format"]
+    assert FFprobeSubtitleStream(result["streams"][1]).language.country == "MX"
+
+
+def test_decode_probe_keeps_chapters_and_captions(decoder, buffer_size):
+    document = json.loads(json.dumps(_DOCUMENT))
+    document["chapters"] = [{"id": 0, "tags": {"title": "Intro"}}]
+    document["streams"][0]["closed_captions"] = 1
+    for result in (
+        decoding.decode_probe(json.dumps(document).encode()),
+        _decode_stream(json.dumps(document).encode(), 5),
+    ):
+        assert result["streams"][0].get("closed_captions") == 1
+        assert result["chapters"][0]["tags"]["title"] == "Intro"
+
+
+def test_decode_probe_closed_captions(decoder):
+    document = json.loads(json.dumps(_DOCUMENT))
+    document["streams"][0].update(
+        closed_captions=1, width=720, height=480, bit_rate="2000000"
+    )
+    result = ProbeResult(decoding.decode_probe(json.dumps(document).encode()))
+    assert [type(sub) for sub in result.subtitles] == [
+        FFprobeSubtitleStream,
+        FFprobeClosedCaptionStream,
+    ]
+    video = result.video[0]
+    assert (video.width, video.height, video.bit_rate) == (720, 480, 2000000)
+
+
+@pytest.mark.parametrize("chunk_size", [None, 3, 64])
+@pytest.mark.parametrize("value", ["x" * 500, "é" * 500, '\\"' * 500, " " * 500])
+def test_decode_probe_stream_truncates_strings(monkeypatch, decoder, chunk_size, value):
+    monkeypatch.setattr(decoding, "MAX_TAG_SIZE", 100)
+    monkeypatch.setattr(decoding, "BUFFER_SIZE", 0)
+    document = {"streams": [{"index": 0, "tags": {"title": value, "language": "e"}}]}
+    data = json.dumps(document).encode()
+    tags = _decode_stream(data, chunk_size)["streams"][0]["tags"]
+    assert value.startswith(tags["title"])
+    assert 90 <= len(json.dumps(tags["title"])) <= 102
+    assert tags["language"] == "e"
+
+
+def test_decode_probe_stream_drops_streams(monkeypatch, decoder, buffer_size, caplog):
+    monkeypatch.setattr(decoding, "MAX_STREAMS", 10)
+    document = {"streams": [{"index": index} for index in range(100)]}
+    result = _decode_stream(json.dumps(document).encode(), 16)
+    assert [stream["index"] for stream in result["streams"]] == list(range(10))
+    assert "Dropped 90 streams" in caplog.text
+
+
+def test_decode_probe_stream_drops_big_elements(monkeypatch, decoder):
+    monkeypatch.setattr(decoding, "MAX_ELEMENT_SIZE", 200)
+    monkeypatch.setattr(decoding, "BUFFER_SIZE", 0)
+    document = {
+        "streams": [
+            {"index": 0, "tags": {str(key): "x" for key in range(100)}},
+            {"index": 1, "tags": {"nested": [[1, 2], {"a": "]"}]}},
+        ],
+        "format": {"tags": {str(key): "x" for key in range(100)}},
+    }
+    result = _decode_stream(json.dumps(document).encode(), 32)
+    assert [stream["index"] for stream in result["streams"]] == [1]
+    assert result["streams"][0]["tags"]["nested"] == [[1, 2], {"a": "]"}]
+    assert "format" not in result
+
+
+def test_decode_probe_stream_filters_stream_types(decoder, buffer_size):
+    result = _decode_stream(json.dumps(_DOCUMENT).encode(), 8, ("subtitle",))
+    assert [stream["index"] for stream in result["streams"]] == [1]
+
+
+def test_decode_probe_stream_empty_streams(decoder, buffer_size):
+    assert _decode_stream(b'{"streams": [], "format": {}}')["streams"] == []
+
+
+def test_decode_probe_stream_raises_key_error(decoder, buffer_size):
+    with pytest.raises(KeyError):
+        _decode_stream(b'{"format": {}}')
+
+
+@pytest.mark.parametrize("data", [b'{"streams": [{"index": 0', b'{"streams": ["abc'])
+def test_decode_probe_stream_raises_decode_error(decoder, buffer_size, data):
+    with pytest.raises(decoding.DECODE_ERRORS):
+        _decode_stream(data)
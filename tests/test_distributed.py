@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import threading
+import time
+
+import pytest
+
+from fese import backends
+from fese import container
+from fese import decoding
+from fese import distributed
+from fese.cancel import CancellationToken
+from fese.distributed import Coordinator
+from fese.distributed import FileResultStore
+from fese.distributed import RedisQueue
+from fese.distributed import RedisResultStore
+from fese.distributed import SQLiteQueue
+from fese.distributed import Worker
+from fese.result import CONVERT
+from fese.result import ExtractionResult
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+_DATA = os.path.join(os.path.abspath(os.path.dirname(__file__)), "data")
+
+requires_pyav = pytest.mark.skipif(backends.av is None, reason="PyAV not installed")
+requires_ffprobe = pytest.mark.skipif(
+    shutil.which(container.FFPROBE_PATH) is None, reason="FFprobe not found"
+)
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def queue(request, tmp_path):
+    if request.param == "sqlite":
+        queue = SQLiteQueue(tmp_path / "queue.db", retry_delay=0)
+    elif fakeredis is None:
+        pytest.skip("fakeredis not installed")
+    else:
+        queue = RedisQueue(fakeredis.FakeRedis(), retry_delay=0)
+
+    yield queue
+    queue.close()
+
+
+@pytest.fixture
+def media(tmp_path):
+    path = tmp_path / "media" / "movie.mkv"
+    path.parent.mkdir()
+    shutil.copy(os.path.join(_DATA, "file_1.mkv"), path)
+    return str(path)
+
+
+def test_put_is_idempotent(queue):
+    assert queue.put("a", "/a.mkv", {"method": "copy"})
+    assert not queue.put("a", "/a.mkv", {"method": "copy"})
+    assert queue.counts() == {"pending": 1, "running": 0, "done": 0, "failed": 0}
+
+
+def test_claim_complete(queue):
+    queue.put("a", "/a.mkv", {"streams": [2]})
+    job = queue.claim("worker-1")
+    assert job.id == "a" and job.path == "/a.mkv" and job.plan == {"streams": [2]}
+    assert job.attempts == 1
+    assert queue.claim("worker-2") is None
+
+    assert queue.heartbeat(job)
+    assert queue.complete(job)
+    assert queue.get("a")["state"] == "done"
+    assert queue.claim("worker-2") is None
+    assert queue.counts()["done"] == 1
+
+
+def test_claims_are_fifo(queue):
+    for job_id in ("a", "b", "c"):
+        queue.put(job_id, f"/{job_id}.mkv", {})
+        time.sleep(0.01)
+
+    assert [queue.claim("worker").id for _ in range(3)] == ["a", "b", "c"]
+
+
+def test_expired_lease_is_claimed_again(queue):
+    queue.put("a", "/a.mkv", {})
+    job = queue.claim("worker-1", lease=0.05)
+    time.sleep(0.1)
+
+    claimed = queue.claim("worker-2")
+    assert claimed.id == "a"
+    assert claimed.attempts == 2
+    # The first claim was lost
+    assert not queue.heartbeat(job)
+    assert not queue.complete(job)
+    assert queue.complete(claimed)
+    assert queue.get("a") == {
+        "state": "done",
+        "attempts": 2,
+        "worker": "worker-2",
+        "error": None,
+    }
+
+
+def test_fail_retries_until_max_attempts(queue):
+    queue.put("a", "/a.mkv", {})
+    for attempt in range(1, queue.max_attempts + 1):
+        job = queue.claim("worker")
+        assert job.attempts == attempt
+        assert queue.fail(job, "ffmpeg crashed")
+
+    assert queue.claim("worker") is None
+    assert queue.get("a")["state"] == "failed"
+    assert queue.get("a")["error"] == "ffmpeg crashed"
+    assert queue.counts() == {"pending": 0, "running": 0, "done": 0, "failed": 1}
+
+
+def test_fail_backoff(queue):
+    queue.retry_delay = 60
+    queue.put("a", "/a.mkv", {})
+    queue.fail(queue.claim("worker"), "ffmpeg crashed")
+    assert queue.get("a")["state"] == "pending"
+    assert queue.claim("worker") is None
+
+
+def test_fail_without_retry(queue):
+    queue.put("a", "/a.mkv", {})
+    assert queue.fail(queue.claim("worker"), "invalid source", retry=False)
+    assert queue.get("a")["state"] == "failed"
+
+
+def test_last_expired_lease_fails(queue):
+    queue.max_attempts = 1
+    queue.put("a", "/a.mkv", {})
+    queue.claim("worker", lease=0.01)
+    time.sleep(0.05)
+
+    assert queue.claim("worker") is None
+    assert queue.get("a")["error"] == "lease expired"
+    assert queue.counts()["failed"] == 1
+
+
+def test_concurrent_claims(tmp_path):
+    path = tmp_path / "queue.db"
+    queue = SQLiteQueue(path)
+    for index in range(50):
+        queue.put(str(index), f"/{index}.mkv", {})
+
+    claimed = []
+
+    def claim_all():
+        # Every thread (like every process) opens its own connection
+        worker_queue = SQLiteQueue(path)
+        while True:
+            job = worker_queue.claim(threading.current_thread().name)
+            if job is None:
+                break
+            claimed.append(job.id)
+            worker_queue.complete(job)
+        worker_queue.close()
+
+    threads = [threading.Thread(target=claim_all) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(claimed, key=int) == [str(index) for index in range(50)]
+    assert queue.counts()["done"] == 50
+
+
+def test_file_result_store(tmp_path):
+    store = FileResultStore(tmp_path / "results")
+    assert store.get("a") is None
+
+    store.put("a", {"status": "error"})
+    store.put("a", {"status": "ok"})
+    assert store.get("a") == {"status": "ok"}
+    assert list(store) == ["a"]
+    assert os.listdir(store.directory) == ["a.json"]
+
+
+@pytest.mark.skipif(fakeredis is None, reason="fakeredis not installed")
+def test_redis_result_store():
+    store = RedisResultStore(fakeredis.FakeRedis())
+    store.put("a", {"status": "ok"})
+    assert store.get("a") == {"status": "ok"}
+    assert list(store) == ["a"]
+
+
+@requires_pyav
+def test_coordinator_worker(queue, media, tmp_path):
+    backend = backends.PyAVBackend()
+    coordinator = Coordinator(queue, backend=backend)
+    custom_dir = str(tmp_path / "subs")
+
+    job_id = coordinator.submit(
+        media, "copy", selector="en default", custom_dir=custom_dir
+    )
+    assert (
+        coordinator.submit(media, "copy", selector="en default", custom_dir=custom_dir)
+        == job_id
+    )
+    assert coordinator.submit(media, "copy", custom_dir=custom_dir) != job_id
+    assert coordinator.submit(media, "copy", selector="ja") is None
+    assert queue.counts()["pending"] == 2
+
+    store = FileResultStore(tmp_path / "results")
+    worker = Worker(queue, store, name="node-1")
+    assert worker.run(until_empty=True) == 2
+    assert queue.counts()["done"] == 2
+
+    record = store.get(job_id)
+    assert record["status"] == "ok"
+    assert record["worker"] == "node-1"
+    assert record["attempt"] == 1
+    assert len(record["outputs"]) == 1
+    for output in record["outputs"].values():
+        assert output["ok"]
+        assert os.path.isfile(output["path"])
+
+
+def _run_embedded_probe_job(queue, media, tmp_path, backend=None):
+    coordinator = Coordinator(queue, backend=backend)
+    job_id = coordinator.submit(media, "extract", custom_dir=str(tmp_path / "subs"))
+
+    store = FileResultStore(tmp_path / "results")
+    assert Worker(queue, store).run(until_empty=True) == 1
+    record = store.get(job_id)
+    assert record["status"] == "ok"
+    assert all(output["ok"] for output in record["outputs"].values())
+
+
+@requires_ffprobe
+def test_embedded_probe_default_backend(queue, media, tmp_path):
+    _run_embedded_probe_job(queue, media, tmp_path)
+
+
+class _RecordBackend(backends.ProbeBackend):
+    "Returns typed records, as FFprobeBackend does with msgspec installed."
+
+    name = "records"
+
+    def probe(self, path, timeout=600):
+        data = backends.PyAVBackend().probe(path, timeout)
+        return decoding.decode_probe(decoding.dumps(data))
+
+
+@requires_pyav
+@pytest.mark.skipif(decoding.msgspec is None, reason="msgspec not installed")
+def test_embedded_probe_records(queue, media, tmp_path, monkeypatch):
+    monkeypatch.setattr(decoding, "DECODER", "msgspec")
+    _run_embedded_probe_job(queue, media, tmp_path, _RecordBackend())
+
+
+@requires_pyav
+def test_worker_probes_without_embedded_probe(queue, media, tmp_path):
+    coordinator = Coordinator(queue, backend=backends.PyAVBackend(), embed_probe=False)
+    job_id = coordinator.submit(media, custom_dir=str(tmp_path / "subs"))
+
+    store = FileResultStore(tmp_path / "results")
+    Worker(queue, store, backend=backends.PyAVBackend()).run(until_empty=True)
+    assert store.get(job_id)["status"] == "ok"
+
+
+@requires_pyav
+def test_changed_source_fails_without_retry(queue, media, tmp_path):
+    job_id = Coordinator(queue, backend=backends.PyAVBackend()).submit(media)
+    with open(media, "ab") as file:
+        file.write(b"\0")
+
+    store = FileResultStore(tmp_path / "results")
+    assert Worker(queue, store).run(until_empty=True) == 1
+    assert "changed" in store.get(job_id)["error"]
+    assert queue.get(job_id) == {
+        "state": "failed",
+        "attempts": 1,
+        "worker": Worker(queue, store).name,
+        "error": store.get(job_id)["error"],
+    }
+
+
+@requires_pyav
+def test_failed_extraction_is_retried(queue, media, tmp_path, monkeypatch):
+    job_id = Coordinator(queue, backend=backends.PyAVBackend()).submit(
+        media, custom_dir=str(tmp_path / "subs")
+    )
+
+    def crash(*args, **kwargs):
+        raise OSError("No space left on device")
+
+    store = FileResultStore(tmp_path / "results")
+    with monkeypatch.context() as patch:
+        patch.setattr("fese.container.FFprobeVideoContainer.extract_subtitles", crash)
+        Worker(queue, store).run_once()
+
+    assert store.get(job_id)["status"] == "error"
+    assert queue.get(job_id)["state"] == "pending"
+
+    Worker(queue, store).run(until_empty=True)
+    assert store.get(job_id)["status"] == "ok"
+    assert store.get(job_id)["attempt"] == 2
+
+
+@requires_pyav
+def test_failed_streams_are_retried(queue, media, tmp_path, monkeypatch):
+    job_id = Coordinator(queue, backend=backends.PyAVBackend()).submit(
+        media, custom_dir=str(tmp_path / "subs")
+    )
+
+    def extract_subtitles(video, subtitles, **kwargs):
+        results = {}
+        for subtitle in subtitles:
+            results[subtitle.index] = ExtractionResult(
+                subtitle.index, "out.srt", CONVERT
+            )
+            results[subtitle.index].elapsed = 1.0
+        results[subtitles[0].index].error = "not extracted"
+        return results
+
+    store = FileResultStore(tmp_path / "results")
+    with monkeypatch.context() as patch:
+        patch.setattr(
+            "fese.container.FFprobeVideoContainer.extract_subtitles",
+            extract_subtitles,
+        )
+        Worker(queue, store).run_once()
+
+    record = store.get(job_id)
+    assert record["status"] in ("partial", "error")
+    assert "not extracted" in record["error"]
+    assert queue.get(job_id)["state"] == "pending"
+
+    Worker(queue, store).run(until_empty=True)
+    assert store.get(job_id)["status"] == "ok"
+
+
+def test_submit_invalid_options_raises_value_error(queue, media):
+    coordinator = Coordinator(queue)
+    with pytest.raises(ValueError):
+        coordinator.submit(media, "convert")
+
+    with pytest.raises(ValueError):
+        coordinator.submit(media, unknown_option=True)
+
+    with pytest.raises(ValueError):
+        coordinator.submit(media, progress_callback=print)
+
+
+def test_lost_claim_cancels_extraction(queue):
+    queue.put("a", "/a.mkv", {})
+    job = queue.claim("worker")
+    queue.complete(job)  # e.g. claimed and completed by another worker
+
+    worker = Worker(queue, None, lease=0.03)
+    cancel, lost = CancellationToken(), threading.Event()
+    worker._heartbeat(job, cancel, lost)
+    assert lost.is_set()
+    assert cancel.cancelled
+
+
+def test_redis_queue_requires_redis(monkeypatch):
+    monkeypatch.setattr(distributed, "redis", None)
+    with pytest.raises(ImportError):
+        RedisQueue()
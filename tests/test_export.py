@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from fese import export
+from fese.stream import FFprobeSubtitleStream
+
+requires_arrow = pytest.mark.skipif(export.pyarrow is None, reason="no pyarrow")
+requires_numpy = pytest.mark.skipif(export.numpy is None, reason="no numpy")
+
+
+@pytest.fixture
+def subtitles():
+    return [
+        FFprobeSubtitleStream(
+            {
+                "index": 2,
+                "codec_name": "subrip",
+                "disposition": {"default": 1},
+                "tags": {
+                    "language": "spa",
+                    "title": "Latino Forced",
+                    "BPS-eng": "28",
+                    "DURATION-eng": "01:31:19.587000000",
+                    "NUMBER_OF_FRAMES-eng": "545",
+                    "NUMBER_OF_BYTES-eng": "19218",
+                },
+            }
+        ),
+        FFprobeSubtitleStream(
+            {
+                "index": 3,
+                "codec_name": "hdmv_pgs_subtitle",
+                "duration": "12.5",
+                "tags": {"language": "eng"},
+            }
+        ),
+    ]
+
+
+def test_stream_row(subtitles):
+    row = dict(
+        zip([name for name, _ in export.COLUMNS], export.stream_row("a", subtitles[0]))
+    )
+    assert row["language"] == "spa"
+    assert row["country"] == "MX"
+    assert row["frames"] == 545
+    assert row["bytes"] == 19218
+    assert row["bps"] == 28
+    assert row["duration"] == pytest.approx(5479.587)
+
+    flags = [
+        name
+        for bit, name in enumerate(export.DISPOSITION_FLAGS)
+        if row["disposition"] & (1 << bit)
+    ]
+    assert flags == ["default", "forced"]
+
+
+@requires_arrow
+def test_to_columns_arrow(subtitles):
+    table = export.to_columns(
+        [export.stream_row("a", sub) for sub in subtitles], "arrow"
+    )
+    assert table.num_rows == 2
+    assert table.column("duration").to_pylist()[1] == 12.5
+
+
+@requires_numpy
+def test_to_columns_numpy(subtitles):
+    array = export.to_columns(
+        [export.stream_row("a", sub) for sub in subtitles], "numpy"
+    )
+    assert array["index"].tolist() == [2, 3]
+    assert array["type"].tolist() == ["text", "bitmap"]
+
+
+def test_to_columns_raises_value_error():
+    with pytest.raises(ValueError):
+        export.to_columns([], "csv")
+
+
+@requires_arrow
+def test_columnar_writer_parquet(tmp_path, subtitles):
+    path = str(tmp_path / "library.parquet")
+    with export.ColumnarWriter(path, batch_size=3) as writer:
+        for num in range(5):
+            writer.add(f"{num}.mkv", subtitles)
+
+    table = export.pyarrow.parquet.read_table(path)
+    assert writer.rows_written == table.num_rows == 10
+    assert export.pyarrow.parquet.ParquetFile(path).num_row_groups == 3
+
+
+@requires_numpy
+def test_columnar_writer_numpy(tmp_path, subtitles):
+    path = str(tmp_path / "library.npy")
+    with export.ColumnarWriter(path, batch_size=4, kind="numpy") as writer:
+        for num in range(5):
+            writer.add(f"{num}.mkv", subtitles)
+
+    batches = list(export.read_numpy_batches(path))
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert batches[-1]["path"].tolist() == ["4.mkv", "4.mkv"]
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import multiprocessing
+import os
+import struct
+
+import pytest
+
+from fese import fonts
+from fese.fonts import ass_fonts
+from fese.fonts import font_names
+from fese.fonts import FontStore
+
+_ASS = """[Script Info]
+ScriptType: v4.00+
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Myriad Pro,44,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,3,0,2,50,50,30,1
+Style: Vertical,@Gothic,44,&H00FFFFFF,&H000000FF,&H00000000,&H00000000,0,0,0,0,100,100,0,0,1,3,0,2,50,50,30,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+Dialogue: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,{\\fnTahoma\\fs20}Sign
+"""
+
+
+def _font(*names, platform=3):
+    "Builds a minimal sfnt with a name table."
+    encoding = "utf-16-be" if platform == 3 else "mac_roman"
+    strings = [name.encode(encoding) for name in names]
+    records, offset = b"", 0
+    for name_id, string in zip((1, 4, 6), strings):
+        records += struct.pack(">HHHHHH", platform, 1, 0, name_id, len(string), offset)
+        offset += len(string)
+
+    table = struct.pack(">HHH", 0, len(strings), 6 + len(records)) + records
+    table += b"".join(strings)
+    header = struct.pack(">IHHHH", 0x00010000, 1, 16, 0, 0)
+    record = struct.pack(">4sIII", b"name", 0, 12 + 16, len(table))
+    return header + record + table
+
+
+def _collection(*fonts):
+    offsets, data = [], b""
+    base = 12 + 4 * len(fonts)
+    for font in fonts:
+        offsets.append(base + len(data))
+        data += font
+
+    # Table offsets are relative to the start of the file in collections
+    rebased = b""
+    for offset, font in zip(offsets, fonts):
+        table_offset = struct.unpack_from(">I", font, 12 + 8)[0]
+        font = bytearray(font)
+        struct.pack_into(">I", font, 12 + 8, table_offset + offset)
+        rebased += bytes(font)
+
+    header = struct.pack(">4sHHI", b"ttcf", 1, 0, len(fonts))
+    return header + struct.pack(f">{len(fonts)}I", *offsets) + rebased
+
+
+def test_font_names():
+    assert font_names(_font("Myriad Pro", "Myriad Pro Regular", "MyriadPro")) == {
+        "Myriad Pro",
+        "Myriad Pro Regular",
+        "MyriadPro",
+    }
+    assert font_names(_font("Tahoma", platform=1)) == {"Tahoma"}
+
+
+def test_font_names_collection():
+    data = _collection(_font("Gothic"), _font("Mincho"))
+    assert font_names(data) == {"Gothic", "Mincho"}
+
+
+def test_font_names_invalid_data():
+    assert font_names(b"") == set()
+    assert font_names(b"\x00\x01\x00\x00\x00\x05") == set()
+
+
+def test_ass_fonts(tmp_path):
+    path = tmp_path / "sub.ass"
+    path.write_text(_ASS)
+    assert ass_fonts(str(path)) == {"Myriad Pro", "Gothic", "Tahoma"}
+
+
+def _dump(directory, name, data):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as file:
+        file.write(data)
+    return path
+
+
+def test_font_store_collect(tmp_path):
+    subtitle = tmp_path / "sub.ass"
+    subtitle.write_text(_ASS)
+    store = FontStore(str(tmp_path / "fonts"))
+
+    for _ in range(2):
+        dump_dir = store.temp_dir()
+        dumped = {
+            _dump(dump_dir, "1.ttf", _font("Tahoma")): "tahoma.ttf",
+            _dump(dump_dir, "2.otf", _font("Unused")): "unused.otf",
+        }
+        fonts = store.collect([str(subtitle)], dumped)[str(subtitle)]
+
+    assert len(fonts) == 1
+    assert fonts[0].endswith(".ttf")
+    with open(fonts[0], "rb") as file:
+        assert font_names(file.read()) == {"Tahoma"}
+
+    assert store.fonts_for(str(subtitle)) == fonts
+
+    with open(store.index_path) as file:
+        index = json.load(file)
+
+    (entry,) = index["fonts"].values()
+    assert entry["names"] == ["tahoma"]
+    assert entry["filenames"] == ["tahoma.ttf"]
+
+
+def _collect(root, subtitle):
+    store = FontStore(root)
+    for number in range(10):
+        dump_dir = store.temp_dir()
+        dumped = {_dump(dump_dir, "1.ttf", _font("Tahoma")): f"{number}.ttf"}
+        store.collect([subtitle], dumped)
+
+
+@pytest.mark.skipif(fonts.fcntl is None, reason="File locks not available")
+def test_font_store_shared_by_processes(tmp_path):
+    root = str(tmp_path / "fonts")
+    subtitles = []
+    for number in range(4):
+        subtitle = tmp_path / f"sub{number}.ass"
+        subtitle.write_text(_ASS)
+        subtitles.append(str(subtitle))
+
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(target=_collect, args=(root, subtitle))
+        for subtitle in subtitles
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert all(process.exitcode == 0 for process in processes)
+    with open(os.path.join(root, "index.json")) as file:
+        index = json.load(file)
+
+    assert sorted(index["subtitles"]) == subtitles
+    (entry,) = index["fonts"].values()
+    assert len(entry["filenames"]) == 10
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from fese import instrument
+from fese.stream import FFprobeSubtitleStream
+
+
+@pytest.fixture
+def stats():
+    stats_ = instrument.PhaseStats()
+    instrument.add_hook(stats_)
+    yield stats_
+    instrument.remove_hook(stats_)
+
+
+def test_span_disabled_returns_null_span():
+    assert instrument.span("probe") is instrument._NULL_SPAN
+
+
+def test_span_hook_receives_span():
+    spans = []
+    instrument.add_hook(spans.append)
+    try:
+        with instrument.span("probe", path="file.mkv") as span:
+            span.set(streams=2)
+    finally:
+        instrument.remove_hook(spans.append)
+
+    assert spans[0].name == "probe"
+    assert spans[0].attributes == {"path": "file.mkv", "streams": 2}
+    assert spans[0].duration >= 0
+
+
+def test_span_records_errors(stats):
+    with pytest.raises(ValueError):
+        with instrument.span("ffmpeg"):
+            raise ValueError
+
+    assert stats.summary()["ffmpeg"]["errors"] == 1
+
+
+def test_broken_hook_is_ignored():
+    def hook(span):
+        raise RuntimeError
+
+    instrument.add_hook(hook)
+    try:
+        with instrument.span("probe"):
+            pass
+    finally:
+        instrument.remove_hook(hook)
+
+
+def test_phase_stats_stream_phases(stats):
+    for _ in range(3):
+        FFprobeSubtitleStream(
+            {"codec_name": "ass", "index": 1, "tags": {"language": "eng"}}
+        )
+
+    summary = stats.summary()
+    for phase in ("stream.init", "stream.tags", "stream.disposition"):
+        assert summary[phase]["count"] == 3
+        assert sum(summary[phase]["buckets"]) == 3
+        assert summary[phase]["min"] <= summary[phase]["mean"] <= summary[phase]["max"]
+
+    stats.reset()
+    assert not stats.summary()
+
+
+def test_opentelemetry_hook():
+    class _OTelSpan:
+        def __init__(self, name, start_time, attributes):
+            self.name, self.start_time, self.attributes = name, start_time, attributes
+
+        def set_attribute(self, key, value):
+            self.attributes[key] = value
+
+        def end(self, end_time):
+            self.end_time = end_time
+
+    class _Tracer:
+        spans = []
+
+        def start_span(self, name, start_time, attributes):
+            self.spans.append(_OTelSpan(name, start_time, attributes))
+            return self.spans[-1]
+
+    tracer = _Tracer()
+    hook = instrument.OpenTelemetryHook(tracer)
+    instrument.add_hook(hook)
+    try:
+        with instrument.span("probe", path="file.mkv"):
+            pass
+    finally:
+        instrument.remove_hook(hook)
+
+    assert tracer.spans[0].name == "fese.probe"
+    assert tracer.spans[0].end_time >= tracer.spans[0].start_time
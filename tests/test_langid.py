@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+
+from babelfish import Language
+import pytest
+
+from fese import langid
+from fese.container import FFprobeVideoContainer
+from fese.stream import FFprobeSubtitleStream
+
+_DATA = os.path.join(os.path.abspath(os.path.dirname(__file__)), "data")
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        (
+            "Get out of here before they find you. I can't believe she said that to "
+            "him. We are going to need a bigger boat.",
+            "eng",
+        ),
+        (
+            "Sal de aquí antes de que te encuentren. No puedo creer que ella le "
+            "dijera eso. Vamos a necesitar un barco más grande.",
+            "spa",
+        ),
+        (
+            "Sai daqui antes que eles te encontrem. Não acredito que ela disse isso "
+            "para ele. Vamos precisar de um barco maior.",
+            "por",
+        ),
+        (
+            "Verschwinde, bevor sie dich finden. Ich kann nicht glauben, dass sie das "
+            "zu ihm gesagt hat. Wir brauchen ein größeres Boot.",
+            "deu",
+        ),
+        (
+            "Уходи отсюда, пока они тебя не нашли. Не могу поверить, что она ему это "
+            "сказала. Нам понадобится лодка побольше.",
+            "rus",
+        ),
+        (
+            "ここから出て行け、見つかる前に。彼女が彼にそんなことを言ったなんて信じられない。"
+            "もっと大きな船が必要だ。急いで、時間がないんだよ。",
+            "jpn",
+        ),
+    ],
+)
+def test_detect(text, expected):
+    detection = langid.detect(text)
+    assert detection.language.alpha3 == expected
+    assert detection.confidence >= langid.MIN_CONFIDENCE
+
+
+def test_detect_short_text():
+    assert langid.detect("Hello!") is None
+
+
+def test_subtitle_text(tmp_path):
+    path = tmp_path / "sub.srt"
+    path.write_text(
+        "1\n00:00:01,000 --> 00:00:02,000\n<i>Hello</i> {\\an8}there\n\n"
+        "2\n00:00:03,000 --> 00:00:04,000\nGeneral Kenobi\n"
+    )
+    assert langid.subtitle_text(str(path)) == "Hello there\nGeneral Kenobi"
+
+
+def _subtitle(language):
+    return FFprobeSubtitleStream(
+        {
+            "index": 0,
+            "codec_name": "ass",
+            "tags": {"language": language, "DURATION": "00:20:07.790000000"},
+        }
+    )
+
+
+@pytest.fixture
+def video():
+    return FFprobeVideoContainer(os.path.join(_DATA, "file_1.mkv"))
+
+
+def test_verify_languages_corrects_tag(video):
+    subtitle = _subtitle("spa")
+    detections = langid.verify_languages(video, [subtitle], sample_seconds=120)
+
+    assert detections[0].language == Language("eng")
+    assert subtitle.language == Language("eng")
+    assert subtitle.tags.language_confidence == detections[0].confidence
+
+
+def test_verify_languages_confirms_tag(video):
+    subtitle = _subtitle("eng")
+    subtitle.language = Language("eng", "GB")
+    langid.verify_languages(video, [subtitle], sample_seconds=120)
+
+    assert subtitle.language == Language("eng", "GB")
+    assert subtitle.tags.language_confidence > 0
+
+
+def test_verify_languages_keeps_unconfident_tag(video):
+    subtitle = _subtitle("spa")
+    langid.verify_languages(video, [subtitle], sample_seconds=120, min_confidence=1)
+
+    assert subtitle.language == Language("spa")
+    assert subtitle.tags.language_confidence == 0.0
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import contextlib
+import shutil
+import threading
+import time
+
+import pytest
+
+from fese import policy
+
+_COMMAND = ["ffmpeg", "-y", "-i", "in.mkv", "-map", "0:2", "out.srt"]
+
+
+def test_wrap_noop():
+    assert policy.ExecutionPolicy().wrap(_COMMAND) == _COMMAND
+
+
+@pytest.mark.skipif(
+    not all(shutil.which(tool) for tool in ("taskset", "ionice", "nice", "prlimit")),
+    reason="util-linux not installed",
+)
+def test_wrap():
+    execution_policy = policy.ExecutionPolicy(
+        nice=10,
+        ionice_class="best-effort",
+        ionice_level=7,
+        memory_limit=2 * 1024**3,
+        cpus=[0, 1],
+        threads=1,
+    )
+    command = execution_policy.wrap(_COMMAND)
+    prefix = command[: command.index("ffmpeg")]
+
+    assert command[len(prefix) :] == [
+        "ffmpeg",
+        "-y",
+        "-threads",
+        "1",
+        "-i",
+        "in.mkv",
+        "-map",
+        "0:2",
+        "out.srt",
+    ]
+    assert prefix == [
+        shutil.which("taskset"),
+        "-c",
+        "0,1",
+        shutil.which("ionice"),
+        "-c",
+        "2",
+        "-n",
+        "7",
+        shutil.which("nice"),
+        "-n",
+        "10",
+        shutil.which("prlimit"),
+        f"--as={2 * 1024**3}",
+        "--",
+    ]
+
+
+def test_wrap_missing_tool(monkeypatch):
+    monkeypatch.setattr(policy.shutil, "which", lambda name: None)
+    assert policy.ExecutionPolicy(nice=10).wrap(_COMMAND) == _COMMAND
+
+
+def test_invalid_ionice_class():
+    with pytest.raises(ValueError):
+        policy.ExecutionPolicy(ionice_class="low")
+
+
+def test_token_bucket():
+    bucket = policy.TokenBucket(rate=100, capacity=10)
+    start = time.monotonic()
+    assert bucket.consume(30)  # Admitted in debt
+    assert bucket.consume(10)  # Waits ~0.2s for the debt
+    assert 0.15 < time.monotonic() - start < 1
+    assert not bucket.consume(10, timeout=0.01)
+
+
+def test_limiter_max_processes():
+    limiter = policy.Limiter(max_processes=2)
+    running, peak = [], []
+    lock = threading.Lock()
+
+    def work():
+        with limiter.acquire():
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.05)
+            with lock:
+                running.pop()
+
+    threads = [threading.Thread(target=work) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert max(peak) == 2
+
+
+def test_limiter_throttled_calls_dont_hold_slots():
+    limiter = policy.Limiter(max_processes=1, read_rate=100)
+    limiter._bucket.consume(100)  # In debt for a second
+    admitted = threading.Event()
+
+    def throttled():
+        with limiter.acquire(100):
+            pass
+
+    thread = threading.Thread(target=throttled)
+    thread.start()
+    time.sleep(0.05)
+
+    def ready():
+        with limiter.acquire():
+            admitted.set()
+
+    threading.Thread(target=ready).start()
+    assert admitted.wait(0.5)
+    thread.join()
+
+
+def test_limiter_meter():
+    limiter = policy.Limiter(read_rate=1000, burst=10)
+    start = time.monotonic()
+    assert list(limiter.meter([b"x" * 100] * 3)) == [b"x" * 100] * 3
+    assert 0.15 < time.monotonic() - start < 1
+
+
+def test_acquire_read_bytes(monkeypatch, tmp_path):
+    charged = []
+    limiter = policy.Limiter()
+    monkeypatch.setattr(
+        limiter, "acquire", lambda read_bytes: _charge(charged, read_bytes)
+    )
+    path = tmp_path / "in.mkv"
+    path.write_bytes(b"x" * 100)
+    execution = policy.ExecutionPolicy(limiter=limiter)
+
+    for read_bytes in (None, 10):
+        with execution.acquire(["ffmpeg", "-i", str(path)], read_bytes):
+            pass
+    assert charged == [100, 10]
+
+
+@contextlib.contextmanager
+def _charge(charged, read_bytes):
+    charged.append(read_bytes)
+    yield
+
+
+def test_input_bytes(tmp_path):
+    path = tmp_path / "in.mkv"
+    path.write_bytes(b"x" * 100)
+    command = ["ffmpeg", "-i", str(path), "-i", str(path), "-i", "missing.mkv"]
+    assert policy._input_bytes(command) == 100
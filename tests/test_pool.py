@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+from fese import backends
+from fese.container import FFprobeVideoContainer
+from fese.exceptions import InvalidSource
+from fese.exceptions import WorkerPoolError
+from fese.pool import FFprobeWorkerPool
+
+_DATA = os.path.join(os.path.abspath(os.path.dirname(__file__)), "data")
+
+requires_pyav = pytest.mark.skipif(backends.av is None, reason="PyAV not installed")
+
+
+@pytest.fixture
+def pool():
+    with FFprobeWorkerPool(size=1, backend="pyav", max_jobs=2) as pool_:
+        yield pool_
+
+
+def _pids(pool_):
+    return {worker.proc.pid for worker in pool_._workers}
+
+
+def test_pool_raises_invalid_source():
+    with FFprobeWorkerPool(size=1, backend="ffprobe") as pool_:
+        with pytest.raises(InvalidSource):
+            pool_.probe("/non/existent/file.mkv")
+
+
+def test_pool_raises_value_error():
+    with pytest.raises(ValueError):
+        FFprobeWorkerPool(size=0)
+
+
+@requires_pyav
+def test_pool_probe(pool):
+    video = FFprobeVideoContainer(os.path.join(_DATA, "file_1.mkv"), backend=pool)
+    assert video.get_subtitles()
+
+
+@requires_pyav
+def test_pool_recycles_workers(pool):
+    path = os.path.join(_DATA, "file.mp4")
+    first_pids = _pids(pool)
+    pool.probe(path)
+    pool.probe(path)  # max_jobs reached
+    assert not _pids(pool)
+
+    pool.probe(path)
+    assert _pids(pool) and _pids(pool) != first_pids
+
+
+@requires_pyav
+def test_pool_health_check_replaces_dead_workers(pool):
+    old_pids = _pids(pool)
+    for worker in list(pool._workers):
+        worker.proc.kill()
+        worker.proc.wait()
+
+    pool.health_check()
+    assert _pids(pool) and _pids(pool).isdisjoint(old_pids)
+
+
+@requires_pyav
+def test_pool_backpressure(pool):
+    pool.acquire_timeout = 0.01
+    worker = pool._acquire()
+    try:
+        with pytest.raises(WorkerPoolError):
+            pool.probe(os.path.join(_DATA, "file.mp4"))
+    finally:
+        pool._release(worker)
+
+
+def test_pool_closed_raises_worker_pool_error(pool):
+    pool.close()
+    with pytest.raises(WorkerPoolError):
+        pool.probe("file.mkv")
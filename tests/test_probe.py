@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+import json
+
+import pytest
+
+from fese import decoding
+from fese.probe import Attachment
+from fese.probe import AudioStream
+from fese.probe import ProbeResult
+from fese.probe import VideoStream
+from fese.stream import FFprobeClosedCaptionStream
+from fese.stream import FFprobeSubtitleStream
+
+_DATA = {
+    "streams": [
+        {
+            "index": 0,
+            "codec_type": "video",
+            "codec_name": "h264",
+            "width": 1920,
+            "height": 1080,
+            "bit_rate": "5000000",
+            "r_frame_rate": "24000/1001",
+            "tags": {"DURATION": "00:20:07.790000000"},
+        },
+        {
+            "index": 1,
+            "codec_type": "audio",
+            "codec_name": "aac",
+            "channels": 2,
+            "channel_layout": "stereo",
+            "sample_rate": "48000",
+            "disposition": {"default": 1},
+            "tags": {"language": "jpn"},
+        },
+        {"index": 2, "codec_type": "audio", "codec_name": "ac3", "tags": {}},
+        {
+            "index": 3,
+            "codec_type": "subtitle",
+            "codec_name": "ass",
+            "tags": {"language": "eng"},
+        },
+        {"index": 4, "codec_type": "subtitle", "codec_name": "unknown"},
+        {
+            "index": 5,
+            "codec_type": "attachment",
+            "tags": {"filename": "font.ttf", "mimetype": "font/ttf"},
+        },
+    ],
+    "format": {
+        "filename": "movie.mkv",
+        "format_name": "matroska,webm",
+        "nb_streams": 6,
+        "duration": "1207.790000",
+        "size": "1000",
+        "bit_rate": "6624",
+    },
+    "chapters": [
+        {"id": 1, "start_time": "0.000000", "end_time": "90.500000"},
+        {
+            "id": 2,
+            "start_time": "90.500000",
+            "end_time": "1207.790000",
+            "tags": {"title": "Episode"},
+        },
+    ],
+}
+
+
+def test_format():
+    info = ProbeResult(_DATA).format
+    assert info.format_name == "matroska,webm"
+    assert info.duration == timedelta(seconds=1207.79)
+    assert info.size == 1000
+    assert info.bit_rate == 6624
+    assert info.nb_streams == 6
+
+
+def test_views():
+    result = ProbeResult(_DATA)
+    assert [type(stream) for stream in result.video] == [VideoStream]
+    assert result.video[0].height == 1080
+    assert result.video[0].duration == timedelta(minutes=20, seconds=7.79)
+
+    assert [type(stream) for stream in result.audio] == [AudioStream, AudioStream]
+    assert result.audio[0].language.alpha3 == "jpn"
+    assert result.audio[0].default
+    assert result.audio[0].sample_rate == 48000
+    assert result.audio[1].language is None
+
+    assert [type(stream) for stream in result.attachments] == [Attachment]
+    assert result.attachments[0].filename == "font.ttf"
+
+
+@pytest.mark.parametrize(
+    "decoder",
+    [
+        name
+        for name, module in (
+            ("json", json),
+            ("orjson", decoding.orjson),
+            ("msgspec", decoding.msgspec),
+        )
+        if module is not None
+    ],
+)
+def test_views_of_decoded_probes(monkeypatch, decoder):
+    monkeypatch.setattr(decoding, "DECODER", decoder)
+    # Typed records must keep every field read by the views
+    result = ProbeResult(decoding.decode_probe(json.dumps(_DATA).encode()))
+    expected = ProbeResult(_DATA)
+
+    assert vars(result.format) == vars(expected.format)
+    for view in ("video", "audio", "attachments", "chapters"):
+        assert [vars(item) for item in getattr(result, view)] == [
+            vars(item) for item in getattr(expected, view)
+        ]
+    assert result.video[0].bit_rate == 5000000
+    assert result.audio[0].channels == 2
+    assert len(result.chapters) == 2
+
+
+def test_subtitles_filter_invalid_streams():
+    subtitles = ProbeResult(_DATA).subtitles
+    assert [subtitle.index for subtitle in subtitles] == [3]
+
+
+def test_subtitles_closed_captions():
+    data = {
+        "streams": [
+            {"index": 0, "codec_type": "video", "closed_captions": 1},
+            {"index": 1, "codec_type": "subtitle", "codec_name": "subrip"},
+        ]
+    }
+    data["streams"][1]["tags"] = {"language": "eng"}
+    result = ProbeResult(data)
+
+    assert result.video[0].closed_captions
+    assert [type(subtitle) for subtitle in result.subtitles] == [
+        FFprobeSubtitleStream,
+        FFprobeClosedCaptionStream,
+    ]
+    assert result.subtitles[1].index == 0
+
+
+def test_chapters():
+    chapters = ProbeResult(_DATA).chapters
+    assert [chapter.title for chapter in chapters] == [None, "Episode"]
+    assert chapters[1].end == timedelta(seconds=1207.79)
+
+
+def test_views_are_memoized():
+    result = ProbeResult(_DATA)
+    assert result.format is result.format
+    assert result.subtitles is result.subtitles
+    assert result.audio is result.audio
+    assert result.chapters is result.chapters
+
+
+def test_empty_probe():
+    result = ProbeResult({})
+    assert result.streams == []
+    assert result.subtitles == []
+    assert result.audio == []
+    assert result.chapters == []
+    assert result.format.duration is None
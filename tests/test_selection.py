@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from fese.exceptions import InvalidRule
+from fese.selection import LibraryIndex
+from fese.selection import Rule
+from fese.selection import Selector
+from fese.stream import FFprobeSubtitleStream
+
+
+def _stream(index, language, codec_name="subrip", title=None, frames=None, **disp):
+    tags = {"language": language}
+    if title is not None:
+        tags["title"] = title
+    if frames is not None:
+        tags["NUMBER_OF_FRAMES"] = str(frames)
+
+    return FFprobeSubtitleStream(
+        {"index": index, "codec_name": codec_name, "tags": tags, "disposition": disp}
+    )
+
+
+@pytest.fixture
+def subtitles():
+    return [
+        _stream(2, "eng", title="Forced", forced=1),
+        _stream(3, "eng", title="English SDH", frames=900),
+        _stream(4, "eng", title="English", frames=850),
+        _stream(5, "spa", title="Latino", frames=800),
+        _stream(6, "spa", codec_name="hdmv_pgs_subtitle", title="Castellano"),
+    ]
+
+
+def test_selector_first(subtitles):
+    selector = Selector.parse("en text !forced !hi | en hi | *")
+    assert selector.first(subtitles).index == 4
+    assert selector.first(subtitles[:2]).index == 3
+    assert selector.first(subtitles[:1]).index == 2
+    assert selector.first([]) is None
+
+
+def test_selector_select(subtitles):
+    selector = Selector.parse("es-MX | es bitmap | en forced")
+    assert [sub.index for sub in selector.select(subtitles)] == [5, 6, 2]
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("en", [2, 3, 4]),
+        ("es-MX", [5]),
+        ("es !default bitmap", [6]),
+        ("codec=subrip frames>820", [3, 4]),
+        ("frames<850 text", [2, 5]),
+        ("*", [2, 3, 4, 5, 6]),
+    ],
+)
+def test_rule_parse(subtitles, text, expected):
+    assert [sub.index for sub in Selector.parse(text).select(subtitles)] == expected
+
+
+@pytest.mark.parametrize("text", ["en es", "!en", "frames>many", "xx-invalid"])
+def test_rule_parse_raises_invalid_rule(text):
+    with pytest.raises(InvalidRule):
+        Rule.parse(text)
+
+
+def test_library_index(subtitles):
+    index = LibraryIndex()
+    index.add("a.mkv", subtitles)
+    index.add("b.mkv", subtitles[:3])
+    index.add("c.mkv", [_stream(2, "spa", title="Forced", forced=1)])
+
+    assert index.missing(Rule("es-MX")) == {"b.mkv", "c.mkv"}
+    assert index.matching(Rule("en", forced=True)) == {"a.mkv", "b.mkv"}
+    # Conditions must hold for the same stream
+    assert index.matching(Rule("es", forced=False)) == {"a.mkv"}
+    assert index.select(Selector.parse("es | en hi")) == {
+        "a.mkv": 5,
+        "b.mkv": 3,
+        "c.mkv": 2,
+    }
+
+    index.remove("a.mkv")
+    assert len(index) == 2
+    assert index.matching(Rule("es-MX")) == set()
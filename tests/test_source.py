@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io
+
+import pytest
+
+from fese.exceptions import InvalidSource
+from fese.source import FileInput
+from fese.source import is_url
+from fese.source import source_name
+
+
+class _Pipe(io.RawIOBase):
+    def __init__(self, data):
+        self._data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._data.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+
+@pytest.mark.parametrize(
+    "path,expected",
+    [
+        ("https://host/movie.mkv", True),
+        ("s3+http://host/movie.mkv", True),
+        ("/media/movie.mkv", False),
+        ("C:\\\\media\\\\movie.mkv", False),
+    ],
+)
+def test_is_url(path, expected):
+    assert is_url(path) is expected
+
+
+@pytest.mark.parametrize(
+    "source,expected",
+    [
+        ("/media/movie.mkv", "movie.mkv"),
+        ("https://host/a%20movie.mkv?token=x", "a movie.mkv"),
+        ("https://host/", "stream"),
+        (io.BytesIO(), "stdin"),
+    ],
+)
+def test_source_name(source, expected):
+    assert source_name(source) == expected
+
+
+def test_file_input_seekable():
+    file_input = FileInput(io.BytesIO(b"0123456789"), head_size=4)
+    assert file_input.head() == b"0123"
+    assert b"".join(file_input.chunks()) == b"0123456789"
+    assert b"".join(file_input.chunks()) == b"0123456789"
+
+
+def test_file_input_pipe():
+    file_input = FileInput(io.BufferedReader(_Pipe(b"0123456789")), head_size=4)
+    assert not file_input.seekable
+    assert file_input.head() == b"0123"
+    assert file_input.head() == b"0123"
+    assert b"".join(file_input.chunks()) == b"0123456789"
+
+    with pytest.raises(InvalidSource):
+        file_input.chunks()
+
+    with pytest.raises(InvalidSource):
+        file_input.head()
@@ -6,6 +6,7 @@ from datetime import timedelta
 from babelfish import Language
 import pytest
 
+from fese import stream
 from fese import tags
 from fese.exceptions import LanguageNotFound
 from fese.exceptions import UnsupportedCodec
@@ -126,6 +127,12 @@ def test_convert_args_none_fallback(codec_name):
     ]
 
 
+def test_args_w_extra_args(subtitle):
+    extra_args = ["-bsf:s", "setts=ts=PTS*25/24"]
+    assert subtitle.copy_args("test", extra_args)[-3:] == extra_args + ["test"]
+    assert subtitle.convert_args(None, "test", extra_args)[-3:] == extra_args + ["test"]
+
+
 def test_convert_args_set_codec_name(subtitle):
     assert subtitle.convert_args("ass", "test") == [
         "-map",
@@ -209,3 +216,128 @@ def test_generic_stream_wo_tags_marking_generic():
     assert stream.disposition.generic is True
 
     tags.LANGUAGE_FALLBACK = None
+
+
+@pytest.fixture
+def restore_codecs(monkeypatch):
+    monkeypatch.setattr(stream, "_codecs", stream._codecs)
+    monkeypatch.setattr(stream, "_formats", stream._formats)
+
+
+def test_codecs_table_is_read_only():
+    with pytest.raises(TypeError):
+        stream.codecs()["ass"] = None
+
+    with pytest.raises(AttributeError):
+        stream.codecs()["ass"].copy = False
+
+
+def test_register_codec(restore_codecs):
+    codec = stream.register_codec(
+        "arib_caption", "text", convert=True, convert_default_format="srt"
+    )
+    assert stream.codecs()["arib_caption"] is codec
+
+    subtitle = FFprobeSubtitleStream(
+        {"codec_name": "arib_caption", "index": 3, "tags": {"language": "jpn"}}
+    )
+    assert subtitle.type == "text"
+    assert subtitle.extension == "srt"
+    assert subtitle.convert_args(None, "out.srt") == [
+        "-map",
+        "0:3",
+        "-f",
+        "srt",
+        "out.srt",
+    ]
+    with pytest.raises(UnsupportedCodec):
+        subtitle.copy_args("out.srt")
+
+
+def test_register_codec_new_format(restore_codecs):
+    stream.register_codec("eia_608", "text", copy=True, copy_format="scc")
+    subtitle = FFprobeSubtitleStream(
+        {"codec_name": "subrip", "index": 1, "tags": {"language": "eng"}}
+    )
+    assert subtitle.convert_args("scc", "out.scc")[3] == "scc"
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"type": "audio"},
+        {"type": "text", "copy": True},
+        {"type": "text", "convert": True},
+    ],
+)
+def test_register_codec_raises_value_error(kwargs, restore_codecs):
+    with pytest.raises(ValueError):
+        stream.register_codec("invalid", **kwargs)
+
+
+def test_copy_args_w_extra_args():
+    subtitle = FFprobeSubtitleStream(
+        {"codec_name": "subrip", "index": 1, "tags": {"language": "eng"}}
+    )
+    args = subtitle.copy_args("out.srt", ["-to", "10"], input_index=2)
+    assert args == ["-map", "2:1", "-c:s", "copy", "-f", "srt", "-to", "10", "out.srt"]
+    # Templates are shared, the returned lists are not
+    args.append("x")
+    assert subtitle.copy_args("out.srt", ["-to", "10"], input_index=2)[-1] == "out.srt"
+
+
+def test_closed_caption_stream():
+    subtitle = stream.FFprobeClosedCaptionStream(
+        {"index": 0, "codec_type": "video", "tags": {"DURATION": "00:00:12.5"}}
+    )
+    assert subtitle.codec_name == "eia_608"
+    assert subtitle.language == Language("eng")
+    assert subtitle.duration == timedelta(seconds=12.5)
+    assert subtitle.suffix == "en.cc"
+    assert subtitle.convert_args(None, "out.srt", input_index=1) == [
+        "-map",
+        "1:1",
+        "-f",
+        "srt",
+        "out.srt",
+    ]
+
+
+def test_closed_caption_stream_tagged_language():
+    subtitle = stream.FFprobeClosedCaptionStream(
+        {"index": 0, "codec_type": "video", "tags": {"language": "spa"}}
+    )
+    assert subtitle.language == Language("spa")
+
+
+def test_closed_caption_stream_input_args():
+    subtitle = stream.FFprobeClosedCaptionStream({"index": 1})
+    assert subtitle.input_args("/media/it's: [a],b;c.ts", 10) == [
+        "-f",
+        "lavfi",
+        "-i",
+        r"movie=/media/it\\\'s\\: \[a\]\,b\;c.ts:si=1:sp=10.000"
+        ":dec_threads=1[out0+subcc]",
+    ]
+
+
+def test_closed_caption_stream_input_args_raises_unsupported_codec():
+    subtitle = stream.FFprobeClosedCaptionStream({"index": 1})
+    with pytest.raises(UnsupportedCodec):
+        subtitle.input_args("pipe:0")
+
+    with pytest.raises(UnsupportedCodec):
+        subtitle.copy_args("out.srt")
+
+
+@pytest.mark.parametrize(
+    "data,expected",
+    [
+        ({"codec_type": "video", "closed_captions": 1}, True),
+        ({"codec_type": "video", "closed_captions": 0}, False),
+        ({"codec_type": "video"}, False),
+        ({"codec_type": "subtitle", "closed_captions": 1}, False),
+    ],
+)
+def test_is_captioned(data, expected):
+    assert stream.is_captioned(data) is expected
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import shutil
+import wave
+
+import pytest
+
+from fese import container
+from fese import sync
+from fese.cancel import CancellationToken
+from fese.container import FFprobeVideoContainer
+from fese.exceptions import ExtractionCancelled
+from fese.exceptions import ExtractionError
+from fese.probe import ProbeResult
+
+numpy = pytest.importorskip("numpy")
+
+requires_ffmpeg = pytest.mark.skipif(
+    shutil.which(container.FFMPEG_PATH) is None, reason="FFmpeg not found"
+)
+
+
+def _cues(duration, seed=0):
+    "Random dialogue: cues of 1-4 seconds separated by 0.5-6 seconds."
+    rng = numpy.random.default_rng(seed)
+    starts, ends = [], []
+    time = 1.0
+    while True:
+        start = time + rng.uniform(0.5, 6)
+        end = start + rng.uniform(1, 4)
+        if end > duration:
+            break
+        starts.append(start)
+        ends.append(end)
+        time = end
+
+    return numpy.array(starts), numpy.array(ends)
+
+
+def _speech(starts, ends, duration, rate=sync.SAMPLE_RATE, seed=0):
+    "Noise with 1 kHz tone bursts where the cues are."
+    rng = numpy.random.default_rng(seed)
+    samples = rng.normal(0, 30, int(duration * rate))
+    times = numpy.arange(len(samples)) / rate
+    for start, end in zip(starts, ends):
+        inside = (times >= start) & (times < end)
+        samples[inside] += 8000 * numpy.sin(2 * numpy.pi * 1000 * times[inside])
+
+    return samples.astype(numpy.int16)
+
+
+def _write_wav(path, starts, ends, duration):
+    with wave.open(path, "wb") as file:
+        file.setnchannels(1)
+        file.setsampwidth(2)
+        file.setframerate(16000)
+        file.writeframes(_speech(starts, ends, duration, 16000).tobytes())
+
+
+def _write_srt(path, starts, ends):
+    def stamp(seconds):
+        millis = int(round(seconds * 1000))
+        return (
+            f"{millis // 3600000:02}:{millis // 60000 % 60:02}:"
+            f"{millis // 1000 % 60:02},{millis % 1000:03}"
+        )
+
+    with open(path, "w", encoding="utf-8") as file:
+        for number, (start, end) in enumerate(zip(starts, ends), 1):
+            file.write(f"{number}\n{stamp(start)} --> {stamp(end)}\nHello\n\n")
+
+
+def test_voice_activity():
+    starts, ends = numpy.array([1.0, 3.0]), numpy.array([2.0, 3.5])
+    voiced = sync.voice_activity(_speech(starts, ends, 5))
+    assert len(voiced) == 500
+    assert voiced[110:190].all() and voiced[310:340].all()
+    assert not voiced[:90].any() and not voiced[240:290].any()
+    assert not voiced[400:].any()
+
+
+def test_voice_activity_empty():
+    assert len(sync.voice_activity(numpy.zeros(10, numpy.int16))) == 0
+
+
+def test_cue_activity():
+    activity = sync.cue_activity(
+        numpy.array([-1.0, 0.5, 2.0]), numpy.array([0.2, 0.6, 9.0]), 0, 100
+    )
+    assert activity[:20].all() and not activity[20:50].any()
+    assert activity[50:60].all() and not activity[60:].any()
+
+
+@pytest.mark.parametrize("shift", [0, 2.5, -7.3])
+def test_offset_estimator(shift):
+    duration = 600
+    starts, ends = _cues(duration)
+    estimator = sync.OffsetEstimator(starts - shift, ends - shift, max_offset=10)
+    activity = sync.cue_activity(starts, ends, 0, int(duration / sync.RESOLUTION))
+    for start in range(0, duration, 120):
+        frames = slice(
+            int(start / sync.RESOLUTION), int((start + 120) / sync.RESOLUTION)
+        )
+        estimator.add(activity[frames], start)
+
+    estimate = estimator.result()
+    assert estimate.offset == pytest.approx(shift, abs=0.02)
+    assert estimate.drift == pytest.approx(0, abs=1e-4)
+    assert estimate.confidence > 0.9
+    assert len(estimate.segments) == 5
+
+
+def test_offset_estimator_drift():
+    duration = 1800
+    starts, ends = _cues(duration)
+    # Subtitles timed for a slightly slower video
+    estimator = sync.OffsetEstimator((starts - 1) / 1.001, (ends - 1) / 1.001)
+    activity = sync.cue_activity(starts, ends, 0, int(duration / sync.RESOLUTION))
+    for start in range(0, duration, 120):
+        frames = slice(
+            int(start / sync.RESOLUTION), int((start + 120) / sync.RESOLUTION)
+        )
+        estimator.add(activity[frames], start)
+
+    estimate = estimator.result()
+    assert estimate.drift == pytest.approx(0.001, abs=2e-4)
+    assert 1 < estimate.offset < 1 + duration * 0.001
+
+
+def test_offset_estimator_without_variation():
+    estimator = sync.OffsetEstimator(numpy.array([1.0]), numpy.array([2.0]))
+    assert estimator.add(numpy.zeros(1000, bool)) is None
+    assert estimator.result() == sync.SyncEstimate(None, None, 0.0, [])
+
+
+def test_load_cues(tmp_path):
+    path = tmp_path / "file.srt"
+    _write_srt(path, [1.5, 10], [3, 12.25])
+    starts, ends = sync.load_cues(path)
+    assert starts.tolist() == [1.5, 10] and ends.tolist() == [3, 12.25]
+
+
+def test_load_cues_raises_value_error(tmp_path):
+    path = tmp_path / "file.srt"
+    path.write_bytes(b"not subtitles")
+    with pytest.raises(ValueError):
+        sync.load_cues(path)
+
+
+@requires_ffmpeg
+def test_estimate_offset(tmp_path, monkeypatch):
+    monkeypatch.setattr(sync, "SEGMENT_SECONDS", 30)
+    duration = 150
+    starts, ends = _cues(duration)
+    media = str(tmp_path / "audio.wav")
+    _write_wav(media, starts, ends, duration)
+
+    subtitles = tmp_path / "audio.srt"
+    _write_srt(subtitles, starts + 1.2, ends + 1.2)
+
+    estimate = sync.estimate_offset(FFprobeVideoContainer(media), subtitles, audio=0)
+    assert estimate.offset == pytest.approx(-1.2, abs=0.05)
+    assert estimate.confidence > 0.8
+    assert len(estimate.segments) == 5
+
+
+@requires_ffmpeg
+def test_estimate_offset_cancelled(tmp_path):
+    starts, ends = _cues(30)
+    media = str(tmp_path / "audio.wav")
+    _write_wav(media, starts, ends, 30)
+    subtitles = tmp_path / "audio.srt"
+    _write_srt(subtitles, starts, ends)
+
+    token = CancellationToken()
+    token.cancel()
+    with pytest.raises(ExtractionCancelled):
+        sync.estimate_offset(
+            FFprobeVideoContainer(media), subtitles, audio=0, cancel=token
+        )
+
+
+@requires_ffmpeg
+def test_estimate_offset_raises_extraction_error(tmp_path):
+    media = tmp_path / "audio.wav"
+    media.write_bytes(b"not audio")
+    subtitles = tmp_path / "audio.srt"
+    _write_srt(subtitles, [1.0], [2.0])
+
+    with pytest.raises(ExtractionError):
+        sync.estimate_offset(FFprobeVideoContainer(str(media)), subtitles, audio=0)
+
+
+def test_estimate_offset_requires_numpy(monkeypatch):
+    monkeypatch.setattr(sync, "numpy", None)
+    with pytest.raises(ImportError):
+        sync.estimate_offset(FFprobeVideoContainer("file.mkv"), "file.srt")
+
+
+def test_default_audio():
+    video = FFprobeVideoContainer("file.mkv")
+    video._probe_result = ProbeResult(
+        {
+            "streams": [
+                {"index": 0, "codec_type": "video"},
+                {"index": 1, "codec_type": "audio"},
+                {"index": 2, "codec_type": "audio", "disposition": {"default": 1}},
+            ]
+        }
+    )
+    assert sync._default_audio(video) == 2
+
+    video._probe_result = ProbeResult({"streams": []})
+    with pytest.raises(ValueError):
+        sync._default_audio(video)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+
+import pytest
+
+from fese.timing import sample_windows
+from fese.timing import timing_args
+from fese.timing import window_args
+
+
+def test_timing_args_noop():
+    assert timing_args() == []
+    assert timing_args(shift=0, fps_from=25, fps_to="25/1") == []
+
+
+@pytest.mark.parametrize("shift", [2.5, timedelta(seconds=2.5)])
+def test_timing_args_shift(shift):
+    assert timing_args(shift=shift) == ["-bsf:s", "setts=ts=max(PTS+2.500000/TB\\,0)"]
+
+
+def test_timing_args_fps():
+    assert timing_args(fps_from="24000/1001", fps_to=25) == [
+        "-bsf:s",
+        "setts=ts=PTS*960/1001:duration=DURATION*960/1001",
+    ]
+
+
+def test_timing_args_fps_and_shift():
+    assert timing_args(shift=-1, fps_from=25, fps_to=24) == [
+        "-bsf:s",
+        "setts=ts=max(PTS*25/24-1.000000/TB\\,0):duration=DURATION*25/24",
+    ]
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{"fps_from": 25}, {"fps_from": 0, "fps_to": 25}, {"fps_from": "n/a", "fps_to": 1}],
+)
+def test_timing_args_raises_value_error(kwargs):
+    with pytest.raises(ValueError):
+        timing_args(**kwargs)
+
+
+def test_window_args():
+    assert window_args() == ([], [])
+    assert window_args(start=0, end=10) == ([], ["-to", "10.000"])
+    assert window_args(timedelta(minutes=1), 90.5) == (
+        ["-copyts", "-ss", "60.000"],
+        ["-to", "90.500"],
+    )
+
+
+@pytest.mark.parametrize("start,end", [(-1, None), (10, 10), (None, 0)])
+def test_window_args_raises_value_error(start, end):
+    with pytest.raises(ValueError):
+        window_args(start, end)
+
+
+def test_sample_windows():
+    assert sample_windows(300, windows=3, sample_seconds=20) == [
+        (40.0, 60.0),
+        (140.0, 160.0),
+        (240.0, 260.0),
+    ]
+
+
+@pytest.mark.parametrize(
+    "duration,expected", [(None, [(0.0, 30.0)]), (timedelta(seconds=60), [(0.0, 60.0)])]
+)
+def test_sample_windows_short_or_unknown(duration, expected):
+    assert sample_windows(duration, windows=3, sample_seconds=30) == expected
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from fese import charset
+from fese import validate
+from fese.validate import StreamValidator
+from fese.validate import validate_file
+
+_SRT = """1
+00:00:01,000 --> 00:00:02,000
+Hello
+
+2
+00:00:03,000 --> 00:00:04,500
+¿Qué tal?
+
+3
+00:00:05,000 --> 00:00:06,000
+Adiós
+"""
+
+_ASS = """[Script Info]
+ScriptType: v4.00+
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+Dialogue: 0,0:00:01.00,0:00:02.00,Default,,0,0,0,,Hello, world
+Dialogue: 1,0:00:01.50,0:00:03.00,Default,,0,0,0,,Sign
+"""
+
+
+def _validate(data, format="srt", chunk_size=None, **kwargs):
+    validator = StreamValidator(format, **kwargs)
+    chunk_size = chunk_size or len(data) or 1
+    output = b"".join(
+        validator.feed(data[i : i + chunk_size])
+        for i in range(0, len(data), chunk_size)
+    )
+    return validator.report, output + validator.finish()
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 7])
+def test_valid_srt(chunk_size):
+    data = _SRT.encode("utf-8")
+    report, output = _validate(data, chunk_size=chunk_size)
+
+    assert output == data
+    assert report.cues == 3
+    assert report.score == 1.0
+    assert report.ok
+    assert report.as_dict()["issues"] == {}
+
+
+def test_srt_timing_issues():
+    data = (
+        "1\n00:00:05,000 --> 00:00:06,000\na\n\n"
+        "2\n00:00:05,500 --> 00:00:07,000\nb\n\n"  # Overlap
+        "3\n00:00:01,000 --> 00:00:02,000\nc\n\n"  # Non monotonic
+        "4\n00:00:08,000 --> 00:00:08,000\nd\n\n"  # Zero length
+        "5\n00:00:10,000 --> 00:00:09,000\ne\n\n"  # Ends before it starts
+        "6\n00:00:1x,000 --> 00:00:12,000\nf\n"
+    )
+    report, _ = _validate(data.encode())
+
+    assert report.cues == 6
+    assert report.issues[validate.OVERLAP] == 1
+    assert report.issues[validate.NON_MONOTONIC] == 1
+    assert report.issues[validate.ZERO_LENGTH] == 1
+    assert report.issues[validate.TIMING] == 2
+    assert report.score == pytest.approx(1 / 6, abs=0.001)
+    assert not report.ok
+
+
+def test_expected_cues():
+    report, _ = _validate(_SRT.encode(), expected_cues=6)
+    assert report.score == 0.5
+
+
+def test_empty_output():
+    report, output = _validate(b"")
+    assert output == b""
+    assert report.score == 0.0
+
+
+@pytest.mark.parametrize("detector", [True, False])
+def test_legacy_charset_converted(monkeypatch, detector):
+    if not detector:
+        monkeypatch.setattr(charset, "charset_normalizer", None)
+    elif charset.charset_normalizer is None:
+        pytest.skip("charset_normalizer not installed")
+
+    report, output = _validate(_SRT.encode("cp1252"), chunk_size=16)
+
+    assert output.decode("utf-8") == _SRT
+    assert report.encoding == "cp1252"
+    assert report.issues[validate.ENCODING] == 0
+    assert report.score == 1.0
+
+
+def test_mixed_encodings_replaced():
+    data = _SRT.encode("utf-8") + "\n4\n00:00:07,000 --> 00:00:08,000\ná\n".encode(
+        "latin-1"
+    )
+    report, output = _validate(data)
+
+    assert output.decode("utf-8").endswith("\ufffd\n")
+    assert report.encoding == "utf-8"
+    assert report.issues[validate.ENCODING] == 1
+    assert 0.9 < report.score < 1.0
+
+
+def test_valid_ass():
+    report, output = _validate(_ASS.encode(), "ass")
+    assert output == _ASS.encode()
+    assert report.cues == 2
+    # Layered events can overlap
+    assert report.score == 1.0
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        _ASS.replace("[Script Info]\n", ""),
+        _ASS.replace("Format: Layer", "Invalid: Layer"),
+        _ASS.replace("[Events]", "[Other]"),
+    ],
+)
+def test_malformed_ass_header(data):
+    report, _ = _validate(data.encode(), "ass")
+    assert report.issues[validate.HEADER]
+    assert report.score <= 0.5
+
+
+def test_webvtt():
+    data = (
+        "WEBVTT\n\n00:01.000 --> 00:02.000\nHello\n\n"
+        "01:00:03.000 --> 01:00:04.000\nBye\n"
+    )
+    report, _ = _validate(data.encode(), "webvtt")
+    assert report.cues == 2
+    assert report.score == 1.0
+
+    report, _ = _validate(data.replace("WEBVTT", "").encode(), "webvtt")
+    assert report.issues[validate.HEADER] == 1
+
+
+def test_validate_file(tmp_path):
+    path = tmp_path / "movie.en.srt"
+    path.write_bytes(_SRT.encode("cp1252"))
+
+    report = validate_file(str(path), expected_cues=3)
+    assert report.score == 1.0
+    assert report.encoding != "utf-8"
+    # The file isn't converted
+    assert path.read_bytes() == _SRT.encode("cp1252")
+
+
+@pytest.mark.parametrize(
+    "path,expected",
+    [("a.srt", "srt"), ("a.en.ASS", "ass"), ("a.ssa", "ass"), ("a.webvtt", "webvtt")],
+)
+def test_format_of(path, expected):
+    assert validate.format_of(path) == expected
+
+
+def test_unsupported_format_raises_value_error():
+    assert validate.format_of("a.sup") is None
+    with pytest.raises(ValueError):
+        StreamValidator("sup")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import queue
+import sys
+import threading
+import time
+
+import pytest
+
+from fese import watch
+
+requires_inotify = pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="inotify not available"
+)
+
+
+@pytest.fixture(autouse=True)
+def fast_tick(monkeypatch):
+    monkeypatch.setattr(watch, "TICK", 0.02)
+
+
+@pytest.fixture
+def watching(tmp_path):
+    started = []
+
+    def start(**kwargs):
+        published = queue.Queue()
+        kwargs.setdefault("debounce", 0.1)
+        watcher = watch.Watcher([str(tmp_path)], published.put, **kwargs)
+        thread = threading.Thread(target=watcher.run, daemon=True)
+        thread.start()
+        started.append((watcher, thread))
+        time.sleep(0.2)  # Let the watches be set
+        return watcher, published
+
+    yield start
+
+    for watcher, thread in started:
+        watcher.stop()
+        thread.join(5)
+
+
+def _drain(published, timeout=1.5):
+    items = []
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            items.append(published.get(timeout=0.05))
+        except queue.Empty:
+            pass
+    return items
+
+
+@requires_inotify
+def test_watcher_publishes_new_files(tmp_path, watching):
+    _, published = watching(include=["*.mkv"], exclude=["*/skip/*"])
+    (tmp_path / "skip").mkdir()
+    (tmp_path / "new").mkdir()
+    (tmp_path / "movie.mkv").write_bytes(b"x" * 10)
+    (tmp_path / "notes.txt").write_text("n/a")
+    (tmp_path / "skip/movie.mkv").write_bytes(b"x")
+    (tmp_path / "new/episode.mkv").write_bytes(b"x")
+
+    assert sorted(_drain(published)) == [
+        str(tmp_path / "movie.mkv"),
+        str(tmp_path / "new/episode.mkv"),
+    ]
+
+
+@requires_inotify
+def test_watcher_waits_for_stable_size(tmp_path, watching):
+    _, published = watching(debounce=0.2)
+    path = tmp_path / "movie.mkv"
+    with open(path, "wb") as file:
+        for _ in range(6):
+            file.write(b"x" * 1024)
+            file.flush()
+            time.sleep(0.1)
+            assert published.empty()
+
+    assert _drain(published) == [str(path)]
+
+
+def test_watcher_polling(tmp_path, watching):
+    (tmp_path / "old.mkv").write_bytes(b"x")
+    _, published = watching(use_inotify=False, poll_interval=0.1)
+    (tmp_path / "old.mkv").write_bytes(b"xx")
+    (tmp_path / "new.mkv").write_bytes(b"x")
+
+    assert sorted(_drain(published)) == [
+        str(tmp_path / "new.mkv"),
+        str(tmp_path / "old.mkv"),
+    ]
+
+
+@requires_inotify
+def test_watcher_max_pending(tmp_path, watching):
+    watcher, published = watching(max_pending=2)
+    for i in range(5):
+        (tmp_path / f"{i}.mkv").write_bytes(b"x")
+
+    assert len(_drain(published)) == 2
+    assert watcher.dropped >= 3  # Counted by event